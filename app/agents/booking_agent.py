@@ -1,25 +1,59 @@
 import os
 import json
-from datetime import datetime
+import contextvars
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime
+from typing import List, Optional, Tuple
 from openai import OpenAI
 from dotenv import load_dotenv
 
 # Importamos tu lógica de base de datos y disponibilidad
+from app.agents.conversation import ConversationState, build_conversation_store, tool_result_key
+from app.agents.fast_path import AgentMetrics, try_fast_path
+from app.agents.slot_summary import summary_content
+from app.agents.tools import get_availability
+from app.core.settings import settings
 from app.db.session import SessionLocal
-from app.utils.availability import get_available_slots
+from app.utils.availability import add_invalidation_listener
 
 # Cargamos variables de entorno para la API KEY
 load_dotenv()
 
 client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
 
+logger = logging.getLogger(__name__)
+
+# Aciertos del atajo por reglas y latencia de cada camino (atajo vs LLM)
+agent_metrics = AgentMetrics()
+
+# Historial y resultados de herramientas por teléfono (memoria o Postgres)
+conversation_store = build_conversation_store()
+
+
+def invalidate_conversation_results(day: Optional[date] = None) -> None:
+    """Los cambios de citas u horarios dejan viejos los huecos guardados en las conversaciones."""
+    conversation_store.invalidate_tool_results(day)
+
+
+add_invalidation_listener(invalidate_conversation_results)
+
+# Hilos para ejecutar a la vez las llamadas a herramientas de un mismo turno;
+# compartidos por todas las conversaciones para acotar las sesiones abiertas
+tool_executor = ThreadPoolExecutor(max_workers=settings.AGENT_TOOL_WORKERS, thread_name_prefix="agent-tool")
+
 # Definición de herramientas para la IA (Function Calling)
 TOOLS = [
     {
         "type": "function",
         "function": {
             "name": "get_availability",
-            "description": "Consulta los horarios disponibles para un servicio en una fecha específica.",
+            "description": (
+                "Consulta los horarios disponibles para un servicio en una fecha específica. "
+                "Devuelve tramos libres HH:MM-HH:MM por profesional (se puede empezar cada "
+                "step_minutes siempre que el servicio termine dentro del tramo) y horas sugeridas."
+            ),
             "parameters": {
                 "type": "object",
                 "properties": {
@@ -38,16 +72,97 @@ TOOLS = [
     }
 ]
 
-def run_booking_agent(user_prompt: str):
+def run_booking_agent(user_prompt: str, phone: Optional[str] = None):
+    """
+    Orquestador que recibe el mensaje del usuario y genera la respuesta.
+    Las consultas de disponibilidad simples se contestan por reglas sin
+    llamar a OpenAI; el resto (o si el atajo duda) pasa por el LLM.
+    Con `phone` se recupera la conversación anterior: historial y
+    disponibilidad ya consultada para no repetir consultas.
+    """
+    started = time.perf_counter()
+    conversation = conversation_store.load(phone) if phone else None
+    reply, reason = None, "disabled"
+    if settings.AGENT_FAST_PATH_ENABLED:
+        db = SessionLocal()
+        try:
+            reply, reason = try_fast_path(
+                db, user_prompt,
+                max_times=settings.AGENT_FAST_PATH_MAX_TIMES,
+                conversation=conversation,
+                fetch_availability=lambda service_id, target_date: fetch_availability(
+                    service_id, target_date, conversation
+                )
+            )
+        except Exception:
+            logger.exception("Error en el atajo del agente; se usa el LLM")
+            reply, reason = None, "error"
+        finally:
+            db.close()
+
+    if reply is not None:
+        agent_metrics.observe("fast_path", time.perf_counter() - started)
+    else:
+        try:
+            reply = run_llm_agent(user_prompt, conversation)
+        finally:
+            agent_metrics.observe("llm", time.perf_counter() - started, reason)
+
+    if conversation is not None:
+        conversation.add_turn(user_prompt, reply, conversation_store.max_turns)
+        conversation_store.save(conversation)
+    return reply
+
+
+def fetch_availability(
+    service_id: int,
+    target_date: date,
+    conversation: Optional[ConversationState] = None,
+    remember_query: bool = True
+):
+    """
+    Resumen de disponibilidad; reutiliza el de la conversación si sigue vigente
+    y, si no, el de tool_cache (compartido por todos los usuarios del worker).
+    """
+    summary = conversation_store.remember_tool_result(
+        conversation,
+        tool_result_key(service_id, target_date),
+        lambda: get_availability(service_id, target_date, settings.AGENT_TOOL_MAX_SUGGESTIONS)
+    )
+    if conversation is not None and remember_query:
+        conversation.remember_query(service_id, target_date)
+    return summary
+
+
+def context_messages(conversation: Optional[ConversationState]) -> list:
+    """Disponibilidad ya consultada y turnos anteriores de la conversación."""
+    if conversation is None:
+        return []
+    messages = []
+    known = conversation_store.fresh_tool_results(conversation)
+    if known:
+        lines = "\n".join(f"{key}: {summary_content(value)}" for key, value in known.items())
+        messages.append({
+            "role": "system",
+            "content": (
+                "Disponibilidad ya consultada en esta conversación (servicio y fecha). "
+                "Úsala sin volver a llamar a get_availability para el mismo servicio y fecha:\n" + lines
+            )
+        })
+    return messages + conversation.history_messages()
+
+
+def run_llm_agent(user_prompt: str, conversation: Optional[ConversationState] = None):
     """
-    Orquestador que recibe el mensaje del usuario, decide si llamar a la DB 
-    y genera una respuesta en lenguaje natural.
+    Camino con LLM: decide si llamar a la DB y genera una respuesta
+    en lenguaje natural.
     """
     messages = [
         {
             "role": "system", 
             "content": "Eres un asistente amable de una peluquería. Si el usuario pregunta por disponibilidad, usa la herramienta get_availability."
         },
+        *context_messages(conversation),
         {"role": "user", "content": user_prompt}
     ]
     
@@ -62,49 +177,69 @@ def run_booking_agent(user_prompt: str):
     response_message = response.choices[0].message
     tool_calls = response_message.tool_calls
 
-    # 2. Si la IA decide que necesita consultar la base de datos (Neon)
+    # 2. Si la IA pide herramientas (p. ej. disponibilidad de tres fechas), se
+    #    ejecutan todas a la vez y se hace una única segunda llamada
     if tool_calls:
         messages.append(response_message)
+        for tool_call, content in zip(tool_calls, run_tool_calls(tool_calls, conversation)):
+            messages.append({
+                "tool_call_id": tool_call.id,
+                "role": "tool",
+                "name": tool_call.function.name,
+                "content": content,
+            })
         
-        for tool_call in tool_calls:
-            # Extraemos los argumentos que la IA generó
-            function_args = json.loads(tool_call.function.arguments)
-            
-            # --- CORRECCIÓN DE TIPOS Y NOMBRES ---
-            raw_date = function_args.get("target_date")
-            s_id = function_args.get("service_id")
-            
-            # Convertimos el string a objeto datetime (requerido por availability.py)
-            date_obj = datetime.strptime(raw_date, "%Y-%m-%d")
-            
-            db = SessionLocal()
-            try:
-                # Llamada con los nombres exactos: target_date y service_id
-                slots_data = get_available_slots(
-                    db=db, 
-                    target_date=date_obj,  # Nombre exacto del parámetro en tu clase
-                    service_id=s_id
-                )
-                
-                # Añadimos el resultado de la función al historial para la IA
-                messages.append({
-                    "tool_call_id": tool_call.id,
-                    "role": "tool",
-                    "name": "get_availability",
-                    "content": json.dumps(slots_data, default=str), # default=str maneja fechas en el JSON
-                })
-                
-                # 3. Segunda llamada a la IA para que redacte la respuesta final
-                second_response = client.chat.completions.create(
-                    model="gpt-4o-mini",
-                    messages=messages,
-                )
-                return second_response.choices[0].message.content
-                
-            except Exception as e:
-                return f"Error al consultar la agenda: {str(e)}"
-            finally:
-                db.close()
+        # 3. Segunda llamada a la IA para que redacte la respuesta final
+        try:
+            second_response = client.chat.completions.create(
+                model="gpt-4o-mini",
+                messages=messages,
+            )
+            return second_response.choices[0].message.content
+        except Exception as e:
+            return f"Error al consultar la agenda: {str(e)}"
 
     # Si no hubo llamada a herramientas, devolver respuesta normal
-    return response_message.content
\ No newline at end of file
+    return response_message.content
+
+
+def execute_tool_call(tool_call, conversation: Optional[ConversationState] = None) -> Tuple[str, Optional[Tuple[int, date]]]:
+    """
+    Ejecuta una llamada a herramienta del modelo. Devuelve el contenido del
+    mensaje 'tool' y la consulta (servicio, fecha), o None si falló: el error
+    se le pasa al modelo para que responda con lo que sí se pudo consultar.
+    """
+    try:
+        if tool_call.function.name != "get_availability":
+            raise ValueError(f"Herramienta desconocida: {tool_call.function.name}")
+        function_args = json.loads(tool_call.function.arguments)
+        service_id = int(function_args["service_id"])
+        # La fecha llega como string YYYY-MM-DD (clave de la conversación y de availability.py)
+        target_date = datetime.strptime(function_args["target_date"], "%Y-%m-%d").date()
+        # Resumen compacto (tramos libres, no un dict por slot); si ya se consultó
+        # (en esta conversación o en tool_cache) no se va a la base de datos
+        summary = fetch_availability(service_id, target_date, conversation, remember_query=False)
+        return summary_content(summary), (service_id, target_date)
+    except Exception as e:
+        logger.exception("Error ejecutando la herramienta %s", tool_call.function.name)
+        return summary_content({"error": f"Error al consultar la agenda: {e}"}), None
+
+
+def run_tool_calls(tool_calls: list, conversation: Optional[ConversationState] = None) -> List[str]:
+    """
+    Ejecuta en paralelo todas las llamadas de un turno (cada una abre su propia
+    sesión del pool) y devuelve los contenidos en el orden del modelo.
+    """
+    if len(tool_calls) == 1:
+        outcomes = [execute_tool_call(tool_calls[0], conversation)]
+    else:
+        # Una copia del contexto por llamada (request_id en sus logs); un Context no admite dos hilos a la vez
+        contexts = [contextvars.copy_context() for _ in tool_calls]
+        outcomes = list(tool_executor.map(
+            lambda context, call: context.run(execute_tool_call, call, conversation), contexts, tool_calls
+        ))
+    # La última consulta en el orden del modelo es el contexto de las continuaciones
+    queries = [query for _, query in outcomes if query is not None]
+    if conversation is not None and queries:
+        conversation.remember_query(*queries[-1])
+    return [content for content, _ in outcomes]
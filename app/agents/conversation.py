@@ -0,0 +1,306 @@
+"""
+Memoria de conversación del agente de WhatsApp, por teléfono.
+Guarda los últimos turnos (mensaje del usuario y respuesta) y los resultados
+de herramientas ya consultados (p. ej. los tramos libres de un servicio en una
+fecha), así un "¿y por la tarde?" se responde sin repetir la consulta ni la
+llamada al LLM. Un TTLCache local (LRU + caducidad) sirve a cada worker;
+con el backend "postgres" la tabla whatsapp_conversations lo comparte entre
+workers y es siempre la fuente de verdad (la copia local solo cubre fallos
+de lectura): los mensajes de un teléfono pueden alternar de worker.
+Crear, mover o cancelar citas invalida los resultados guardados de esa
+fecha (invalidate_tool_results); en el resto de workers los cubre el TTL
+de resultados, igual que a tool_cache. El pool de mensajes procesa en orden los de un mismo teléfono, así
+que no hay dos turnos de la misma conversación a la vez.
+"""
+
+import logging
+import threading
+import time
+from datetime import date, datetime, timedelta, timezone
+from typing import Any, Callable, Dict, List, Optional
+
+from sqlalchemy import delete, select
+from sqlalchemy.dialects import postgresql, sqlite
+
+from app.core.settings import settings
+from app.models.conversations import Conversation
+from app.utils.cache import MISSING, TTLCache
+
+logger = logging.getLogger(__name__)
+
+# Backends disponibles en settings.AGENT_CONVERSATION_BACKEND
+CONVERSATION_BACKENDS = ("memory", "postgres")
+
+
+def tool_result_key(service_id: int, target_date: date) -> str:
+    """Clave de un resultado de get_availability (serializable en JSON)."""
+    return f"get_availability:{service_id}:{target_date.isoformat()}"
+
+
+class ConversationState:
+    """
+    Estado de una conversación. Se guarda como dict JSON: los turnos son
+    pares user/assistant y los resultados de herramientas llevan su hora
+    de consulta (epoch) para caducar por separado.
+    """
+
+    def __init__(self, phone: str, data: Optional[Dict[str, Any]] = None):
+        data = data or {}
+        self.phone = phone
+        self.turns: List[Dict[str, str]] = list(data.get("turns", []))
+        self.tool_results: Dict[str, Dict[str, Any]] = dict(data.get("tool_results", {}))
+        self.last_service_id: Optional[int] = data.get("last_service_id")
+        last_date = data.get("last_date")
+        self.last_date: Optional[date] = date.fromisoformat(last_date) if last_date else None
+        self.updated: float = data.get("updated", 0.0)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "turns": self.turns,
+            "tool_results": self.tool_results,
+            "last_service_id": self.last_service_id,
+            "last_date": self.last_date.isoformat() if self.last_date else None,
+            "updated": self.updated,
+        }
+
+    @property
+    def has_query(self) -> bool:
+        """True si ya se consultó disponibilidad en esta conversación."""
+        return self.last_service_id is not None and self.last_date is not None
+
+    def remember_query(self, service_id: int, target_date: date) -> None:
+        self.last_service_id = service_id
+        self.last_date = target_date
+
+    def add_turn(self, user_text: str, reply: str, max_turns: int) -> None:
+        """Añade el intercambio y descarta los más antiguos por encima de max_turns."""
+        self.turns.append({"user": user_text, "assistant": reply})
+        if len(self.turns) > max_turns:
+            self.turns = self.turns[-max_turns:] if max_turns > 0 else []
+
+    def history_messages(self) -> List[Dict[str, str]]:
+        """Turnos anteriores en formato de mensajes de chat."""
+        messages = []
+        for turn in self.turns:
+            messages.append({"role": "user", "content": turn["user"]})
+            messages.append({"role": "assistant", "content": turn["assistant"]})
+        return messages
+
+    def get_tool_result(self, key: str, ttl: float, now: float) -> Any:
+        """Resultado guardado si no ha caducado; MISSING si no hay."""
+        entry = self.tool_results.get(key)
+        if entry is None or now - entry["at"] > ttl:
+            return MISSING
+        return entry["value"]
+
+    def set_tool_result(self, key: str, value: Any, now: float) -> None:
+        self.tool_results[key] = {"at": now, "value": value}
+
+    def fresh_tool_results(self, ttl: float, now: float) -> Dict[str, Any]:
+        """Resultados vigentes; de paso descarta los caducados para no arrastrarlos."""
+        self.tool_results = {
+            key: entry for key, entry in self.tool_results.items() if now - entry["at"] <= ttl
+        }
+        return {key: entry["value"] for key, entry in self.tool_results.items()}
+
+
+class ConversationStore:
+    """
+    Conversaciones por teléfono con tamaño máximo (LRU) y caducidad por inactividad.
+    Con `session_factory` (sessionmaker síncrono: el agente corre en un hilo)
+    persiste el estado en whatsapp_conversations.
+    Los resultados de herramientas se leen y escriben bajo un lock: las
+    llamadas paralelas de un turno comparten conversación desde varios hilos.
+    """
+
+    def __init__(
+        self,
+        ttl: float = 1800.0,
+        maxsize: int = 5000,
+        max_turns: int = 6,
+        tool_result_ttl: float = 120.0,
+        session_factory: Optional[Callable] = None,
+        purge_interval: float = 300.0,
+        clock: Callable[[], float] = time.time
+    ):
+        self.ttl = ttl
+        self.max_turns = max_turns
+        self.tool_result_ttl = tool_result_ttl
+        self.local = TTLCache(maxsize=maxsize, ttl=ttl, clock=clock)
+        self.session_factory = session_factory
+        self.purge_interval = purge_interval
+        self._clock = clock
+        self._next_purge = 0.0
+        # Última invalidación por fecha (None = todas): los resultados anteriores no valen
+        self._invalidated: Dict[Optional[date], float] = {}
+        self._lock = threading.Lock()
+        self.loads = 0
+        self.resumed = 0
+        self.tool_result_hits = 0
+        self.tool_result_misses = 0
+        self.errors = 0
+
+    def now(self) -> float:
+        return self._clock()
+
+    def load(self, phone: str) -> ConversationState:
+        """Conversación vigente del teléfono, o una nueva si no hay o caducó."""
+        self.loads += 1
+        if self.session_factory is None:
+            state = self.local.get(phone)
+        else:
+            # Siempre la fila compartida: la copia local puede no tener los turnos de otro worker
+            try:
+                state = self._load_shared(phone)
+            except Exception:
+                self.errors += 1
+                logger.exception("No se pudo leer la conversación de %s", phone)
+                state = self.local.get(phone)
+        if state is MISSING:
+            return ConversationState(phone)
+        self.resumed += 1
+        return state
+
+    def save(self, state: ConversationState) -> None:
+        state.updated = self.now()
+        state.fresh_tool_results(self.tool_result_ttl, state.updated)
+        self.local.set(state.phone, state)
+        if self.session_factory is None:
+            return
+        try:
+            self._save_shared(state)
+        except Exception:
+            # La conversación sigue en memoria: solo se pierde la copia compartida
+            self.errors += 1
+            logger.exception("No se pudo guardar la conversación de %s", state.phone)
+
+    def clear(self, phone: str) -> None:
+        self.local.invalidate(phone)
+        if self.session_factory is None:
+            return
+        try:
+            with self.session_factory() as db:
+                db.execute(delete(Conversation).where(Conversation.phone == phone))
+                db.commit()
+        except Exception:
+            self.errors += 1
+            logger.exception("No se pudo borrar la conversación de %s", phone)
+
+    def invalidate_tool_results(self, day: Optional[date] = None) -> None:
+        """
+        Marca como viejos los resultados de `day` (todos si es None) guardados
+        hasta ahora en cualquier conversación; se descartan al leerlos.
+        """
+        now = self.now()
+        with self._lock:
+            self._invalidated = {
+                key: at for key, at in self._invalidated.items() if now - at <= self.tool_result_ttl
+            }
+            self._invalidated[day] = now
+
+    def _drop_invalidated(self, state: ConversationState) -> None:
+        # Con self._lock tomado
+        if not self._invalidated:
+            return
+        everything = self._invalidated.get(None, float("-inf"))
+        for key, entry in list(state.tool_results.items()):
+            try:
+                day = date.fromisoformat(key.rsplit(":", 1)[1])
+            except ValueError:
+                day = None
+            if entry["at"] <= max(everything, self._invalidated.get(day, float("-inf"))):
+                del state.tool_results[key]
+
+    def fresh_tool_results(self, state: ConversationState) -> Dict[str, Any]:
+        """Resultados vigentes y no invalidados de la conversación."""
+        with self._lock:
+            self._drop_invalidated(state)
+            return state.fresh_tool_results(self.tool_result_ttl, self.now())
+
+    def get_tool_result(self, state: ConversationState, key: str) -> Any:
+        """Resultado de herramienta vigente de la conversación (cuenta aciertos y fallos)."""
+        with self._lock:
+            self._drop_invalidated(state)
+            value = state.get_tool_result(key, self.tool_result_ttl, self.now())
+            if value is MISSING:
+                self.tool_result_misses += 1
+            else:
+                self.tool_result_hits += 1
+            return value
+
+    def set_tool_result(self, state: ConversationState, key: str, value: Any, at: Optional[float] = None) -> None:
+        with self._lock:
+            state.set_tool_result(key, value, self.now() if at is None else at)
+
+    def remember_tool_result(self, state: Optional[ConversationState], key: str, compute: Callable[[], Any]) -> Any:
+        """
+        Devuelve el resultado guardado en la conversación o lo calcula (fuera
+        del lock: puede ir a la base de datos) y lo guarda.
+        """
+        if state is None:
+            return compute()
+        value = self.get_tool_result(state, key)
+        if value is MISSING:
+            # Fechado al empezar: si se invalida mientras se calcula, ya nace viejo
+            started = self.now()
+            value = compute()
+            self.set_tool_result(state, key, value, at=started)
+        return value
+
+    def _load_shared(self, phone: str) -> Any:
+        with self.session_factory() as db:
+            data = db.execute(select(Conversation.state).where(Conversation.phone == phone)).scalar()
+        if data is None or self.now() - data.get("updated", 0.0) > self.ttl:
+            return MISSING
+        state = ConversationState(phone, data)
+        self.local.set(phone, state)
+        return state
+
+    def _save_shared(self, state: ConversationState) -> None:
+        with self.session_factory() as db:
+            dialect = postgresql if db.bind.dialect.name == "postgresql" else sqlite
+            statement = dialect.insert(Conversation).values(phone=state.phone, state=state.to_dict())
+            statement = statement.on_conflict_do_update(
+                index_elements=[Conversation.phone],
+                set_={"state": statement.excluded.state, "updated_at": datetime.now(timezone.utc)}
+            )
+            db.execute(statement)
+            if self.now() >= self._next_purge:
+                self._next_purge = self.now() + self.purge_interval
+                cutoff = datetime.now(timezone.utc) - timedelta(seconds=self.ttl)
+                db.execute(delete(Conversation).where(Conversation.updated_at < cutoff))
+            db.commit()
+
+    def stats(self) -> Dict[str, Any]:
+        """Conversaciones reanudadas y aciertos de resultados de herramientas guardados."""
+        lookups = self.tool_result_hits + self.tool_result_misses
+        return {
+            "backend": "postgres" if self.session_factory is not None else "memory",
+            "loads": self.loads,
+            "resumed": self.resumed,
+            "tool_result_hits": self.tool_result_hits,
+            "tool_result_misses": self.tool_result_misses,
+            "tool_result_hit_rate": round(self.tool_result_hits / lookups, 4) if lookups else 0.0,
+            "errors": self.errors,
+            "local_entries": len(self.local),
+        }
+
+
+def build_conversation_store() -> ConversationStore:
+    """Crea la memoria de conversación según settings.AGENT_CONVERSATION_BACKEND."""
+    backend = settings.AGENT_CONVERSATION_BACKEND
+    if backend not in CONVERSATION_BACKENDS:
+        raise ValueError(
+            f"AGENT_CONVERSATION_BACKEND desconocido: {backend!r}. Opciones: {', '.join(CONVERSATION_BACKENDS)}"
+        )
+    session_factory = None
+    if backend == "postgres":
+        from app.db.session import SessionLocal
+        session_factory = SessionLocal
+    return ConversationStore(
+        ttl=settings.AGENT_CONVERSATION_TTL_SECONDS,
+        maxsize=settings.AGENT_CONVERSATION_MAX_ENTRIES,
+        max_turns=settings.AGENT_CONVERSATION_MAX_TURNS,
+        tool_result_ttl=settings.AGENT_CONVERSATION_TOOL_RESULT_TTL_SECONDS,
+        session_factory=session_factory
+    )
@@ -0,0 +1,132 @@
+"""
+Deduplicación de entregas del webhook de WhatsApp.
+Meta reentrega el mismo evento si tardamos en responder; cada mensaje trae
+un ID único (messages[].id) que usamos como clave. Un TTLCache local corta
+los reintentos que llegan al mismo worker sin tocar la base de datos; con
+varios workers, la tabla whatsapp_processed_messages hace de registro común
+(INSERT ... ON CONFLICT DO NOTHING es el "marcar como visto" atómico).
+"""
+
+import logging
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Dict, Optional
+
+from sqlalchemy import delete
+from sqlalchemy.dialects import postgresql, sqlite
+
+from app.core.settings import settings
+from app.models.processed_messages import ProcessedMessage
+from app.utils.cache import MISSING, TTLCache
+
+logger = logging.getLogger(__name__)
+
+# Backends disponibles en settings.WHATSAPP_DEDUP_BACKEND
+DEDUP_BACKENDS = ("memory", "postgres")
+
+
+class MessageDeduplicator:
+    """
+    Registro acotado (maxsize) y con ventana temporal (ttl) de IDs ya vistos.
+    Con `session_factory` (async_sessionmaker) se comparte entre workers vía base de datos.
+    """
+
+    def __init__(
+        self,
+        ttl: float = 86400.0,
+        maxsize: int = 10000,
+        session_factory: Optional[Callable] = None,
+        purge_interval: float = 60.0,
+        clock: Callable[[], float] = time.monotonic
+    ):
+        self.ttl = ttl
+        self.local = TTLCache(maxsize=maxsize, ttl=ttl, clock=clock)
+        self.session_factory = session_factory
+        self.purge_interval = purge_interval
+        self._clock = clock
+        self._next_purge = 0.0
+        self.lookups = 0
+        self.duplicates = 0
+        self.shared_duplicates = 0
+        self.errors = 0
+
+    async def is_duplicate(self, message_id: str) -> bool:
+        """Marca el mensaje como visto y devuelve True si ya lo estaba."""
+        self.lookups += 1
+        # Sin await entre get y set: en el event loop la comprobación es atómica
+        if self.local.get(message_id) is not MISSING:
+            self.duplicates += 1
+            return True
+        self.local.set(message_id, True)
+
+        if self.session_factory is None:
+            return False
+        try:
+            claimed = await self._claim(message_id)
+        except Exception:
+            # Ante un fallo de la base de datos preferimos procesar dos veces a perder el mensaje
+            self.errors += 1
+            logger.exception("No se pudo registrar el mensaje %s en la tabla de deduplicación", message_id)
+            return False
+        if not claimed:
+            self.duplicates += 1
+            self.shared_duplicates += 1
+        return not claimed
+
+    async def forget(self, message_id: str) -> None:
+        """Deshace is_duplicate() para que un reintento se procese (p. ej. cola llena)."""
+        self.local.invalidate(message_id)
+        if self.session_factory is None:
+            return
+        try:
+            async with self.session_factory() as db:
+                await db.execute(delete(ProcessedMessage).where(ProcessedMessage.message_id == message_id))
+                await db.commit()
+        except Exception:
+            self.errors += 1
+            logger.exception("No se pudo liberar el mensaje %s de la tabla de deduplicación", message_id)
+
+    async def _claim(self, message_id: str) -> bool:
+        async with self.session_factory() as db:
+            dialect = postgresql if db.bind.dialect.name == "postgresql" else sqlite
+            statement = (
+                dialect.insert(ProcessedMessage)
+                .values(message_id=message_id)
+                .on_conflict_do_nothing(index_elements=[ProcessedMessage.message_id])
+                .returning(ProcessedMessage.message_id)
+            )
+            claimed = (await db.execute(statement)).first() is not None
+            if self._clock() >= self._next_purge:
+                self._next_purge = self._clock() + self.purge_interval
+                cutoff = datetime.now(timezone.utc) - timedelta(seconds=self.ttl)
+                await db.execute(delete(ProcessedMessage).where(ProcessedMessage.received_at < cutoff))
+            await db.commit()
+            return claimed
+
+    def stats(self) -> Dict[str, Any]:
+        """Tasa de duplicados y estado de la caché local."""
+        return {
+            "backend": "postgres" if self.session_factory is not None else "memory",
+            "lookups": self.lookups,
+            "duplicates": self.duplicates,
+            "shared_duplicates": self.shared_duplicates,
+            "errors": self.errors,
+            "hit_rate": round(self.duplicates / self.lookups, 4) if self.lookups else 0.0,
+            "local_entries": len(self.local),
+        }
+
+
+def build_deduplicator() -> MessageDeduplicator:
+    """Crea el deduplicador según settings.WHATSAPP_DEDUP_BACKEND."""
+    backend = settings.WHATSAPP_DEDUP_BACKEND
+    if backend not in DEDUP_BACKENDS:
+        raise ValueError(f"WHATSAPP_DEDUP_BACKEND desconocido: {backend!r}. Opciones: {', '.join(DEDUP_BACKENDS)}")
+    session_factory = None
+    if backend == "postgres":
+        from app.db.session import AsyncSessionLocal
+        session_factory = AsyncSessionLocal
+    return MessageDeduplicator(
+        ttl=settings.WHATSAPP_DEDUP_TTL_SECONDS,
+        maxsize=settings.WHATSAPP_DEDUP_MAX_ENTRIES,
+        session_factory=session_factory
+    )
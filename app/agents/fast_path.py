@@ -0,0 +1,284 @@
+"""
+Atajo por reglas para el agente de reservas.
+La mayoría de mensajes de WhatsApp son variaciones de "¿hay hueco mañana
+para corte?". Este módulo reconoce esa intención de forma determinista
+(fecha + servicio de la tabla Service), responde con una plantilla a partir
+de get_available_slots y devuelve None en cuanto duda, para que el mensaje
+siga por el LLM. Las métricas separan aciertos del atajo y llamadas al LLM.
+"""
+
+import re
+import threading
+import unicodedata
+from collections import Counter
+from datetime import date, datetime, time, timedelta
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+from sqlalchemy.orm import Session
+
+from app.agents.conversation import ConversationState
+from app.agents.slot_summary import summary_start_times
+from app.agents.tools import get_availability_summary
+from app.models.services import Service
+
+# Devuelve el resumen de disponibilidad de (service_id, fecha)
+AvailabilityFetcher = Callable[[int, date], Dict[str, Any]]
+
+# Mensajes más largos suelen traer matices (varias preguntas, condiciones...)
+MAX_MESSAGE_LENGTH = 160
+
+# Palabras (sin tildes) que indican una consulta de disponibilidad
+AVAILABILITY_KEYWORDS = (
+    "hueco", "disponib", "libre", "sitio", "hora", "turno", "cita", "horario", "podeis", "puedo ir",
+)
+
+# Intenciones que el atajo no sabe resolver: cancelar, cambiar, precios, quejas...
+FALLBACK_KEYWORDS = (
+    "cancel", "anul", "cambi", "mover", "muev", "retras", "adelant", "precio", "cuesta", "cuanto",
+    "pagar", "reclam", "queja", "no puedo", "otro dia", "semana que viene", "proxim",
+)
+
+WEEKDAYS = ("lunes", "martes", "miercoles", "jueves", "viernes", "sabado", "domingo")
+MONTHS = (
+    "enero", "febrero", "marzo", "abril", "mayo", "junio",
+    "julio", "agosto", "septiembre", "octubre", "noviembre", "diciembre",
+)
+WEEKDAY_NAMES = ("lunes", "martes", "miércoles", "jueves", "viernes", "sábado", "domingo")
+
+# Continuación de una consulta anterior: "¿y por la tarde?", "¿y el viernes?"
+_FOLLOW_UP_RE = re.compile(r"^(y|e|entonces|vale y|ok y)\b")
+
+# Pregunta por una hora concreta: la plantilla no la contesta bien, mejor el LLM
+_SPECIFIC_TIME_RE = re.compile(r"\ba las? \d{1,2}\b|\b\d{1,2}:\d{2}\b")
+
+# Franjas del día que el atajo sabe filtrar
+MORNING_END = time(14, 0)
+PERIODS = {
+    "por la manana": (time(0, 0), MORNING_END),
+    "por la tarde": (MORNING_END, time(23, 59, 59)),
+}
+
+# Palabras que no sirven para identificar un servicio
+_STOPWORDS = {"de", "del", "la", "el", "los", "las", "y", "con", "para", "a", "en", "al"}
+
+_DAY_MONTH_RE = re.compile(r"\b(\d{1,2})[/-](\d{1,2})(?:[/-](\d{2,4}))?\b")
+_ISO_DATE_RE = re.compile(r"\b(\d{4})-(\d{2})-(\d{2})\b")
+_DAY_OF_MONTH_RE = re.compile(r"\b(\d{1,2}) de (" + "|".join(MONTHS) + r")\b")
+
+
+def normalize(text: str) -> str:
+    """Minúsculas, sin tildes ni signos de puntuación y con espacios simples."""
+    stripped = "".join(
+        char for char in unicodedata.normalize("NFD", text.lower())
+        if unicodedata.category(char) != "Mn"
+    )
+    return " ".join(re.sub(r"[^\w/\-]+", " ", stripped).split())
+
+
+def parse_period(text: str) -> Tuple[str, Optional[Tuple[time, time]]]:
+    """Extrae "por la mañana/tarde" del texto normalizado (y lo quita para no confundir 'mañana')."""
+    found = [(phrase, bounds) for phrase, bounds in PERIODS.items() if phrase in text]
+    if len(found) != 1:
+        return text, None
+    phrase, bounds = found[0]
+    return text.replace(phrase, " "), bounds
+
+
+def _build_date(year: int, month: int, day: int) -> Optional[date]:
+    try:
+        return date(year, month, day)
+    except ValueError:
+        return None
+
+
+def _next_occurrence(today: date, month: int, day: int) -> Optional[date]:
+    """Fecha día/mes sin año: la de este año o, si ya pasó, la del siguiente."""
+    candidate = _build_date(today.year, month, day)
+    if candidate is not None and candidate < today:
+        candidate = _build_date(today.year + 1, month, day)
+    return candidate
+
+
+def parse_date(text: str, today: date) -> Optional[date]:
+    """
+    Resuelve la fecha de un texto normalizado: hoy, mañana, pasado mañana,
+    días de la semana, "5 de febrero", 05/02, 05/02/2030 o 2030-02-05.
+    Devuelve None si no hay ninguna o si aparecen varias distintas.
+    """
+    found = set()
+
+    if re.search(r"\bpasado manana\b", text):
+        found.add(today + timedelta(days=2))
+        text = re.sub(r"\bpasado manana\b", " ", text)
+    if re.search(r"\bmanana\b", text):
+        found.add(today + timedelta(days=1))
+    if re.search(r"\bhoy\b", text):
+        found.add(today)
+
+    for index, name in enumerate(WEEKDAYS):
+        if re.search(rf"\b{name}\b", text):
+            # "el lunes" es el próximo lunes; si hoy es lunes, hoy
+            found.add(today + timedelta(days=(index - today.weekday()) % 7))
+
+    for year, month, day in _ISO_DATE_RE.findall(text):
+        found.add(_build_date(int(year), int(month), int(day)))
+    text = _ISO_DATE_RE.sub(" ", text)
+
+    for day, month, year in _DAY_MONTH_RE.findall(text):
+        if year:
+            full_year = int(year) + 2000 if len(year) == 2 else int(year)
+            found.add(_build_date(full_year, int(month), int(day)))
+        else:
+            found.add(_next_occurrence(today, int(month), int(day)))
+
+    for day, month_name in _DAY_OF_MONTH_RE.findall(text):
+        found.add(_next_occurrence(today, MONTHS.index(month_name) + 1, int(day)))
+
+    if len(found) != 1 or None in found:
+        return None
+    return found.pop()
+
+
+def _words(text: str) -> List[str]:
+    return [word for word in text.split() if word not in _STOPWORDS]
+
+
+def _stem(word: str) -> str:
+    # Plural español básico: cortes -> corte, uñas -> una(s)
+    return word[:-1] if len(word) > 4 and word.endswith("s") else word
+
+
+def match_service(text: str, services: Sequence[Service]) -> Optional[Service]:
+    """
+    Busca el servicio mencionado en el texto normalizado.
+    Gana el nombre completo; si no, la primera palabra significativa del nombre
+    ("corte" para "Corte de pelo"). Si coinciden varios, devuelve None.
+    """
+    words = {_stem(word) for word in text.split()}
+
+    full = [service for service in services if f" {normalize(service.name)} " in f" {text} "]
+    if len(full) == 1:
+        return full[0]
+    if len(full) > 1:
+        return None
+
+    partial = []
+    for service in services:
+        name_words = _words(normalize(service.name))
+        if name_words and _stem(name_words[0]) in words:
+            partial.append(service)
+    return partial[0] if len(partial) == 1 else None
+
+
+def _format_day(target: date, today: date) -> str:
+    if target == today:
+        return "hoy"
+    if target == today + timedelta(days=1):
+        return "mañana"
+    return f"el {WEEKDAY_NAMES[target.weekday()]} {target.day:02d}/{target.month:02d}"
+
+
+def render_reply(service: Service, target: date, today: date, start_times: List[datetime], max_times: int) -> str:
+    """Respuesta en plantilla con las primeras horas libres."""
+    day = _format_day(target, today)
+    if not start_times:
+        return f"Lo siento, no quedan huecos para {service.name} {day}. ¿Quieres que mire otro día?"
+    shown = ", ".join(moment.strftime("%H:%M") for moment in start_times[:max_times])
+    extra = len(start_times) - max_times
+    more = f" (y {extra} horario{'s' if extra > 1 else ''} más)" if extra > 0 else ""
+    return f"Para {service.name} {day} tenemos hueco a las {shown}{more}. ¿Cuál te viene mejor?"
+
+
+def try_fast_path(
+    db: Session,
+    user_prompt: str,
+    now: Optional[datetime] = None,
+    max_times: int = 8,
+    conversation: Optional[ConversationState] = None,
+    fetch_availability: Optional[AvailabilityFetcher] = None
+) -> Tuple[Optional[str], str]:
+    """
+    Intenta responder sin LLM. Devuelve (respuesta, motivo): la respuesta es
+    None cuando el mensaje debe ir al LLM y el motivo explica por qué.
+    Con `conversation`, una continuación ("¿y el viernes?") completa la fecha
+    o el servicio que falten con los de la consulta anterior.
+    `fetch_availability` permite reutilizar resultados ya consultados.
+    """
+    now = now or datetime.now()
+    today = now.date()
+    if fetch_availability is None:
+        def fetch_availability(service_id, target_date):
+            return get_availability_summary(db, service_id, target_date)
+
+    if len(user_prompt) > MAX_MESSAGE_LENGTH:
+        return None, "too_long"
+    text = normalize(user_prompt)
+    if any(keyword in text for keyword in FALLBACK_KEYWORDS):
+        return None, "unsupported_intent"
+    follow_up = conversation is not None and conversation.has_query and _FOLLOW_UP_RE.match(text) is not None
+    if not follow_up and not any(keyword in text for keyword in AVAILABILITY_KEYWORDS):
+        return None, "no_intent"
+    if _SPECIFIC_TIME_RE.search(text):
+        return None, "specific_time"
+
+    text, period = parse_period(text)
+    target = parse_date(text, today)
+    if target is None and follow_up:
+        target = conversation.last_date
+    if target is None:
+        return None, "no_date"
+    if target < today:
+        return None, "past_date"
+
+    services = db.query(Service).filter(Service.is_active == True).all()
+    service = match_service(text, services)
+    if service is None and follow_up:
+        service = next((item for item in services if item.id == conversation.last_service_id), None)
+    if service is None:
+        return None, "no_service"
+
+    summary = fetch_availability(service.id, target)
+    if conversation is not None:
+        conversation.remember_query(service.id, target)
+    # Horas distintas: varios profesionales pueden compartir hora y basta con ofrecerla una vez
+    start_times = [
+        moment for moment in summary_start_times(summary, target)
+        if moment > now and (period is None or period[0] <= moment.time() < period[1])
+    ]
+    return render_reply(service, target, today, start_times, max_times), "hit"
+
+
+class AgentMetrics:
+    """Tasa de acierto del atajo y latencias por camino (atajo vs LLM). Seguro entre hilos."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.fallback_reasons: Counter = Counter()
+        self._latency: Dict[str, List[float]] = {"fast_path": [0, 0.0, 0.0], "llm": [0, 0.0, 0.0]}
+
+    def observe(self, path: str, seconds: float, reason: Optional[str] = None) -> None:
+        with self._lock:
+            entry = self._latency[path]
+            entry[0] += 1
+            entry[1] += seconds
+            entry[2] = max(entry[2], seconds)
+            if reason is not None:
+                self.fallback_reasons[reason] += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            hits = self._latency["fast_path"][0]
+            total = hits + self._latency["llm"][0]
+            data: Dict[str, Any] = {
+                "requests": total,
+                "fast_path_hits": hits,
+                "fast_path_hit_rate": round(hits / total, 4) if total else 0.0,
+                "fallback_reasons": dict(self.fallback_reasons),
+            }
+            for path, (count, total_seconds, max_seconds) in self._latency.items():
+                data[path] = {
+                    "count": count,
+                    "avg_ms": round(total_seconds / count * 1000, 3) if count else 0.0,
+                    "max_ms": round(max_seconds * 1000, 3),
+                }
+        return data
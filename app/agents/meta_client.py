@@ -0,0 +1,171 @@
+"""
+Cliente HTTP compartido para la Cloud API de WhatsApp (Meta).
+Un único httpx.AsyncClient por worker reutiliza las conexiones TCP+TLS
+(keep-alive y HTTP/2 si está instalado 'h2') en lugar de abrir una por
+respuesta. Los envíos se reintentan con backoff exponencial (acotado por
+max_backoff) ante 429, 5xx y fallos al conectar; un timeout de lectura no se
+reintenta porque Meta pudo recibir el mensaje y el cliente lo vería
+duplicado. La URL base es configurable para apuntar a un Meta falso en tests
+y benchmarks.
+"""
+
+import asyncio
+import importlib.util
+import logging
+import random
+from typing import Any, Dict, Optional
+
+import httpx
+
+from app.core.settings import settings
+
+logger = logging.getLogger(__name__)
+
+# Respuestas de Meta que merece la pena reintentar
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+
+# Errores en los que la petición no llegó a enviarse: reintentar no duplica el mensaje
+RETRYABLE_ERRORS = (httpx.ConnectError, httpx.ConnectTimeout)
+
+
+class MetaClient:
+    """Envía mensajes de WhatsApp con un AsyncClient de larga duración."""
+
+    def __init__(
+        self,
+        base_url: str,
+        token: str,
+        phone_number_id: str,
+        timeout: float = 10.0,
+        connect_timeout: float = 5.0,
+        max_connections: int = 20,
+        max_keepalive_connections: int = 10,
+        http2: bool = True,
+        retries: int = 3,
+        backoff: float = 0.5,
+        max_backoff: float = 30.0,
+        transport: Optional[httpx.AsyncBaseTransport] = None
+    ):
+        self.base_url = base_url.rstrip("/")
+        self.token = token
+        self.phone_number_id = phone_number_id
+        self.timeout = httpx.Timeout(timeout, connect=connect_timeout)
+        self.limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections
+        )
+        # HTTP/2 solo si el paquete 'h2' está disponible; si no, HTTP/1.1 con keep-alive
+        self.http2 = http2 and importlib.util.find_spec("h2") is not None
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self._transport = transport
+        self._client: Optional[httpx.AsyncClient] = None
+        self.sent = 0
+        self.retried = 0
+        self.failed = 0
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        """El AsyncClient compartido (se crea al primer uso si el lifespan no lo abrió)."""
+        if self._client is None or self._client.is_closed:
+            self.start()
+        return self._client
+
+    def start(self) -> None:
+        if self._client is not None and not self._client.is_closed:
+            return
+        self._client = httpx.AsyncClient(
+            base_url=self.base_url,
+            headers={"Authorization": f"Bearer {self.token}"},
+            timeout=self.timeout,
+            limits=self.limits,
+            http2=self.http2,
+            transport=self._transport
+        )
+
+    async def aclose(self) -> None:
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    def _delay(self, attempt: int, response: Optional[httpx.Response]) -> Optional[float]:
+        """
+        Backoff exponencial con jitter, hasta max_backoff; respeta Retry-After
+        si Meta lo envía. None si Retry-After pide esperar más que max_backoff.
+        """
+        if response is not None:
+            retry_after = response.headers.get("Retry-After")
+            if retry_after and retry_after.isdigit():
+                return float(retry_after) if float(retry_after) <= self.max_backoff else None
+        return min(self.backoff * (2 ** attempt), self.max_backoff) * random.uniform(0.5, 1.0)
+
+    async def post_message(self, payload: Dict[str, Any]) -> httpx.Response:
+        """
+        POST /{phone_number_id}/messages con reintentos.
+        Devuelve la última respuesta; relanza el error de red si se agotan los intentos.
+        """
+        path = f"/{self.phone_number_id}/messages"
+        for attempt in range(self.retries + 1):
+            response = None
+            try:
+                response = await self.client.post(path, json=payload)
+                if response.status_code not in RETRYABLE_STATUS:
+                    if response.is_success:
+                        self.sent += 1
+                    else:
+                        self.failed += 1
+                    return response
+            except RETRYABLE_ERRORS as error:
+                if attempt == self.retries:
+                    self.failed += 1
+                    raise
+                logger.warning("Error de red enviando a Meta (intento %d): %s", attempt + 1, error)
+            except httpx.TransportError:
+                # La petición pudo llegar a Meta: reenviarla podría duplicar el mensaje
+                self.failed += 1
+                raise
+            delay = None if attempt == self.retries else self._delay(attempt, response)
+            if delay is None:
+                if attempt < self.retries:
+                    logger.warning("Meta pide esperar más de %.0f s (Retry-After): no se reintenta", self.max_backoff)
+                self.failed += 1
+                return response
+            self.retried += 1
+            await asyncio.sleep(delay)
+
+    async def send_text(self, to: str, text: str) -> httpx.Response:
+        return await self.post_message({
+            "messaging_product": "whatsapp",
+            "recipient_type": "individual",
+            "to": to,
+            "type": "text",
+            "text": {"body": text}
+        })
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "http2": self.http2,
+            "sent": self.sent,
+            "retried": self.retried,
+            "failed": self.failed,
+        }
+
+
+def build_meta_client(**overrides: Any) -> MetaClient:
+    """Crea el cliente con la configuración de Settings."""
+    options = dict(
+        base_url=settings.META_API_BASE_URL,
+        token=settings.WHATSAPP_TOKEN,
+        phone_number_id=settings.PHONE_NUMBER_ID,
+        timeout=settings.META_HTTP_TIMEOUT_SECONDS,
+        connect_timeout=settings.META_HTTP_CONNECT_TIMEOUT_SECONDS,
+        max_connections=settings.META_HTTP_MAX_CONNECTIONS,
+        max_keepalive_connections=settings.META_HTTP_MAX_KEEPALIVE,
+        http2=settings.META_HTTP2,
+        retries=settings.META_HTTP_RETRIES,
+        backoff=settings.META_HTTP_BACKOFF_SECONDS,
+        max_backoff=settings.META_HTTP_MAX_BACKOFF_SECONDS
+    )
+    options.update(overrides)
+    return MetaClient(**options)
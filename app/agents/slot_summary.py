@@ -0,0 +1,120 @@
+"""
+Resumen compacto de slots para el contexto del LLM.
+get_available_slots devuelve un dict por cada inicio posible (cada 15 minutos
+y por profesional), así que con muchos colaboradores el resultado de la
+herramienta ocupa miles de tokens repetidos. Aquí se colapsa en tramos libres
+por profesional más unas pocas horas sugeridas repartidas a lo largo del día.
+Los tramos son los huecos libres del motor de disponibilidad (uno por hueco de
+cada turno, ver get_available_slots_with_intervals): de ellos salen exactamente
+los slots, sea cual sea la duración del servicio.
+"""
+
+import json
+from datetime import date, datetime, timedelta
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from app.utils.availability import SLOT_STEP_MINUTES
+
+TIME_FORMAT = "%H:%M"
+
+
+def merge_slot_ranges(slots: Sequence[dict]) -> List[List[datetime]]:
+    """
+    Une slots solapados de un mismo profesional en tramos [inicio, fin], para
+    cuando solo se tienen los slots. Cualquier inicio del tramo (en pasos de
+    SLOT_STEP_MINUTES) que deje terminar el servicio antes de `fin` está libre.
+    Los que solo se tocan no se unen (pueden venir de turnos seguidos), así
+    que con servicios de SLOT_STEP_MINUTES o menos cada slot queda en su tramo:
+    summarize_slots prefiere los huecos libres del motor.
+    """
+    ranges: List[List[datetime]] = []
+    for slot in sorted(slots, key=lambda item: item["start_time"]):
+        if ranges and slot["start_time"] < ranges[-1][1]:
+            ranges[-1][1] = max(ranges[-1][1], slot["end_time"])
+        else:
+            ranges.append([slot["start_time"], slot["end_time"]])
+    return ranges
+
+
+def suggest_times(slots: Sequence[dict], limit: int) -> List[datetime]:
+    """Hasta `limit` horas de inicio distintas, repartidas entre la primera y la última."""
+    starts = sorted({slot["start_time"] for slot in slots})
+    if limit <= 0:
+        return []
+    if len(starts) <= limit:
+        return starts
+    if limit == 1:
+        return starts[:1]
+    last = len(starts) - 1
+    return [starts[round(index * last / (limit - 1))] for index in range(limit)]
+
+
+def summarize_slots(
+    slots: Sequence[dict],
+    max_suggestions: int = 10,
+    free_intervals: Optional[Dict[int, List[Tuple[datetime, datetime]]]] = None
+) -> Dict[str, Any]:
+    """
+    Resumen serializable de la salida de get_available_slots:
+    tramos libres por profesional y una lista acotada de horas sugeridas.
+    free_intervals son los huecos por colaborador de
+    get_available_slots_with_intervals; sin ellos, los tramos se reconstruyen
+    uniendo slots solapados (merge_slot_ranges).
+    """
+    by_collaborator: Dict[int, List[dict]] = {}
+    names: Dict[int, str] = {}
+    for slot in slots:
+        by_collaborator.setdefault(slot["collaborator_id"], []).append(slot)
+        names[slot["collaborator_id"]] = slot["collaborator_name"]
+
+    return {
+        "total_slots": len(slots),
+        "duration_minutes": slots[0]["available_minutes"] if slots else None,
+        "step_minutes": SLOT_STEP_MINUTES,
+        "collaborators": [
+            {
+                "id": collaborator_id,
+                "name": names[collaborator_id],
+                "free": [
+                    f"{start.strftime(TIME_FORMAT)}-{end.strftime(TIME_FORMAT)}"
+                    for start, end in (
+                        free_intervals[collaborator_id] if free_intervals is not None
+                        else merge_slot_ranges(collaborator_slots)
+                    )
+                ],
+            }
+            for collaborator_id, collaborator_slots in sorted(by_collaborator.items())
+        ],
+        "suggested_times": [moment.strftime(TIME_FORMAT) for moment in suggest_times(slots, max_suggestions)],
+    }
+
+
+def summary_content(summary: Any) -> str:
+    """Contenido del mensaje 'tool' para el LLM: el resumen en JSON compacto."""
+    return json.dumps(summary, ensure_ascii=False, separators=(",", ":"), default=str)
+
+
+def slots_tool_content(slots: Sequence[dict], max_suggestions: int = 10) -> str:
+    """Atajo: resume los slots y los serializa para el LLM."""
+    return summary_content(summarize_slots(slots, max_suggestions))
+
+
+def summary_start_times(summary: Dict[str, Any], day: date) -> List[datetime]:
+    """
+    Reconstruye las horas de inicio distintas a partir de los tramos del resumen.
+    Permite responder a partir de un resumen guardado sin volver a consultar la base de datos.
+    """
+    duration = timedelta(minutes=summary["duration_minutes"] or 0)
+    step = timedelta(minutes=summary["step_minutes"])
+    starts = set()
+    for collaborator in summary["collaborators"]:
+        for free_range in collaborator["free"]:
+            begin, end = (
+                datetime.combine(day, datetime.strptime(value, TIME_FORMAT).time())
+                for value in free_range.split("-")
+            )
+            moment = begin
+            while moment + duration <= end:
+                starts.add(moment)
+                moment += step
+    return sorted(starts)
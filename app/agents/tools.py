@@ -0,0 +1,101 @@
+"""
+Herramientas del agente de reservas.
+Cada herramienta devuelve datos serializables en JSON para poder guardarlos
+en la memoria de conversación y reutilizarlos en turnos posteriores.
+
+Las herramientas decoradas con @memoize_tool comparten tool_cache: muchos
+usuarios preguntan por el mismo servicio y día en pocos minutos, y así solo
+el primero abre sesión y recalcula. Las entradas caducan a los
+AGENT_TOOL_CACHE_TTL_SECONDS y se invalidan por fecha cuando cambian las citas
+o los horarios (la misma señal que vacía availability_cache).
+"""
+
+import functools
+import inspect
+from datetime import date, datetime, time
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+from sqlalchemy.orm import Session
+
+from app.agents.slot_summary import summarize_slots
+from app.core.settings import settings
+from app.db.session import SessionLocal
+from app.utils.availability import add_invalidation_listener, get_available_slots_with_intervals
+from app.utils.cache import MISSING, TTLCache
+
+# Resultados de herramientas por (nombre, argumentos); local a cada worker
+tool_cache = TTLCache(maxsize=settings.AGENT_TOOL_CACHE_SIZE, ttl=settings.AGENT_TOOL_CACHE_TTL_SECONDS)
+
+ToolKey = Tuple[str, Tuple[Tuple[str, Hashable], ...]]
+
+
+def memoize_tool(ttl: Optional[float] = None, cache: TTLCache = tool_cache) -> Callable:
+    """
+    Memoriza una herramienta del agente por su nombre y sus argumentos
+    (normalizados con la firma, así f(1, d) y f(service_id=1, target_date=d)
+    comparten entrada). Los argumentos deben ser hashables; los de tipo `date`
+    permiten invalidar por fecha con invalidate_tool_results().
+    Con ttl (o el de la caché) a 0 la herramienta se ejecuta siempre.
+    """
+    def decorator(tool: Callable) -> Callable:
+        signature = inspect.signature(tool)
+
+        def make_key(*args: Any, **kwargs: Any) -> ToolKey:
+            bound = signature.bind(*args, **kwargs)
+            bound.apply_defaults()
+            return tool.__name__, tuple(bound.arguments.items())
+
+        @functools.wraps(tool)
+        def wrapper(*args: Any, **kwargs: Any) -> Any:
+            if (cache.ttl if ttl is None else ttl) <= 0:
+                return tool(*args, **kwargs)
+            key = make_key(*args, **kwargs)
+            value = cache.get(key)
+            if value is not MISSING:
+                return value
+            # Si se invalida mientras calculamos, el resultado ya nace viejo: no se guarda
+            generation = cache.generation
+            value = tool(*args, **kwargs)
+            cache.set(key, value, ttl=ttl, generation=generation)
+            return value
+
+        wrapper.cache_key = make_key
+        return wrapper
+
+    return decorator
+
+
+def invalidate_tool_results(day: Optional[date] = None, cache: TTLCache = tool_cache) -> int:
+    """Elimina los resultados con algún argumento igual a `day` (todos si es None)."""
+    if day is None:
+        return cache.invalidate_where(lambda key: True)
+    return cache.invalidate_where(
+        lambda key: any(type(value) is date and value == day for _, value in key[1])
+    )
+
+
+# Crear, mover o cancelar citas (y cambiar horarios) vacía también estos resultados
+add_invalidation_listener(invalidate_tool_results)
+
+
+def get_availability_summary(db: Session, service_id: int, target_date: date, max_suggestions: int = 10) -> Dict[str, Any]:
+    """Tramos libres y horas sugeridas de un servicio en una fecha."""
+    slots, free_intervals = get_available_slots_with_intervals(
+        db=db,
+        target_date=datetime.combine(target_date, time.min),
+        service_id=service_id
+    )
+    return summarize_slots(slots, max_suggestions, free_intervals=free_intervals)
+
+
+@memoize_tool()
+def get_availability(service_id: int, target_date: date, max_suggestions: int = 10) -> Dict[str, Any]:
+    """
+    Herramienta get_availability. Solo abre sesión si el resultado no está
+    en tool_cache.
+    """
+    db = SessionLocal()
+    try:
+        return get_availability_summary(db, service_id, target_date, max_suggestions)
+    finally:
+        db.close()
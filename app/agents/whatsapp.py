@@ -0,0 +1,73 @@
+"""
+Procesamiento de los mensajes de WhatsApp fuera del webhook.
+El endpoint solo extrae los mensajes y los encola en message_pool;
+los workers ejecutan el agente (síncrono, en un hilo) y envían la
+respuesta a Meta sin bloquear el event loop.
+"""
+
+import asyncio
+import logging
+from typing import List, NamedTuple
+
+import httpx
+
+from app.agents.booking_agent import run_booking_agent
+from app.agents.dedup import build_deduplicator
+from app.agents.meta_client import build_meta_client
+from app.core.settings import settings
+from app.utils.worker_pool import BoundedWorkerPool
+
+logger = logging.getLogger(__name__)
+
+# Un AsyncClient por worker con conexiones persistentes; lo abre y cierra el lifespan
+meta_client = build_meta_client()
+
+# Pool compartido por el webhook; se arranca y detiene en el lifespan de la app
+message_pool = BoundedWorkerPool(
+    "whatsapp",
+    workers=settings.WHATSAPP_WORKERS,
+    maxsize=settings.WHATSAPP_QUEUE_SIZE
+)
+
+# IDs de mensaje ya recibidos: corta los reintentos de Meta antes de encolar
+message_deduplicator = build_deduplicator()
+
+
+class IncomingMessage(NamedTuple):
+    id: str
+    phone: str
+    text: str
+
+
+def extract_messages(body: dict) -> List[IncomingMessage]:
+    """
+    Devuelve todos los mensajes de texto del payload de Meta, en orden.
+    Meta agrupa a veces varios entries, changes y messages en un mismo POST.
+    Los eventos sin texto (estados de entrega, imágenes...) se ignoran.
+    """
+    messages = []
+    for entry in body.get('entry') or []:
+        for change in entry.get('changes') or []:
+            for message in (change.get('value') or {}).get('messages') or []:
+                if message.get('type', 'text') != 'text' or 'text' not in message:
+                    continue
+                messages.append(IncomingMessage(message['id'], message['from'], message['text']['body']))
+    return messages
+
+
+async def send_whatsapp_message(user_phone: str, text: str) -> httpx.Response:
+    """Envía un mensaje de texto al usuario por la Cloud API de Meta."""
+    response = await meta_client.send_text(user_phone, text)
+
+    if response.status_code == 200:
+        logger.info("Respuesta enviada con éxito a %s", user_phone)
+    else:
+        logger.warning("Error al enviar a Meta. Status: %s. Detalle: %s", response.status_code, response.text)
+    return response
+
+
+async def process_message(user_phone: str, user_text: str) -> None:
+    """Trabajo del pool: ejecuta el agente y responde al usuario."""
+    # run_booking_agent hace llamadas bloqueantes (OpenAI y base de datos síncrona)
+    ai_response = await asyncio.to_thread(run_booking_agent, user_text, user_phone)
+    await send_whatsapp_message(user_phone, ai_response)
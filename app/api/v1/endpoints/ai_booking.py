@@ -1,18 +1,19 @@
+import logging
+
 from fastapi import APIRouter, Request, Response, Query
-from app.agents.booking_agent import run_booking_agent
-import httpx
-import json
-from app.core.settings import settings
+from app.agents.booking_agent import agent_metrics, conversation_store
+from app.agents.tools import tool_cache
+from app.agents.whatsapp import extract_messages, message_deduplicator, message_pool, meta_client, process_message
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
 # --- CONFIGURACIÓN DE META ---
 # Recuerda que el WHATSAPP_TOKEN es temporal (24h). 
 # Si deja de funcionar, genera uno nuevo en el panel de Meta.
+# El envío de respuestas vive en app/agents/whatsapp.py
 VERIFY_TOKEN = "mi_token_secreto_123"
-WHATSAPP_TOKEN = settings.WHATSAPP_TOKEN
-PHONE_NUMBER_ID = settings.PHONE_NUMBER_ID
-WHATSAPP_URL = f"https://graph.facebook.com/v22.0/{PHONE_NUMBER_ID}/messages"
 
 @router.get("/whatsapp")
 async def verify_whatsapp(
@@ -24,61 +25,56 @@ async def verify_whatsapp(
     Paso obligatorio para que Meta valide que tu servidor existe y es seguro.
     """
     if mode == "subscribe" and token == VERIFY_TOKEN:
-        print("✅ Webhook verificado correctamente por Meta")
+        logger.info("Webhook verificado correctamente por Meta")
         return Response(content=challenge, media_type="text/plain")
     
-    print("❌ Fallo en la verificación del Webhook")
+    logger.warning("Fallo en la verificación del Webhook")
     return Response(content="Error de verificación", status_code=403)
 
 @router.post("/whatsapp")
 async def handle_whatsapp_message(request: Request):
     """
-    Recibe los mensajes del usuario, procesa con IA y responde.
+    Recibe los mensajes (todos los del lote) y acusa recibo al momento.
+    La IA y la respuesta a WhatsApp se procesan en segundo plano (message_pool),
+    así Meta no reintenta por una respuesta lenta.
+    Si la cola está llena devolvemos 503 para que Meta lo reintente más tarde.
+    Los reintentos de un mensaje ya recibido se descartan por su ID.
     """
     try:
         body = await request.json()
-        
-        # Estructura de Meta para extraer el mensaje
-        entry = body.get('entry', [{}])[0]
-        changes = entry.get('changes', [{}])[0]
-        value = changes.get('value', {})
-        
-        if 'messages' in value:
-            message = value['messages'][0]
-            user_phone = message['from']
-            user_text = message['text']['body']
-            
-            print(f"📩 Mensaje recibido de {user_phone}: {user_text}")
-            
-            # 1. Ejecutar el Agente de IA (Consulta disponibilidad en Neon)
-            ai_response = run_booking_agent(user_text)
-            
-            # 2. Enviar respuesta de vuelta a WhatsApp
-            async with httpx.AsyncClient() as client:
-                payload = {
-                    "messaging_product": "whatsapp",
-                    "recipient_type": "individual",
-                    "to": user_phone,
-                    "type": "text",
-                    "text": {"body": ai_response}
-                }
-                headers = {
-                    "Authorization": f"Bearer {WHATSAPP_TOKEN}",
-                    "Content-Type": "application/json"
-                }
-                
-                response = await client.post(WHATSAPP_URL, json=payload, headers=headers)
-                
-                # --- BLOQUE DE DEBUG PARA EL JUNIOR ---
-                print(f"📡 Intentando enviar respuesta...")
-                if response.status_code == 200:
-                    print(f"✅ Respuesta enviada con éxito a {user_phone}")
-                else:
-                    print(f"⚠️ Error al enviar a Meta. Status: {response.status_code}")
-                    print(f"🔍 Detalle del error de Meta: {response.text}")
-                # --------------------------------------
+        messages = extract_messages(body)
+    except Exception:
+        logger.exception("Error crítico procesando el webhook")
+        return {"status": "success"}
+
+    for message in messages:
+        if await message_deduplicator.is_duplicate(message.id):
+            logger.info("Reintento de Meta ignorado", extra={"message_id": message.id})
+            continue
+        logger.info("Mensaje recibido", extra={"message_id": message.id, "phone": message.phone})
+        # key=teléfono: mensajes de distintos usuarios en paralelo, los de uno mismo en orden
+        if not message_pool.submit(process_message, message.phone, message.text, key=message.phone):
+            # Lo olvidamos para que el reintento de Meta sí se procese
+            await message_deduplicator.forget(message.id)
+            return Response(content="Cola de mensajes llena", status_code=503)
+
+    return {"status": "success"}
 
-    except Exception as e:
-        print(f"❌ Error crítico procesando el webhook: {str(e)}")
-        
-    return {"status": "success"}
\ No newline at end of file
+
+@router.get("/whatsapp/stats")
+async def whatsapp_queue_stats():
+    """
+    Estado de la cola de mensajes de este worker: profundidad, trabajos
+    en curso, rechazados por backpressure y tiempos de espera y proceso,
+    más la tasa de reintentos descartados por la deduplicación, los envíos a Meta
+    la tasa de acierto y latencia del atajo del agente frente al LLM
+    y la reutilización de conversaciones y de resultados de herramientas.
+    """
+    return {
+        **message_pool.stats(),
+        "dedup": message_deduplicator.stats(),
+        "meta": meta_client.stats(),
+        "agent": agent_metrics.stats(),
+        "conversations": conversation_store.stats(),
+        "tool_cache": tool_cache.stats(),
+    }
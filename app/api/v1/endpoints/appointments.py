@@ -4,15 +4,18 @@ Este módulo contiene todos los endpoints CRUD, el sistema de disponibilidad
 y la vinculación automática con el dominio de clientes.
 """
 
-from typing import List, Optional
+from collections import defaultdict
+from typing import Any, Dict, List, Optional
 from datetime import datetime
-from fastapi import APIRouter, Depends, HTTPException, status, Query
-from sqlalchemy.orm import Session
-from sqlalchemy import and_
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Response
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import and_, func, select, tuple_
+from sqlalchemy.exc import IntegrityError
 
 # Importaciones con rutas absolutas
-from app.db.session import get_db
-from app.models.appointments import Appointment, AppointmentStatus
+from app.db.routing import mark_write
+from app.db.session import get_async_db, get_read_db
+from app.models.appointments import Appointment, AppointmentStatus, APPOINTMENT_OVERLAP_CONSTRAINT
 from app.models.services import Service
 from app.models.collaborators import Collaborator
 from app.models.clients import Client  # 💡 Importante para la vinculación
@@ -20,18 +23,40 @@ from app.schemas.appointments import (
     AppointmentCreate, AppointmentRead, AppointmentUpdate, 
     TimeSlot, AvailableSlotsResponse
 )
+from app.core.settings import settings
 from app.utils.availability import (
-    get_available_slots, is_valid_appointment_time
+    get_available_slots, is_valid_appointment_time, find_available_collaborator,
+    invalidate_availability
 )
+from app.utils.cache import MISSING, TTLCache
+from app.utils.pagination import decode_cursor, encode_cursor
 
 # Creamos el router de FastAPI para este dominio
 router = APIRouter()
 
+# Resúmenes recientes de /stats/summary (clave: filtros y desgloses pedidos)
+stats_summary_cache = TTLCache(maxsize=256, ttl=settings.STATS_SUMMARY_CACHE_TTL_SECONDS)
+
+# SQLSTATE de Postgres para exclusion_violation
+EXCLUSION_VIOLATION = "23P01"
+
+
+def _overlap_enforced_by_db(db: AsyncSession) -> bool:
+    """En Postgres los solapes los impide la restricción appointments_no_overlap."""
+    return db.bind.dialect.name == "postgresql"
+
+
+def _is_overlap_violation(error: IntegrityError) -> bool:
+    """True si el IntegrityError viene de la restricción de exclusión de citas."""
+    code = getattr(error.orig, "sqlstate", None) or getattr(error.orig, "pgcode", None)
+    return code == EXCLUSION_VIOLATION or APPOINTMENT_OVERLAP_CONSTRAINT in str(error.orig)
+
 
 @router.post("/", response_model=AppointmentRead, status_code=status.HTTP_201_CREATED)
 async def create_appointment(
     appointment_data: AppointmentCreate, 
-    db: Session = Depends(get_db)
+    response: Response,
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Crea una nueva cita. 
@@ -41,9 +66,10 @@ async def create_appointment(
     """
     
     # 1. Validar que el Servicio exista y esté activo
-    service = db.query(Service).filter(
+    result = await db.execute(select(Service).where(
         and_(Service.id == appointment_data.service_id, Service.is_active == True)
-    ).first()
+    ))
+    service = result.scalars().first()
     if not service:
         raise HTTPException(status_code=400, detail="Servicio no encontrado o inactivo")
 
@@ -51,13 +77,14 @@ async def create_appointment(
     final_collaborator_id = appointment_data.collaborator_id
 
     if not final_collaborator_id:
-        # Si no se envió ID, buscamos el primer profesional disponible para ese horario
-        from app.utils.availability import find_available_collaborator
-        final_collaborator_id = find_available_collaborator(
-            db, 
+        # Si no se envió ID, una sola consulta devuelve el primer profesional libre
+        # (horario, turno y solapamientos ya validados en SQL)
+        final_collaborator_id = await db.run_sync(
+            find_available_collaborator,
             appointment_data.start_time, 
             appointment_data.end_time,
-            appointment_data.service_id
+            appointment_data.service_id,
+            order_by=settings.COLLABORATOR_ASSIGNMENT_STRATEGY
         )
         
         if not final_collaborator_id:
@@ -67,28 +94,32 @@ async def create_appointment(
             )
     else:
         # Si se envió ID, validamos que el colaborador exista y esté activo
-        collaborator = db.query(Collaborator).filter(
+        result = await db.execute(select(Collaborator).where(
             and_(Collaborator.id == final_collaborator_id, Collaborator.is_active == True)
-        ).first()
+        ))
+        collaborator = result.scalars().first()
         if not collaborator:
             raise HTTPException(status_code=400, detail="Colaborador no encontrado")
 
-    # 3. Validar conflictos de horario (Solapamientos)
-    is_valid, error_message = is_valid_appointment_time(
-        db, 
-        final_collaborator_id,
-        appointment_data.start_time,
-        appointment_data.end_time
-    )
-    
-    if not is_valid:
-        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=error_message)
+        # 3. Validar horario laboral. Los solapamientos solo se consultan aquí
+        # si la base de datos no los impide por sí misma (SQLite en desarrollo)
+        is_valid, error_message = await db.run_sync(
+            is_valid_appointment_time,
+            final_collaborator_id,
+            appointment_data.start_time,
+            appointment_data.end_time,
+            check_conflicts=not _overlap_enforced_by_db(db)
+        )
+        
+        if not is_valid:
+            raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=error_message)
 
     # --- 🚀 4. GESTIÓN AUTOMÁTICA DEL CLIENTE (BUSCAR O CREAR) ---
     # Buscamos en la base de datos si ya existe un cliente con ese teléfono
     client = None
     if appointment_data.client_phone:
-        client = db.query(Client).filter(Client.phone == appointment_data.client_phone).first()
+        result = await db.execute(select(Client).where(Client.phone == appointment_data.client_phone))
+        client = result.scalars().first()
 
     if not client:
         # Si el cliente no existe, lo creamos desde cero
@@ -100,7 +131,7 @@ async def create_appointment(
         )
         db.add(client)
         # Usamos flush() para que la DB le asigne un ID, pero aún no confirma la transacción
-        db.flush() 
+        await db.flush() 
     else:
         # Si el cliente existe, actualizamos su nombre o email si han cambiado
         client.full_name = appointment_data.client_name
@@ -120,11 +151,23 @@ async def create_appointment(
     
     try:
         db.add(new_appointment)
-        db.commit() # Guardamos Cliente + Cita en una sola operación atómica
-        db.refresh(new_appointment)
+        await db.commit() # Guardamos Cliente + Cita en una sola operación atómica
+        await db.refresh(new_appointment)
+        invalidate_availability(final_collaborator_id, new_appointment.start_time, new_appointment.end_time)
+        # Las próximas lecturas de este cliente van a la principal, no a la réplica
+        mark_write(response)
         return new_appointment
+    except IntegrityError as e:
+        await db.rollback()
+        if _is_overlap_violation(e):
+            # Otra reserva concurrente se quedó antes con el hueco
+            raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Horario ya ocupado.")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, 
+            detail=f"Error al procesar la reserva: {str(e)}"
+        )
     except Exception as e:
-        db.rollback() # Si algo falla, no se crea ni el cliente ni la cita
+        await db.rollback() # Si algo falla, no se crea ni el cliente ni la cita
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, 
             detail=f"Error al procesar la reserva: {str(e)}"
@@ -133,34 +176,64 @@ async def create_appointment(
 
 @router.get("/", response_model=List[AppointmentRead])
 async def get_appointments(
+    response: Response,
     skip: int = Query(0, ge=0),
     limit: int = Query(100, ge=1, le=1000),
+    cursor: Optional[str] = Query(None, description="Cursor opaco devuelto en la cabecera X-Next-Cursor"),
     collaborator_id: Optional[int] = None,
     service_id: Optional[int] = None,
     status: Optional[AppointmentStatus] = None,
     date_from: Optional[datetime] = None,
     date_to: Optional[datetime] = None,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_read_db)
 ):
-    query = db.query(Appointment)
+    """
+    Lista citas de la más reciente a la más antigua.
+    Admite dos modos de paginación:
+    - offset: skip/limit (compatibilidad; se degrada en páginas profundas).
+    - cursor: se pasa el valor de la cabecera X-Next-Cursor de la página anterior
+      y la consulta continúa desde (start_time, id) usando el índice compuesto.
+    Mientras queden filas, la respuesta incluye X-Next-Cursor en ambos modos.
+    """
+    if cursor and skip:
+        raise HTTPException(status_code=400, detail="Use skip o cursor, no ambos")
+
+    query = select(Appointment)
     
     if collaborator_id:
-        query = query.filter(Appointment.collaborator_id == collaborator_id)
+        query = query.where(Appointment.collaborator_id == collaborator_id)
     if service_id:
-        query = query.filter(Appointment.service_id == service_id)
+        query = query.where(Appointment.service_id == service_id)
     if status:
-        query = query.filter(Appointment.status == status)
+        query = query.where(Appointment.status == status)
     if date_from:
-        query = query.filter(Appointment.start_time >= date_from)
+        query = query.where(Appointment.start_time >= date_from)
     if date_to:
-        query = query.filter(Appointment.start_time <= date_to)
+        query = query.where(Appointment.start_time <= date_to)
     
-    return query.order_by(Appointment.start_time.desc()).offset(skip).limit(limit).all()
+    if cursor:
+        try:
+            last_start, last_id = decode_cursor(cursor)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        query = query.where(tuple_(Appointment.start_time, Appointment.id) < tuple_(last_start, last_id))
+    else:
+        query = query.offset(skip)
+
+    # Pedimos una fila de más para saber si existe página siguiente
+    query = query.order_by(Appointment.start_time.desc(), Appointment.id.desc()).limit(limit + 1)
+    appointments = (await db.execute(query)).scalars().all()
+
+    if len(appointments) > limit:
+        appointments = appointments[:limit]
+        last = appointments[-1]
+        response.headers["X-Next-Cursor"] = encode_cursor(last.start_time, last.id)
+    return appointments
 
 
 @router.get("/{appointment_id}", response_model=AppointmentRead)
-async def get_appointment(appointment_id: int, db: Session = Depends(get_db)):
-    appointment = db.query(Appointment).filter(Appointment.id == appointment_id).first()
+async def get_appointment(appointment_id: int, db: AsyncSession = Depends(get_read_db)):
+    appointment = await db.get(Appointment, appointment_id)
     if not appointment:
         raise HTTPException(status_code=404, detail="Cita no encontrada")
     return appointment
@@ -170,9 +243,10 @@ async def get_appointment(appointment_id: int, db: Session = Depends(get_db)):
 async def update_appointment(
     appointment_id: int,
     appointment_data: AppointmentUpdate,
-    db: Session = Depends(get_db)
+    response: Response,
+    db: AsyncSession = Depends(get_async_db)
 ):
-    appointment = db.query(Appointment).filter(Appointment.id == appointment_id).first()
+    appointment = await db.get(Appointment, appointment_id)
     if not appointment:
         raise HTTPException(status_code=404, detail="Cita no encontrada")
     
@@ -182,35 +256,55 @@ async def update_appointment(
         new_end = appointment_data.end_time or appointment.end_time
         new_collab = appointment_data.collaborator_id or appointment.collaborator_id
         
-        is_valid, error = is_valid_appointment_time(db, new_collab, new_start, new_end)
+        is_valid, error = await db.run_sync(
+            is_valid_appointment_time, new_collab, new_start, new_end,
+            check_conflicts=not _overlap_enforced_by_db(db)
+        )
         if not is_valid:
             raise HTTPException(status_code=409, detail=error)
     
+    # Recordamos la agenda anterior para invalidar también los días que se liberan
+    previous_slot = (appointment.collaborator_id, appointment.start_time, appointment.end_time)
+
     update_data = appointment_data.dict(exclude_unset=True)
     for field, value in update_data.items():
         setattr(appointment, field, value)
     
-    db.commit()
-    db.refresh(appointment)
+    try:
+        await db.commit()
+    except IntegrityError as e:
+        await db.rollback()
+        if _is_overlap_violation(e):
+            raise HTTPException(status_code=409, detail="Horario ya ocupado.")
+        raise
+    await db.refresh(appointment)
+    invalidate_availability(*previous_slot)
+    invalidate_availability(appointment.collaborator_id, appointment.start_time, appointment.end_time)
+    mark_write(response)
     return appointment
 
 
 @router.delete("/{appointment_id}", status_code=status.HTTP_204_NO_CONTENT)
 async def delete_appointment(
     appointment_id: int,
+    response: Response,
     hard_delete: bool = False,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
-    appointment = db.query(Appointment).filter(Appointment.id == appointment_id).first()
+    appointment = await db.get(Appointment, appointment_id)
     if not appointment:
         raise HTTPException(status_code=404, detail="Cita no encontrada")
     
+    freed_slot = (appointment.collaborator_id, appointment.start_time, appointment.end_time)
+
     if hard_delete:
-        db.delete(appointment)
+        await db.delete(appointment)
     else:
         appointment.status = AppointmentStatus.CANCELLED
     
-    db.commit()
+    await db.commit()
+    invalidate_availability(*freed_slot)
+    mark_write(response)
 
 
 @router.get("/availability/slots", response_model=AvailableSlotsResponse)
@@ -218,18 +312,18 @@ async def get_available_slots_endpoint(
     date: str,
     service_id: int,
     collaborator_id: Optional[int] = None,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_read_db)
 ):
     try:
         target_date = datetime.strptime(date, "%Y-%m-%d")
     except ValueError:
         raise HTTPException(status_code=400, detail="Use YYYY-MM-DD")
     
-    service = db.query(Service).filter(Service.id == service_id).first()
+    service = await db.get(Service, service_id)
     if not service:
         raise HTTPException(status_code=404, detail="Servicio no encontrado")
     
-    available_slots = get_available_slots(db, target_date, service_id, collaborator_id)
+    available_slots = await db.run_sync(get_available_slots, target_date, service_id, collaborator_id)
     
     slot_responses = [
         TimeSlot(
@@ -249,24 +343,69 @@ async def get_available_slots_endpoint(
         total_slots=len(slot_responses)
     )
 
+def _status_counts(total: int, by_status: Dict[str, int]) -> Dict[str, Any]:
+    """Totales por estado (todos, aunque sean 0) y tasa de finalización."""
+    counts = {state.value: by_status.get(state.value, 0) for state in AppointmentStatus}
+    completed = counts[AppointmentStatus.COMPLETED.value]
+    return {
+        "total_appointments": total,
+        **counts,
+        "completion_rate": round((completed / total * 100) if total > 0 else 0, 2)
+    }
+
+
+def _breakdown(rows, key: str) -> List[Dict[str, Any]]:
+    """Agrupa las filas (status, collaborator_id, service_id, count) por una de las claves."""
+    groups: Dict[int, Dict[str, int]] = defaultdict(lambda: defaultdict(int))
+    for row in rows:
+        groups[row[key]][row["status"].value] += row["count"]
+    return [
+        {key: group_id, **_status_counts(sum(by_status.values()), by_status)}
+        for group_id, by_status in sorted(groups.items())
+    ]
+
+
 @router.get("/stats/summary")
 async def get_appointments_summary(
     date_from: Optional[datetime] = None,
     date_to: Optional[datetime] = None,
-    db: Session = Depends(get_db)
+    by_collaborator: bool = Query(False, description="Incluir el desglose por colaborador"),
+    by_service: bool = Query(False, description="Incluir el desglose por servicio"),
+    db: AsyncSession = Depends(get_read_db)
 ):
-    query = db.query(Appointment)
-    if date_from: query = query.filter(Appointment.start_time >= date_from)
-    if date_to: query = query.filter(Appointment.start_time <= date_to)
-    
-    total = query.count()
-    completed = query.filter(Appointment.status == AppointmentStatus.COMPLETED).count()
-    
-    return {
-        "total_appointments": total,
-        "scheduled": query.filter(Appointment.status == AppointmentStatus.SCHEDULED).count(),
-        "confirmed": query.filter(Appointment.status == AppointmentStatus.CONFIRMED).count(),
-        "completed": completed,
-        "cancelled": query.filter(Appointment.status == AppointmentStatus.CANCELLED).count(),
-        "completion_rate": round((completed / total * 100) if total > 0 else 0, 2)
-    }
\ No newline at end of file
+    """
+    Resumen de citas por estado en una sola consulta GROUP BY.
+    Los desgloses por colaborador y servicio salen de la misma consulta,
+    agrupando también por esas columnas y sumando en Python.
+    El resultado se cachea STATS_SUMMARY_CACHE_TTL_SECONDS en cada worker.
+    """
+    cache_key = (date_from, date_to, by_collaborator, by_service)
+    cached = stats_summary_cache.get(cache_key) if settings.STATS_SUMMARY_CACHE_TTL_SECONDS > 0 else MISSING
+    if cached is not MISSING:
+        return cached
+
+    group_columns = [Appointment.status]
+    if by_collaborator:
+        group_columns.append(Appointment.collaborator_id)
+    if by_service:
+        group_columns.append(Appointment.service_id)
+
+    query = select(*group_columns, func.count().label("count")).group_by(*group_columns)
+    if date_from: query = query.where(Appointment.start_time >= date_from)
+    if date_to: query = query.where(Appointment.start_time <= date_to)
+
+    rows = (await db.execute(query)).mappings().all()
+
+    by_status: Dict[str, int] = defaultdict(int)
+    for row in rows:
+        by_status[row["status"].value] += row["count"]
+
+    summary = _status_counts(sum(by_status.values()), by_status)
+    if by_collaborator:
+        summary["by_collaborator"] = _breakdown(rows, "collaborator_id")
+    if by_service:
+        summary["by_service"] = _breakdown(rows, "service_id")
+
+    if settings.STATS_SUMMARY_CACHE_TTL_SECONDS > 0:
+        stats_summary_cache.set(cache_key, summary, ttl=settings.STATS_SUMMARY_CACHE_TTL_SECONDS)
+    return summary
\ No newline at end of file
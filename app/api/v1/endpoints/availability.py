@@ -6,22 +6,30 @@ Este endpoint calcula los huecos libres (slots) basándose en:
 3. Duración del servicio solicitado.
 """
 
+import logging
+
 from fastapi import APIRouter, Depends, Query, HTTPException
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from datetime import datetime
 from typing import List, Optional
 
-from app.db.session import get_db
+from app.db.session import get_read_db
 from app.models.services import Service
-from app.utils.availability import get_available_slots 
-from app.schemas.appointments import AvailableSlotsResponse # 👈 Importante para el formato
+from app.utils.availability import availability_cache, get_available_slots, get_available_slots_range
+from app.schemas.appointments import AvailableSlotsResponse, AvailableSlotsRangeResponse # 👈 Importante para el formato
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter() 
 
+# Límite de días por consulta de rango (un calendario mensual)
+MAX_RANGE_DAYS = 31
+
 @router.get("/", response_model=AvailableSlotsResponse)
-def read_availability(
+async def read_availability(
     *,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_read_db),
     date: str = Query(..., description="Fecha en formato YYYY-MM-DD", example="2026-02-14"),
     service_id: int = Query(..., description="ID del servicio que se desea reservar"),
     collaborator_id: Optional[int] = Query(None, description="ID opcional de un profesional específico")
@@ -41,10 +49,11 @@ def read_availability(
             )
         
         # 2. Verificar que el servicio exista para obtener su duración
-        service = db.query(Service).filter(
+        result = await db.execute(select(Service).where(
             Service.id == service_id, 
             Service.is_active == True
-        ).first()
+        ))
+        service = result.scalars().first()
         
         if not service:
             raise HTTPException(
@@ -53,9 +62,10 @@ def read_availability(
             )
         
         # 3. Llamar a la lógica de cálculo en utils/availability.py
-        # Esta función ya maneja la lógica de filtrar citas y horarios laborales
-        slots = get_available_slots(
-            db=db,
+        # Esta función ya maneja la lógica de filtrar citas y horarios laborales.
+        # Es síncrona (la comparte el agente), así que corre sobre la conexión async con run_sync
+        slots = await db.run_sync(
+            get_available_slots,
             target_date=target_date,
             service_id=service_id,
             collaborator_id=collaborator_id
@@ -73,14 +83,102 @@ def read_availability(
 
     except HTTPException as he:
         raise he
-    except Exception as e:
-        # Log del error para debugging
-        print(f"❌ Error crítico en disponibilidad: {str(e)}")
+    except Exception:
+        logger.exception("Error crítico en disponibilidad")
+        raise HTTPException(
+            status_code=500, 
+            detail="Error interno al calcular la disponibilidad"
+        )
+
+@router.get("/range", response_model=AvailableSlotsRangeResponse)
+async def read_availability_range(
+    *,
+    db: AsyncSession = Depends(get_read_db),
+    date_from: str = Query(..., description="Fecha inicial en formato YYYY-MM-DD", examples=["2026-02-14"]),
+    date_to: str = Query(..., description="Fecha final (incluida) en formato YYYY-MM-DD", examples=["2026-02-27"]),
+    service_id: int = Query(..., description="ID del servicio que se desea reservar"),
+    collaborator_id: Optional[int] = Query(None, description="ID opcional de un profesional específico")
+):
+    """
+    Endpoint para obtener los slots disponibles de varios días en una sola llamada.
+    Pensado para pintar el selector de fechas del frontend sin hacer una
+    petición por día. La respuesta se agrupa por fecha.
+    """
+    try:
+        try:
+            start_date = datetime.strptime(date_from, "%Y-%m-%d")
+            end_date = datetime.strptime(date_to, "%Y-%m-%d")
+        except ValueError:
+            raise HTTPException(
+                status_code=400, 
+                detail="Formato de fecha inválido. Use YYYY-MM-DD"
+            )
+
+        if end_date < start_date:
+            raise HTTPException(
+                status_code=400,
+                detail="date_to debe ser igual o posterior a date_from"
+            )
+        if (end_date - start_date).days + 1 > MAX_RANGE_DAYS:
+            raise HTTPException(
+                status_code=400,
+                detail=f"El rango no puede superar {MAX_RANGE_DAYS} días"
+            )
+
+        result = await db.execute(select(Service).where(
+            Service.id == service_id, 
+            Service.is_active == True
+        ))
+        service = result.scalars().first()
+        
+        if not service:
+            raise HTTPException(
+                status_code=404, 
+                detail="El servicio solicitado no existe o no está activo"
+            )
+
+        slots_by_day = await db.run_sync(
+            get_available_slots_range,
+            date_from=start_date,
+            date_to=end_date,
+            service_id=service_id,
+            collaborator_id=collaborator_id
+        )
+
+        days = [
+            {
+                "date": day.isoformat(),
+                "available_slots": slots,
+                "total_slots": len(slots)
+            }
+            for day, slots in slots_by_day.items()
+        ]
+        return {
+            "date_from": date_from,
+            "date_to": date_to,
+            "service_id": service_id,
+            "service_duration": service.duration_minutes,
+            "days": days,
+            "total_slots": sum(day["total_slots"] for day in days)
+        }
+
+    except HTTPException as he:
+        raise he
+    except Exception:
+        logger.exception("Error crítico en disponibilidad por rango")
         raise HTTPException(
             status_code=500, 
             detail="Error interno al calcular la disponibilidad"
         )
 
+@router.get("/cache/stats")
+def read_availability_cache_stats():
+    """
+    Estado de la caché de intervalos libres de este worker:
+    tamaño, aciertos, fallos, expulsiones y tasa de acierto.
+    """
+    return availability_cache.stats()
+
 # --- NOTA PARA EL DESARROLLADOR JUNIOR ---
 # 1. El 'response_model' es quien hace la "magia" de convertir los objetos 
 #    datetime de Python al formato string que definimos en el Schema.
@@ -1,36 +1,55 @@
 # app/api/v1/endpoints/business_hours.py
 from typing import List, Optional
 from fastapi import APIRouter, Depends, HTTPException, status, Query
-from sqlalchemy.orm import Session
-from sqlalchemy import and_
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload
+from sqlalchemy import and_, delete, select
 from datetime import time, datetime
 
 from app.models.collaborators import Collaborator
 
-from app.db.session import get_db
+from app.db.session import get_async_db
 from app.models.business_hours import BusinessHours, TimeSlot
+from app.utils.availability import invalidate_collaborator_availability
 from app.schemas.business_hours import (
     BusinessHoursCreate, BusinessHoursRead, BusinessHoursUpdate
 )
 
 router = APIRouter()
 
+async def _load_business_hours(db: AsyncSession, business_hours_id: int) -> BusinessHours:
+    """
+    Recarga un horario con sus time_slots tras un commit.
+    populate_existing refresca también los valores generados por la DB
+    (created_at, updated_at) de los objetos que ya estaban en la sesión.
+    """
+    result = await db.execute(
+        select(BusinessHours)
+        .options(selectinload(BusinessHours.time_slots))
+        .where(BusinessHours.id == business_hours_id)
+        .execution_options(populate_existing=True)
+    )
+    return result.scalars().one()
+
 @router.get("/global-range")
 async def get_global_opening_range(
     day_of_week: int = Query(..., ge=0, le=6),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Calcula los intervalos reales de apertura del local basándose 
     en colaboradores activos.
     """
-    slots = db.query(TimeSlot).join(BusinessHours).join(Collaborator).filter(
-        and_(
-            BusinessHours.day_of_week == day_of_week,
-            BusinessHours.is_enabled == True,
-            Collaborator.is_active == True
-        )
-    ).order_by(TimeSlot.start_time).all()
+    result = await db.execute(
+        select(TimeSlot).join(BusinessHours).join(Collaborator).where(
+            and_(
+                BusinessHours.day_of_week == day_of_week,
+                BusinessHours.is_enabled == True,
+                Collaborator.is_active == True
+            )
+        ).order_by(TimeSlot.start_time)
+    )
+    slots = result.scalars().all()
 
     if not slots:
         return {"ranges": [], "is_open": False}
@@ -74,15 +93,18 @@ async def get_global_opening_range(
 async def get_business_hours(
     collaborator_id: int = Query(..., description="ID del colaborador obligatorio"),
     enabled_only: bool = Query(False),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Obtiene los horarios con sus slots ordenados cronológicamente."""
-    query = db.query(BusinessHours).filter(BusinessHours.collaborator_id == collaborator_id)
+    query = select(BusinessHours).options(selectinload(BusinessHours.time_slots)).where(
+        BusinessHours.collaborator_id == collaborator_id
+    )
     
     if enabled_only:
-        query = query.filter(BusinessHours.is_enabled == True)
+        query = query.where(BusinessHours.is_enabled == True)
     
-    business_hours = query.order_by(BusinessHours.day_of_week).all()
+    result = await db.execute(query.order_by(BusinessHours.day_of_week))
+    business_hours = result.scalars().all()
     
     # 💡 MEJORA CRÍTICA: Aseguramos que los slots dentro de cada día 
     # estén ordenados por hora de inicio antes de enviarlos al frontend.
@@ -94,14 +116,15 @@ async def get_business_hours(
 @router.post("/", response_model=BusinessHoursRead, status_code=status.HTTP_201_CREATED)
 async def create_business_hours(
     business_hours_data: BusinessHoursCreate,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
-    existing_hours = db.query(BusinessHours).filter(
+    result = await db.execute(select(BusinessHours).where(
         and_(
             BusinessHours.day_of_week == business_hours_data.day_of_week,
             BusinessHours.collaborator_id == business_hours_data.collaborator_id
         )
-    ).first()
+    ))
+    existing_hours = result.scalars().first()
     
     if existing_hours:
         raise HTTPException(
@@ -117,7 +140,7 @@ async def create_business_hours(
         collaborator_id=business_hours_data.collaborator_id
     )
     db.add(new_bh)
-    db.flush() 
+    await db.flush() 
     
     for slot_data in business_hours_data.time_slots:
         start = slot_data.start_time if isinstance(slot_data.start_time, time) else datetime.strptime(slot_data.start_time, "%H:%M").time()
@@ -130,42 +153,49 @@ async def create_business_hours(
             business_hours_id=new_bh.id
         ))
     
-    db.commit()
-    db.refresh(new_bh)
+    await db.commit()
+    new_bh = await _load_business_hours(db, new_bh.id)
+    invalidate_collaborator_availability(new_bh.collaborator_id, new_bh.day_of_week)
     return new_bh
 
 @router.put("/{business_hours_id}", response_model=BusinessHoursRead)
 async def update_business_hours(
     business_hours_id: int,
     update_data: BusinessHoursUpdate,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
-    db_bh = db.query(BusinessHours).filter(BusinessHours.id == business_hours_id).first()
+    db_bh = await db.get(BusinessHours, business_hours_id)
     if not db_bh:
         raise HTTPException(status_code=404, detail="No encontrado")
 
+    previous_owner = (db_bh.collaborator_id, db_bh.day_of_week)
+
     # Actualizamos campos básicos
     for key, value in update_data.model_dump(exclude={'time_slots'}, exclude_unset=True).items():
         setattr(db_bh, key, value)
 
     # Reemplazo de slots (Naive Time)
     if update_data.time_slots is not None:
-        db.query(TimeSlot).filter(TimeSlot.business_hours_id == business_hours_id).delete()
+        await db.execute(delete(TimeSlot).where(TimeSlot.business_hours_id == business_hours_id))
         for slot_data in update_data.time_slots:
             start = slot_data.start_time if isinstance(slot_data.start_time, time) else datetime.strptime(slot_data.start_time, "%H:%M").time()
             end = slot_data.end_time if isinstance(slot_data.end_time, time) else datetime.strptime(slot_data.end_time, "%H:%M").time()
             db.add(TimeSlot(start_time=start, end_time=end, slot_order=slot_data.slot_order, business_hours_id=db_bh.id))
 
-    db.commit()
-    db.refresh(db_bh)
+    await db.commit()
+    db_bh = await _load_business_hours(db, db_bh.id)
+    invalidate_collaborator_availability(*previous_owner)
+    invalidate_collaborator_availability(db_bh.collaborator_id, db_bh.day_of_week)
     db_bh.time_slots.sort(key=lambda x: x.start_time) # Ordenar antes de responder
     return db_bh
 
 @router.delete("/{business_hours_id}", status_code=status.HTTP_204_NO_CONTENT)
-async def delete_business_hours(business_hours_id: int, db: Session = Depends(get_db)):
-    db_bh = db.query(BusinessHours).filter(BusinessHours.id == business_hours_id).first()
+async def delete_business_hours(business_hours_id: int, db: AsyncSession = Depends(get_async_db)):
+    db_bh = await db.get(BusinessHours, business_hours_id)
     if not db_bh:
         raise HTTPException(status_code=404, detail="No encontrado")
-    db.delete(db_bh)
-    db.commit()
+    previous_owner = (db_bh.collaborator_id, db_bh.day_of_week)
+    await db.delete(db_bh)
+    await db.commit()
+    invalidate_collaborator_availability(*previous_owner)
     return None
\ No newline at end of file
@@ -1,15 +1,17 @@
 from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
-from app.db.session import get_db # Tu función para obtener la sesión
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.db.session import get_async_db # Tu función para obtener la sesión
 from app.models.clients import Client
 from app.schemas.client import ClientResponse
 
 router = APIRouter()
 
 @router.get("/search/{phone}", response_model=ClientResponse)
-def search_client_by_phone(phone: str, db: Session = Depends(get_db)):
+async def search_client_by_phone(phone: str, db: AsyncSession = Depends(get_async_db)):
     # Buscamos el primero que coincida con el teléfono
-    client = db.query(Client).filter(Client.phone == phone).first()
+    result = await db.execute(select(Client).where(Client.phone == phone))
+    client = result.scalars().first()
     
     if not client:
         # Si no existe, lanzamos un 404 (esto lo capturaremos en Svelte)
@@ -5,11 +5,11 @@ Este módulo contiene todos los endpoints CRUD para el dominio de colaboradores.
 
 from typing import List, Optional
 from fastapi import APIRouter, Depends, HTTPException, status, Query
-from sqlalchemy.orm import Session
-from sqlalchemy import and_, or_
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import and_, or_, func, select
 
 # Importaciones con rutas absolutas como se requiere
-from app.db.session import get_db
+from app.db.session import get_async_db
 from app.models.collaborators import Collaborator
 from app.schemas.collaborators import CollaboratorCreate, CollaboratorRead, CollaboratorUpdate
 
@@ -20,7 +20,7 @@ router = APIRouter()
 @router.post("/", response_model=CollaboratorRead, status_code=status.HTTP_201_CREATED)
 async def create_collaborator(
     collaborator_data: CollaboratorCreate, 
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Crea un nuevo colaborador en el sistema.
@@ -37,12 +37,13 @@ async def create_collaborator(
     """
     # Si se proporciona email, verificamos que no exista otro colaborador activo con ese email
     if collaborator_data.email:
-        existing_collaborator = db.query(Collaborator).filter(
+        result = await db.execute(select(Collaborator).where(
             and_(
                 Collaborator.email == collaborator_data.email.lower(),
                 Collaborator.is_active == True
             )
-        ).first()
+        ))
+        existing_collaborator = result.scalars().first()
         
         if existing_collaborator:
             raise HTTPException(
@@ -59,8 +60,8 @@ async def create_collaborator(
     
     # Guardamos en la base de datos
     db.add(new_collaborator)
-    db.commit()
-    db.refresh(new_collaborator)
+    await db.commit()
+    await db.refresh(new_collaborator)
     
     return new_collaborator
 
@@ -71,7 +72,7 @@ async def get_collaborators(
     limit: int = Query(100, ge=1, le=1000, description="Número máximo de registros a devolver"),
     active_only: bool = Query(True, description="Filtrar solo colaboradores activos"),
     search: Optional[str] = Query(None, description="Buscar por nombre o email"),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Obtiene la lista de colaboradores con filtros opcionales.
@@ -86,15 +87,15 @@ async def get_collaborators(
     Returns:
         List[CollaboratorRead]: Lista de colaboradores encontrados
     """
-    query = db.query(Collaborator)
+    query = select(Collaborator)
     
     # Aplicamos filtros
     if active_only:
-        query = query.filter(Collaborator.is_active == True)
+        query = query.where(Collaborator.is_active == True)
     
     if search:
         search_term = f"%{search}%"
-        query = query.filter(
+        query = query.where(
             or_(
                 Collaborator.name.ilike(search_term),
                 Collaborator.email.ilike(search_term)
@@ -102,7 +103,8 @@ async def get_collaborators(
         )
     
     # Aplicamos paginación y ordenamiento
-    collaborators = query.order_by(Collaborator.name).offset(skip).limit(limit).all()
+    result = await db.execute(query.order_by(Collaborator.name).offset(skip).limit(limit))
+    collaborators = result.scalars().all()
     
     return collaborators
 
@@ -110,7 +112,7 @@ async def get_collaborators(
 @router.get("/{collaborator_id}", response_model=CollaboratorRead)
 async def get_collaborator(
     collaborator_id: int,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Obtiene un colaborador específico por su ID.
@@ -125,7 +127,7 @@ async def get_collaborator(
     Raises:
         HTTPException: Si el colaborador no existe
     """
-    collaborator = db.query(Collaborator).filter(Collaborator.id == collaborator_id).first()
+    collaborator = await db.get(Collaborator, collaborator_id)
     
     if not collaborator:
         raise HTTPException(
@@ -140,7 +142,7 @@ async def get_collaborator(
 async def update_collaborator(
     collaborator_id: int,
     collaborator_data: CollaboratorUpdate,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Actualiza un colaborador existente.
@@ -157,7 +159,7 @@ async def update_collaborator(
         HTTPException: Si el colaborador no existe o hay conflicto de emails
     """
     # Buscamos el colaborador existente
-    collaborator = db.query(Collaborator).filter(Collaborator.id == collaborator_id).first()
+    collaborator = await db.get(Collaborator, collaborator_id)
     
     if not collaborator:
         raise HTTPException(
@@ -167,13 +169,14 @@ async def update_collaborator(
     
     # Si se está actualizando el email, verificamos que no exista otro colaborador con ese email
     if collaborator_data.email and collaborator_data.email != collaborator.email:
-        existing_collaborator = db.query(Collaborator).filter(
+        result = await db.execute(select(Collaborator).where(
             and_(
                 Collaborator.email == collaborator_data.email.lower(),
                 Collaborator.id != collaborator_id,
                 Collaborator.is_active == True
             )
-        ).first()
+        ))
+        existing_collaborator = result.scalars().first()
         
         if existing_collaborator:
             raise HTTPException(
@@ -190,8 +193,8 @@ async def update_collaborator(
             setattr(collaborator, field, value)
     
     # Guardamos los cambios
-    db.commit()
-    db.refresh(collaborator)
+    await db.commit()
+    await db.refresh(collaborator)
     
     return collaborator
 
@@ -200,7 +203,7 @@ async def update_collaborator(
 async def delete_collaborator(
     collaborator_id: int,
     hard_delete: bool = Query(False, description="Si es True, elimina permanentemente el registro"),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Elimina un colaborador (soft delete por defecto).
@@ -213,7 +216,7 @@ async def delete_collaborator(
     Raises:
         HTTPException: Si el colaborador no existe
     """
-    collaborator = db.query(Collaborator).filter(Collaborator.id == collaborator_id).first()
+    collaborator = await db.get(Collaborator, collaborator_id)
     
     if not collaborator:
         raise HTTPException(
@@ -223,16 +226,16 @@ async def delete_collaborator(
     
     if hard_delete:
         # Eliminación permanente (solo para administradores)
-        db.delete(collaborator)
+        await db.delete(collaborator)
     else:
         # Soft delete: marcamos como inactivo
         collaborator.is_active = False
     
-    db.commit()
+    await db.commit()
 
 
 @router.get("/stats/summary")
-async def get_collaborators_summary(db: Session = Depends(get_db)):
+async def get_collaborators_summary(db: AsyncSession = Depends(get_async_db)):
     """
     Obtiene un resumen estadístico de los colaboradores.
     
@@ -242,14 +245,18 @@ async def get_collaborators_summary(db: Session = Depends(get_db)):
     Returns:
         dict: Resumen con estadísticas de colaboradores
     """
-    total_collaborators = db.query(Collaborator).count()
-    active_collaborators = db.query(Collaborator).filter(Collaborator.is_active == True).count()
+    total_collaborators = await db.scalar(select(func.count()).select_from(Collaborator))
+    active_collaborators = await db.scalar(
+        select(func.count()).select_from(Collaborator).where(Collaborator.is_active == True)
+    )
     inactive_collaborators = total_collaborators - active_collaborators
     
     # Colaboradores con email
-    collaborators_with_email = db.query(Collaborator).filter(
-        and_(Collaborator.email.isnot(None), Collaborator.is_active == True)
-    ).count()
+    collaborators_with_email = await db.scalar(
+        select(func.count()).select_from(Collaborator).where(
+            and_(Collaborator.email.isnot(None), Collaborator.is_active == True)
+        )
+    )
     
     return {
         "total_collaborators": total_collaborators,
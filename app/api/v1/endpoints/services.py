@@ -5,11 +5,11 @@ Este módulo contiene todos los endpoints CRUD para el dominio de servicios.
 
 from typing import List, Optional
 from fastapi import APIRouter, Depends, HTTPException, status, Query
-from sqlalchemy.orm import Session
-from sqlalchemy import and_, or_
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import and_, or_, func, select
 
 # Importaciones con rutas absolutas como se requiere
-from app.db.session import get_db
+from app.db.session import get_async_db
 from app.models.services import Service
 from app.schemas.services import ServiceCreate, ServiceRead, ServiceUpdate
 
@@ -19,7 +19,7 @@ router = APIRouter()
 @router.post("/", response_model=ServiceRead, status_code=status.HTTP_201_CREATED)
 async def create_service(
     service_data: ServiceCreate, 
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Crea un nuevo servicio en el sistema.
@@ -35,9 +35,10 @@ async def create_service(
         HTTPException: Si ya existe un servicio con el mismo nombre
     """
     # Verificamos si ya existe un servicio con el mismo nombre
-    existing_service = db.query(Service).filter(
+    result = await db.execute(select(Service).where(
         and_(Service.name == service_data.name, Service.is_active == True)
-    ).first()
+    ))
+    existing_service = result.scalars().first()
     
     if existing_service:
         raise HTTPException(
@@ -55,8 +56,8 @@ async def create_service(
     
     # Guardamos en la base de datos
     db.add(new_service)
-    db.commit()
-    db.refresh(new_service)
+    await db.commit()
+    await db.refresh(new_service)
     
     return new_service
 
@@ -67,7 +68,7 @@ async def get_services(
     limit: int = Query(100, ge=1, le=1000, description="Número máximo de registros a devolver"),
     active_only: bool = Query(True, description="Filtrar solo servicios activos"),
     search: Optional[str] = Query(None, description="Buscar por nombre de servicio"),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Obtiene la lista de servicios con filtros opcionales.
@@ -82,17 +83,18 @@ async def get_services(
     Returns:
         List[ServiceRead]: Lista de servicios encontrados
     """
-    query = db.query(Service)
+    query = select(Service)
     
     # Aplicamos filtros
     if active_only:
-        query = query.filter(Service.is_active == True)
+        query = query.where(Service.is_active == True)
     
     if search:
-        query = query.filter(Service.name.ilike(f"%{search}%"))
+        query = query.where(Service.name.ilike(f"%{search}%"))
     
     # Aplicamos paginación
-    services = query.offset(skip).limit(limit).all()
+    result = await db.execute(query.offset(skip).limit(limit))
+    services = result.scalars().all()
     
     return [ServiceRead.from_orm(service) for service in services]
 
@@ -100,7 +102,7 @@ async def get_services(
 @router.get("/{service_id}", response_model=ServiceRead)
 async def get_service(
     service_id: int,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Obtiene un servicio específico por su ID.
@@ -115,7 +117,7 @@ async def get_service(
     Raises:
         HTTPException: Si el servicio no existe
     """
-    service = db.query(Service).filter(Service.id == service_id).first()
+    service = await db.get(Service, service_id)
     
     if not service:
         raise HTTPException(
@@ -130,7 +132,7 @@ async def get_service(
 async def update_service(
     service_id: int,
     service_data: ServiceUpdate,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Actualiza un servicio existente.
@@ -147,7 +149,7 @@ async def update_service(
         HTTPException: Si el servicio no existe o hay conflicto de nombres
     """
     # Buscamos el servicio existente
-    service = db.query(Service).filter(Service.id == service_id).first()
+    service = await db.get(Service, service_id)
     
     if not service:
         raise HTTPException(
@@ -157,13 +159,14 @@ async def update_service(
     
     # Si se está actualizando el nombre, verificamos que no exista otro servicio con ese nombre
     if service_data.name and service_data.name != service.name:
-        existing_service = db.query(Service).filter(
+        result = await db.execute(select(Service).where(
             and_(
                 Service.name == service_data.name,
                 Service.id != service_id,
                 Service.is_active == True
             )
-        ).first()
+        ))
+        existing_service = result.scalars().first()
         
         if existing_service:
             raise HTTPException(
@@ -177,8 +180,8 @@ async def update_service(
         setattr(service, field, value)
     
     # Guardamos los cambios
-    db.commit()
-    db.refresh(service)
+    await db.commit()
+    await db.refresh(service)
     
     return ServiceRead.from_orm(service)
 
@@ -187,7 +190,7 @@ async def update_service(
 async def delete_service(
     service_id: int,
     hard_delete: bool = Query(False, description="Si es True, elimina permanentemente el registro"),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Elimina un servicio (soft delete por defecto).
@@ -200,7 +203,7 @@ async def delete_service(
     Raises:
         HTTPException: Si el servicio no existe
     """
-    service = db.query(Service).filter(Service.id == service_id).first()
+    service = await db.get(Service, service_id)
     
     if not service:
         raise HTTPException(
@@ -210,18 +213,18 @@ async def delete_service(
     
     if hard_delete:
         # Eliminación permanente (solo para administradores)
-        db.delete(service)
+        await db.delete(service)
     else:
         # Soft delete: marcamos como inactivo
         service.is_active = False
     
-    db.commit()
+    await db.commit()
     
     return {"message": "Servicio eliminado exitosamente"}
 
 
 @router.get("/stats/summary")
-async def get_services_summary(db: Session = Depends(get_db)):
+async def get_services_summary(db: AsyncSession = Depends(get_async_db)):
     """
     Obtiene un resumen estadístico de los servicios.
     
@@ -231,20 +234,21 @@ async def get_services_summary(db: Session = Depends(get_db)):
     Returns:
         dict: Resumen con estadísticas de servicios
     """
-    total_services = db.query(Service).count()
-    active_services = db.query(Service).filter(Service.is_active == True).count()
+    total_services = await db.scalar(select(func.count()).select_from(Service))
+    active_services = await db.scalar(
+        select(func.count()).select_from(Service).where(Service.is_active == True)
+    )
     inactive_services = total_services - active_services
     
     # Precio promedio de los servicios activos
-    from sqlalchemy import func
-    avg_price = db.query(Service).filter(Service.is_active == True).with_entities(
-        func.avg(Service.price)
-    ).scalar() or 0
+    avg_price = await db.scalar(
+        select(func.avg(Service.price)).where(Service.is_active == True)
+    ) or 0
     
     # Duración promedio en minutos
-    avg_duration = db.query(Service).filter(Service.is_active == True).with_entities(
-        func.avg(Service.duration_minutes)
-    ).scalar() or 0
+    avg_duration = await db.scalar(
+        select(func.avg(Service.duration_minutes)).where(Service.is_active == True)
+    ) or 0
     
     return {
         "total_services": total_services,
@@ -0,0 +1,211 @@
+"""
+Logging estructurado y asíncrono.
+Los módulos siguen usando logging.getLogger(__name__); setup_logging() pone
+en la raíz un QueueHandler que solo encola el registro (nunca escribe en el
+hilo de la petición) y un QueueListener que, en su propio hilo, lo formatea
+como una línea JSON (o texto en desarrollo) y lo escribe en stdout. Otras
+salidas (p. ej. el fichero de consultas lentas) se pasan en `handlers` y
+también las atiende solo el listener.
+
+Cada registro lleva el request_id de la petición en curso (ContextVar):
+RequestIdMiddleware lo toma de X-Request-ID o lo genera, y se propaga a los
+hilos de los endpoints síncronos, a la capa de base de datos, a los trabajos
+de message_pool y a las herramientas del agente.
+
+Niveles por módulo desde Settings: LOG_LEVELS="app.db=DEBUG,httpx=WARNING".
+"""
+
+import json
+import logging
+import queue
+import re
+import sys
+import uuid
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+from typing import Any, Dict, Iterator, List, Optional, Sequence, TextIO
+
+REQUEST_ID_HEADER = "X-Request-ID"
+
+# IDs recibidos de fuera: solo caracteres seguros y longitud acotada
+_VALID_REQUEST_ID = re.compile(r"^[A-Za-z0-9._:-]{1,128}$")
+
+request_id_var: ContextVar[Optional[str]] = ContextVar("request_id", default=None)
+
+# Atributos estándar de LogRecord: el resto son campos `extra` y se incluyen en el JSON
+_RECORD_ATTRIBUTES = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime", "request_id"}
+
+TEXT_FORMAT = "%(asctime)s %(levelname)s %(name)s [%(request_id)s] %(message)s"
+
+
+def new_request_id() -> str:
+    return uuid.uuid4().hex
+
+
+def get_request_id() -> Optional[str]:
+    return request_id_var.get()
+
+
+@contextmanager
+def bind_request_id(request_id: Optional[str] = None) -> Iterator[str]:
+    """Fija el request_id del contexto actual (uno nuevo si no se indica)."""
+    request_id = request_id or new_request_id()
+    token = request_id_var.set(request_id)
+    try:
+        yield request_id
+    finally:
+        request_id_var.reset(token)
+
+
+class RequestIdFilter(logging.Filter):
+    """Copia el request_id al registro en el hilo que lo emite (el listener no ve el ContextVar)."""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if not hasattr(record, "request_id"):
+            record.request_id = request_id_var.get()
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    """Una línea JSON por registro: fecha UTC, nivel, logger, mensaje, request_id y campos extra."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry: Dict[str, Any] = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+            "request_id": getattr(record, "request_id", None),
+        }
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry["exc"] = record.exc_text
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_ATTRIBUTES and not key.startswith("_"):
+                entry[key] = value
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class StructuredQueueHandler(QueueHandler):
+    """
+    QueueHandler que conserva la traza y los campos extra por separado
+    (el de la librería estándar los mezcla en el mensaje) y que, con la cola
+    llena, descarta el registro en vez de bloquear.
+    """
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = logging.makeLogRecord(record.__dict__)
+        record.message = record.getMessage()
+        if record.exc_info:
+            # La traza se formatea aquí: el objeto excepción no debe cruzar al otro hilo
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+        record.msg, record.args, record.exc_info = record.message, None, None
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+def parse_levels(spec: str) -> Dict[str, str]:
+    """"app.db=DEBUG, httpx=WARNING" -> {"app.db": "DEBUG", "httpx": "WARNING"}."""
+    levels = {}
+    for item in spec.split(","):
+        if not item.strip():
+            continue
+        name, _, level = item.partition("=")
+        if not level.strip():
+            raise ValueError(f"LOG_LEVELS mal formado: {item!r} (se espera modulo=NIVEL)")
+        levels[name.strip()] = level.strip().upper()
+    return levels
+
+
+_handler: Optional[StructuredQueueHandler] = None
+_listener: Optional[QueueListener] = None
+_extra_handlers: List[logging.Handler] = []
+
+
+def setup_logging(
+    level: str = "INFO",
+    levels: str = "",
+    fmt: str = "json",
+    queue_size: int = 10000,
+    stream: Optional[TextIO] = None,
+    handlers: Sequence[logging.Handler] = ()
+) -> StructuredQueueHandler:
+    """
+    Configura la raíz con el QueueHandler y arranca el listener.
+    `handlers` son salidas adicionales (con sus propios filtros y formato)
+    que escribe el hilo del listener; stop_logging las cierra.
+    Se puede llamar de nuevo (p. ej. en tests): sustituye la configuración anterior.
+    """
+    global _handler, _listener, _extra_handlers
+    stop_logging()
+
+    log_queue: queue.Queue = queue.Queue(maxsize=queue_size)
+    _handler = StructuredQueueHandler(log_queue)
+    _handler.addFilter(RequestIdFilter())
+
+    output = logging.StreamHandler(stream or sys.stdout)
+    output.setFormatter(JsonFormatter() if fmt == "json" else logging.Formatter(TEXT_FORMAT))
+    _extra_handlers = list(handlers)
+    _listener = QueueListener(log_queue, output, *_extra_handlers, respect_handler_level=True)
+
+    root = logging.getLogger()
+    root.addHandler(_handler)
+    root.setLevel(level.upper())
+    for name, module_level in parse_levels(levels).items():
+        logging.getLogger(name).setLevel(module_level)
+    _listener.start()
+    return _handler
+
+
+def stop_logging() -> None:
+    """Vacía la cola (el listener escribe lo pendiente), retira el handler y cierra las salidas extra."""
+    global _handler, _listener, _extra_handlers
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+    for extra in _extra_handlers:
+        extra.close()
+    _extra_handlers = []
+    if _handler is not None:
+        logging.getLogger().removeHandler(_handler)
+        _handler = None
+
+
+class RequestIdMiddleware:
+    """
+    Middleware ASGI: asigna el request_id de cada petición (el de la cabecera
+    X-Request-ID si es válido, o uno nuevo) y lo devuelve en la respuesta.
+    Debe ser el más externo para que el resto de middlewares lo vean.
+    """
+
+    def __init__(self, app: Any):
+        self.app = app
+        self._header = REQUEST_ID_HEADER.lower().encode()
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        incoming = dict(scope.get("headers") or []).get(self._header, b"").decode("latin-1")
+        request_id = incoming if _VALID_REQUEST_ID.match(incoming) else None
+
+        with bind_request_id(request_id) as request_id:
+            async def send_wrapper(message):
+                if message["type"] == "http.response.start":
+                    message["headers"] = [*message.get("headers", []), (self._header, request_id.encode())]
+                await send(message)
+
+            await self.app(scope, receive, send_wrapper)
@@ -25,6 +25,45 @@ class Settings(BaseSettings):
     # --- Base de Datos ---
     # Usamos una sola variable genérica. El .env o Docker deciden el valor.
     DATABASE_URL: Optional[str] = None
+    # URL para el engine async. Si no se define se deriva de DATABASE_URL (asyncpg / aiosqlite).
+    DATABASE_ASYNC_URL: Optional[str] = None
+    # Réplica de solo lectura opcional para las consultas GET pesadas (disponibilidad, listados, stats)
+    DATABASE_READ_URL: Optional[str] = None
+    # Segundos que un cliente sigue leyendo de la principal después de escribir
+    READ_YOUR_WRITES_SECONDS: float = 5.0
+
+    # --- Pool de conexiones (por worker y por engine; Postgres) ---
+    # Conexiones máximas por worker = DB_POOL_SIZE + DB_MAX_OVERFLOW (x2: engine sync y async)
+    DB_POOL_SIZE: int = 5
+    DB_MAX_OVERFLOW: int = 10
+    # Segundos esperando conexión libre antes de lanzar TimeoutError
+    DB_POOL_TIMEOUT: float = 30.0
+    # Segundos de vida de una conexión antes de reciclarla (Neon corta las inactivas)
+    DB_POOL_RECYCLE: int = 300
+    # True: SELECT 1 antes de cada checkout (pesimista). False: confiar en DB_POOL_RECYCLE
+    DB_POOL_PRE_PING: bool = True
+    # Checkouts que tarden más de esto (ms) se registran como lentos
+    DB_POOL_SLOW_CHECKOUT_MS: float = 100.0
+    # Consultas por petición: cabeceras X-DB-Queries / X-DB-Time (fuera de producción) y aviso de N+1
+    DB_QUERY_STATS_ENABLED: bool = True
+    # Repeticiones de la misma sentencia en una petición a partir de las cuales se avisa
+    DB_N_PLUS_ONE_THRESHOLD: int = 10
+    # Consultas lentas: se registran las que tarden esto o más (ms; 0 = desactivado)
+    DB_SLOW_QUERY_MS: float = 200.0
+    # Fracción de SELECT lentos con su plan (EXPLAIN ANALYZE repite la consulta: mantenerla baja)
+    DB_SLOW_QUERY_EXPLAIN_SAMPLE_RATE: float = 0.05
+    # Fichero rotativo para las líneas JSON de consultas lentas (vacío: solo el logging normal)
+    DB_SLOW_QUERY_LOG_FILE: str = ""
+    DB_SLOW_QUERY_LOG_MAX_BYTES: int = 10_000_000
+    DB_SLOW_QUERY_LOG_BACKUPS: int = 5
+
+    # --- Métricas HTTP (/metrics, formato Prometheus) ---
+    METRICS_ENABLED: bool = True
+    # Directorio compartido por los workers de una máquina (vacío: cada worker expone solo lo suyo).
+    # Vaciarlo al desplegar: los contadores de workers terminados se conservan hasta entonces
+    METRICS_MULTIPROC_DIR: str = ""
+    # Cada cuánto vuelca un worker su snapshot al directorio compartido
+    METRICS_FLUSH_INTERVAL_SECONDS: float = 1.0
     
     # --- Seguridad ---    
     SECRET_KEY: Optional[str] = None
@@ -47,9 +86,71 @@ class Settings(BaseSettings):
     # --- Meta Ws ---
     WHATSAPP_TOKEN: str = ""
     PHONE_NUMBER_ID: str = ""
+    # Cliente HTTP compartido hacia la Cloud API (la URL base se puede apuntar a un Meta falso)
+    META_API_BASE_URL: str = "https://graph.facebook.com/v22.0"
+    META_HTTP_TIMEOUT_SECONDS: float = 10.0
+    META_HTTP_CONNECT_TIMEOUT_SECONDS: float = 5.0
+    META_HTTP_MAX_CONNECTIONS: int = 20
+    META_HTTP_MAX_KEEPALIVE: int = 10
+    META_HTTP2: bool = True
+    META_HTTP_RETRIES: int = 3
+    META_HTTP_BACKOFF_SECONDS: float = 0.5
+    # Espera máxima entre reintentos; un Retry-After mayor hace desistir
+    META_HTTP_MAX_BACKOFF_SECONDS: float = 30.0
+    # Procesamiento en segundo plano de los mensajes entrantes del webhook
+    WHATSAPP_WORKERS: int = 4
+    WHATSAPP_QUEUE_SIZE: int = 100
+    # Segundos que el apagado espera a que se vacíe la cola
+    WHATSAPP_SHUTDOWN_TIMEOUT_SECONDS: float = 10.0
+    # Deduplicación de reintentos de Meta por messages[].id:
+    # "memory" (por worker) o "postgres" (tabla compartida entre workers)
+    WHATSAPP_DEDUP_BACKEND: str = "memory"
+    WHATSAPP_DEDUP_TTL_SECONDS: float = 86400.0
+    WHATSAPP_DEDUP_MAX_ENTRIES: int = 10000
+    # Atajo por reglas del agente: responde "¿hay hueco mañana para corte?" sin llamar al LLM
+    AGENT_FAST_PATH_ENABLED: bool = True
+    # Horas libres que lista la respuesta en plantilla
+    AGENT_FAST_PATH_MAX_TIMES: int = 8
+    # Horas sugeridas que acompañan a los tramos libres en el resultado de la herramienta del LLM
+    AGENT_TOOL_MAX_SUGGESTIONS: int = 10
+    # Caché de resultados de herramientas del agente por argumentos (0 = desactivada).
+    # Se invalida por fecha al cambiar citas; el TTL cubre a los demás workers
+    AGENT_TOOL_CACHE_SIZE: int = 1024
+    AGENT_TOOL_CACHE_TTL_SECONDS: float = 30.0
+    # Llamadas a herramientas ejecutadas en paralelo (cada una con su sesión; cuenta para DB_POOL_SIZE)
+    AGENT_TOOL_WORKERS: int = 4
+    # Memoria de conversación por teléfono: "memory" (por worker) o "postgres" (compartida entre workers)
+    AGENT_CONVERSATION_BACKEND: str = "memory"
+    # Segundos sin mensajes tras los que la conversación empieza de cero
+    AGENT_CONVERSATION_TTL_SECONDS: float = 1800.0
+    AGENT_CONVERSATION_MAX_ENTRIES: int = 5000
+    # Turnos (mensaje + respuesta) que se envían al LLM como historial
+    AGENT_CONVERSATION_MAX_TURNS: int = 6
+    # Vigencia de la disponibilidad ya consultada dentro de una conversación
+    AGENT_CONVERSATION_TOOL_RESULT_TTL_SECONDS: float = 120.0
+
+    # --- Logging ---
+    # Nivel de la raíz y niveles por módulo ("app.db=DEBUG,httpx=WARNING")
+    LOG_LEVEL: str = "INFO"
+    LOG_LEVELS: str = "httpx=WARNING,httpcore=WARNING,openai=WARNING"
+    # "json" (una línea por registro, para producción) o "text" (legible en desarrollo)
+    LOG_FORMAT: str = "json"
+    # Registros pendientes de escribir; si se llena se descartan en lugar de bloquear
+    LOG_QUEUE_SIZE: int = 10000
 
     # Zona Horaria
     APP_TIMEZONE: str = "UTC"
+
+    # --- Reservas ---
+    # Estrategia para asignar profesional cuando la cita llega sin collaborator_id
+    # ("first" o "least_booked")
+    COLLABORATOR_ASSIGNMENT_STRATEGY: str = "first"
+    # Caché de intervalos libres por (colaborador, fecha)
+    AVAILABILITY_CACHE_ENABLED: bool = True
+    AVAILABILITY_CACHE_SIZE: int = 4096
+    AVAILABILITY_CACHE_TTL_SECONDS: float = 60.0
+    # Caché del resumen /appointments/stats/summary para dashboards que lo consultan en bucle (0 = desactivada)
+    STATS_SUMMARY_CACHE_TTL_SECONDS: float = 5.0
     
     # --- Propiedades Calculadas (Helpers) ---
     @property
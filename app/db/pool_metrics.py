@@ -0,0 +1,118 @@
+"""
+Métricas del pool de conexiones.
+Los pools instrumentados miden cuánto espera cada checkout (incluida la
+apertura de una conexión nueva) y registran un aviso cuando supera el umbral
+DB_POOL_SLOW_CHECKOUT_MS. El resumen se expone en /health/pool.
+"""
+
+import logging
+import threading
+import time
+from bisect import bisect_left
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.pool import AsyncAdaptedQueuePool, Pool, QueuePool
+
+logger = logging.getLogger(__name__)
+
+# Límites superiores (ms) de los cubos del histograma de espera; el último es +inf
+WAIT_BUCKETS_MS = (1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+
+
+class PoolMetrics:
+    """Contadores e histograma de espera de checkout de un pool. Seguro entre hilos."""
+
+    def __init__(self, name: str, slow_checkout_ms: float = 100.0):
+        self.name = name
+        self.slow_checkout_ms = slow_checkout_ms
+        self._lock = threading.Lock()
+        self.checkouts = 0
+        self.slow_checkouts = 0
+        self.timeouts = 0
+        self.total_wait_ms = 0.0
+        self.max_wait_ms = 0.0
+        self.buckets = [0] * (len(WAIT_BUCKETS_MS) + 1)
+
+    def observe(self, wait_ms: float, pool: Pool) -> None:
+        with self._lock:
+            self.checkouts += 1
+            self.total_wait_ms += wait_ms
+            self.max_wait_ms = max(self.max_wait_ms, wait_ms)
+            self.buckets[bisect_left(WAIT_BUCKETS_MS, wait_ms)] += 1
+            slow = wait_ms >= self.slow_checkout_ms
+            if slow:
+                self.slow_checkouts += 1
+        if slow:
+            logger.warning(
+                "Checkout lento en el pool %s: %.1f ms (%s)", self.name, wait_ms, pool.status()
+            )
+
+    def observe_timeout(self, wait_ms: float, pool: Pool) -> None:
+        with self._lock:
+            self.timeouts += 1
+        logger.error(
+            "Pool %s agotado: sin conexión libre tras %.1f ms (%s)", self.name, wait_ms, pool.status()
+        )
+
+    def histogram(self) -> List[Dict[str, Any]]:
+        bounds = [str(bound) for bound in WAIT_BUCKETS_MS] + ["+Inf"]
+        return [{"le_ms": bound, "count": count} for bound, count in zip(bounds, self.buckets)]
+
+    def snapshot(self, pool: Optional[Pool] = None) -> Dict[str, Any]:
+        """Estado actual del pool más los contadores acumulados."""
+        with self._lock:
+            data = {
+                "checkouts": self.checkouts,
+                "slow_checkouts": self.slow_checkouts,
+                "timeouts": self.timeouts,
+                "avg_wait_ms": round(self.total_wait_ms / self.checkouts, 3) if self.checkouts else 0.0,
+                "max_wait_ms": round(self.max_wait_ms, 3),
+                "wait_histogram": self.histogram(),
+            }
+        return {**pool_status(pool), **data} if pool is not None else data
+
+
+def pool_status(pool: Pool) -> Dict[str, Any]:
+    """Ocupación instantánea del pool (solo los QueuePool informan de tamaño y overflow)."""
+    status: Dict[str, Any] = {"pool_class": type(pool).__name__}
+    if isinstance(pool, QueuePool):
+        status.update(
+            size=pool.size(),
+            checked_out=pool.checkedout(),
+            checked_in=pool.checkedin(),
+            overflow=max(pool.overflow(), 0),
+        )
+    return status
+
+
+class _TimedCheckoutMixin:
+    """Mide el tiempo de _do_get (esperar hueco y, si hace falta, abrir la conexión)."""
+
+    metrics: Optional[PoolMetrics] = None
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except PoolTimeoutError:
+            if self.metrics is not None:
+                self.metrics.observe_timeout((time.perf_counter() - started) * 1000, self)
+            raise
+        if self.metrics is not None:
+            self.metrics.observe((time.perf_counter() - started) * 1000, self)
+        return connection
+
+    def recreate(self):
+        # engine.dispose() sustituye el pool: conservamos las métricas
+        new_pool = super().recreate()
+        new_pool.metrics = self.metrics
+        return new_pool
+
+
+class InstrumentedQueuePool(_TimedCheckoutMixin, QueuePool):
+    pass
+
+
+class InstrumentedAsyncAdaptedQueuePool(_TimedCheckoutMixin, AsyncAdaptedQueuePool):
+    pass
@@ -0,0 +1,151 @@
+"""
+Consultas SQL por petición.
+Los eventos de SQLAlchemy cuentan cada sentencia y su tiempo en el
+QueryStats de la petición en curso (un ContextVar: llega tanto a los
+endpoints async como a los síncronos que Starlette ejecuta en su threadpool).
+
+QueryStatsMiddleware abre ese contexto, añade X-DB-Queries y X-DB-Time (ms)
+a la respuesta fuera de producción y avisa de posibles N+1: la misma
+sentencia (por huella, sin parámetros ni literales) repetida más de
+DB_N_PLUS_ONE_THRESHOLD veces en una petición, lo típico de una relación
+perezosa recorrida fila a fila. Los trabajos de BoundedWorkerPool heredan
+el contexto de quien los encoló, así que abren su propio QueryStats: si no,
+sus consultas se sumarían a la petición que ya respondió.
+"""
+
+import logging
+import re
+import time
+from collections import Counter
+from contextvars import ContextVar
+from typing import Any, Dict, Optional
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger(__name__)
+
+_current_stats: ContextVar[Optional["QueryStats"]] = ContextVar("db_query_stats", default=None)
+
+# Literales y marcadores de parámetros de los distintos drivers (?, :nombre, %(nombre)s, %s, $1)
+_FINGERPRINT_RULES = (
+    (re.compile(r"'(?:[^']|'')*'"), "?"),
+    (re.compile(r"%\(\w+\)s|%s|\$\d+|(?<![:\w]):\w+"), "?"),
+    (re.compile(r"\b\d+(?:\.\d+)?\b"), "?"),
+    # IN (?, ?, ?) y VALUES repetidos cuentan como la misma sentencia
+    (re.compile(r"\(\s*\?(?:\s*,\s*\?)*\s*\)"), "(?)"),
+    (re.compile(r"\s+"), " "),
+)
+
+
+def fingerprint(statement: str) -> str:
+    """Sentencia normalizada: igual para todas las ejecuciones que solo cambian de parámetros."""
+    for pattern, replacement in _FINGERPRINT_RULES:
+        statement = pattern.sub(replacement, statement)
+    return statement.strip()
+
+
+class QueryStats:
+    """Sentencias y tiempo de base de datos de una petición."""
+
+    def __init__(self, scope: Optional[Dict[str, Any]] = None):
+        # Scope ASGI de la petición (None fuera de HTTP)
+        self.scope = scope
+        self.count = 0
+        self.total_ms = 0.0
+        self.fingerprints: Counter = Counter()
+
+    @property
+    def route(self) -> Optional[str]:
+        """"MÉTODO plantilla" una vez enrutada la petición (antes, la ruta concreta)."""
+        if self.scope is None:
+            return None
+        route = self.scope.get("route")
+        return f"{self.scope['method']} {getattr(route, 'path_format', None) or self.scope['path']}"
+
+    def observe(self, statement: str, elapsed_ms: float) -> None:
+        self.count += 1
+        self.total_ms += elapsed_ms
+        self.fingerprints[fingerprint(statement)] += 1
+
+    def repeated(self, threshold: int) -> Dict[str, int]:
+        """Huellas ejecutadas más de `threshold` veces."""
+        return {sql: count for sql, count in self.fingerprints.most_common() if count > threshold}
+
+
+def current_query_stats() -> Optional[QueryStats]:
+    return _current_stats.get()
+
+
+class track_queries:
+    """
+    Contexto que cuenta las sentencias ejecutadas dentro (también fuera de
+    una petición HTTP, p. ej. en tests o en los workers de WhatsApp).
+    """
+
+    def __init__(self, scope: Optional[Dict[str, Any]] = None):
+        self.scope = scope
+
+    def __enter__(self) -> QueryStats:
+        self.stats = QueryStats(self.scope)
+        self._token = _current_stats.set(self.stats)
+        return self.stats
+
+    def __exit__(self, *exc_info) -> None:
+        _current_stats.reset(self._token)
+
+
+def log_repeated_queries(stats: QueryStats, threshold: int, where: Optional[str] = None) -> None:
+    """Avisa de las sentencias repetidas más de `threshold` veces (posible N+1)."""
+    for statement, count in stats.repeated(threshold).items():
+        logger.warning("Posible N+1 en %s: %d ejecuciones de %s", where or stats.route, count, statement)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if _current_stats.get() is not None:
+        conn.info["query_started"] = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    stats = _current_stats.get()
+    started = conn.info.pop("query_started", None)
+    if stats is None or started is None:
+        return
+    stats.observe(statement, (time.perf_counter() - started) * 1000)
+
+
+def install_query_listeners() -> None:
+    """Escucha en la clase Engine: cubre el engine síncrono, el async y la réplica."""
+    if not event.contains(Engine, "before_cursor_execute", _before_cursor_execute):
+        event.listen(Engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(Engine, "after_cursor_execute", _after_cursor_execute)
+
+
+class QueryStatsMiddleware:
+    """Middleware ASGI que abre un QueryStats por petición HTTP."""
+
+    def __init__(self, app: Any, expose_headers: bool = True, n_plus_one_threshold: int = 10):
+        self.app = app
+        self.expose_headers = expose_headers
+        self.n_plus_one_threshold = n_plus_one_threshold
+        install_query_listeners()
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start" and self.expose_headers:
+                message["headers"] = [
+                    *message.get("headers", []),
+                    (b"x-db-queries", str(stats.count).encode()),
+                    (b"x-db-time", f"{stats.total_ms:.1f}".encode()),
+                ]
+            await send(message)
+
+        with track_queries(scope) as stats:
+            try:
+                await self.app(scope, receive, send_wrapper)
+            finally:
+                log_repeated_queries(stats, self.n_plus_one_threshold)
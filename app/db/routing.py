@@ -0,0 +1,45 @@
+"""
+Enrutado de lecturas entre la base de datos principal y la réplica.
+Tras una escritura (p. ej. reservar) el cliente recibe una cookie que, durante
+READ_YOUR_WRITES_SECONDS, manda sus lecturas a la principal para que nunca vea
+un hueco que acaba de ocupar. Es una cookie y no estado en memoria para que
+funcione igual con varios workers.
+"""
+
+import time
+
+from fastapi import Request, Response
+
+from app.core.settings import settings
+
+READ_YOUR_WRITES_COOKIE = "rw_until"
+
+# Claves en Session.info que leen las utilidades (p. ej. la caché de disponibilidad)
+REPLICA_SESSION = "replica"
+READ_YOUR_WRITES_SESSION = "read_your_writes"
+
+
+def mark_write(response: Response) -> None:
+    """Abre la ventana read-your-writes del cliente que acaba de escribir."""
+    window = settings.READ_YOUR_WRITES_SECONDS
+    if not settings.DATABASE_READ_URL or window <= 0:
+        return
+    response.set_cookie(
+        READ_YOUR_WRITES_COOKIE,
+        f"{time.time() + window:.3f}",
+        max_age=max(1, int(window + 0.999)),
+        httponly=True,
+        samesite="lax",
+        secure=settings.is_production,
+    )
+
+
+def in_read_your_writes_window(request: Request) -> bool:
+    """True si el cliente escribió hace menos de READ_YOUR_WRITES_SECONDS."""
+    value = request.cookies.get(READ_YOUR_WRITES_COOKIE)
+    if not value:
+        return False
+    try:
+        return float(value) > time.time()
+    except ValueError:
+        return False
@@ -1,21 +1,122 @@
+import logging
+
 from sqlalchemy import create_engine, text
+from sqlalchemy.engine import URL, make_url
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy.exc import OperationalError  # Importante para capturar fallos de red/auth
 
+from fastapi import Request
+
 from app.core.settings import settings
+from app.db.routing import READ_YOUR_WRITES_SESSION, REPLICA_SESSION, in_read_your_writes_window
+from app.db.pool_metrics import (
+    InstrumentedAsyncAdaptedQueuePool, InstrumentedQueuePool, PoolMetrics
+)
+from app.db.slow_queries import build_slow_query_log
+
+logger = logging.getLogger(__name__)
+
+# Métricas de checkout de cada engine (se exponen en /health/pool)
+sync_pool_metrics = PoolMetrics("sync", settings.DB_POOL_SLOW_CHECKOUT_MS)
+async_pool_metrics = PoolMetrics("async", settings.DB_POOL_SLOW_CHECKOUT_MS)
+read_pool_metrics = PoolMetrics("read", settings.DB_POOL_SLOW_CHECKOUT_MS)
+# Consultas que superan DB_SLOW_QUERY_MS en cualquiera de los engines
+slow_query_log = build_slow_query_log()
+
+def pool_options(database_url, poolclass) -> dict:
+    """
+    Parámetros del pool según Settings. SQLite (tests y desarrollo) conserva
+    el pool que elige su dialecto, porque QueuePool no encaja con :memory:.
+    """
+    options = {"pool_pre_ping": settings.DB_POOL_PRE_PING}
+    if make_url(database_url).get_backend_name() != "sqlite":
+        options.update(
+            poolclass=poolclass,
+            pool_size=settings.DB_POOL_SIZE,
+            max_overflow=settings.DB_MAX_OVERFLOW,
+            pool_timeout=settings.DB_POOL_TIMEOUT,
+            pool_recycle=settings.DB_POOL_RECYCLE,
+        )
+    return options
 
 # 1. Creamos el engine
 # El parámetro pool_pre_ping=True ya ayuda, pero no evita el error al arrancar
 engine = create_engine(
     settings.DATABASE_URL,
     echo=False, #settings.debug,
-    pool_pre_ping=True,
+    **pool_options(settings.DATABASE_URL, InstrumentedQueuePool),
 )
+engine.pool.metrics = sync_pool_metrics
+slow_query_log.attach(engine)
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
 
+# Drivers async equivalentes a los síncronos que usamos en DATABASE_URL
+ASYNC_DRIVERS = {
+    "postgresql": "postgresql+asyncpg",
+    "postgres": "postgresql+asyncpg",
+    "postgresql+psycopg2": "postgresql+asyncpg",
+    "sqlite": "sqlite+aiosqlite",
+    "sqlite+pysqlite": "sqlite+aiosqlite",
+}
+
+def build_async_database_url(database_url: str) -> URL:
+    """
+    Traduce la URL síncrona (psycopg2 / pysqlite) a su driver async.
+    asyncpg no entiende los parámetros libpq de Neon: 'sslmode' pasa a 'ssl'
+    y 'channel_binding' se descarta.
+    """
+    url = make_url(database_url)
+    url = url.set(drivername=ASYNC_DRIVERS.get(url.drivername, url.drivername))
+    if url.drivername == "postgresql+asyncpg":
+        query = dict(url.query)
+        if "sslmode" in query:
+            query["ssl"] = query.pop("sslmode")
+        query.pop("channel_binding", None)
+        url = url.set(query=query)
+    return url
+
+# 2. Engine async para los endpoints: las consultas no bloquean el event loop
+async_database_url = settings.DATABASE_ASYNC_URL or build_async_database_url(settings.DATABASE_URL)
+async_engine = create_async_engine(
+    async_database_url,
+    echo=False,
+    **pool_options(async_database_url, InstrumentedAsyncAdaptedQueuePool),
+)
+async_engine.pool.metrics = async_pool_metrics
+slow_query_log.attach(async_engine.sync_engine)
+
+# expire_on_commit=False: tras el commit los objetos siguen legibles al serializar
+# la respuesta sin disparar cargas perezosas fuera del contexto async.
+AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
+# 3. Réplica de lectura opcional (mismo tamaño de pool que la principal)
+read_async_engine = None
+ReadAsyncSessionLocal = None
+if settings.DATABASE_READ_URL:
+    read_database_url = build_async_database_url(settings.DATABASE_READ_URL)
+    read_async_engine = create_async_engine(
+        read_database_url,
+        echo=False,
+        **pool_options(read_database_url, InstrumentedAsyncAdaptedQueuePool),
+    )
+    read_async_engine.pool.metrics = read_pool_metrics
+    slow_query_log.attach(read_async_engine.sync_engine)
+    ReadAsyncSessionLocal = async_sessionmaker(read_async_engine, autoflush=False, expire_on_commit=False)
+
+def pool_stats() -> dict:
+    """Ocupación y esperas de checkout de los pools de este worker."""
+    stats = {
+        "sync": sync_pool_metrics.snapshot(engine.pool),
+        "async": async_pool_metrics.snapshot(async_engine.pool),
+    }
+    if read_async_engine is not None:
+        stats["read"] = read_pool_metrics.snapshot(read_async_engine.pool)
+    return stats
+
 def get_db():
     db = SessionLocal()
     try:
@@ -23,12 +124,35 @@ def get_db():
     finally:
         db.close()
 
+async def get_async_db():
+    """Dependencia de FastAPI con una AsyncSession por petición."""
+    async with AsyncSessionLocal() as db:
+        yield db
+
+async def get_read_db(request: Request):
+    """
+    Dependencia para rutas de solo lectura: usa la réplica si está configurada,
+    salvo que el cliente esté en su ventana read-your-writes tras escribir.
+    Sin DATABASE_READ_URL equivale a get_async_db.
+    """
+    if ReadAsyncSessionLocal is None:
+        async with AsyncSessionLocal() as db:
+            yield db
+    elif in_read_your_writes_window(request):
+        async with AsyncSessionLocal() as db:
+            db.info[READ_YOUR_WRITES_SESSION] = True
+            yield db
+    else:
+        async with ReadAsyncSessionLocal() as db:
+            db.info[REPLICA_SESSION] = True
+            yield db
+
 def create_tables():
     """
     Intenta crear las tablas, pero si la URL es incorrecta o no hay conexión,
     muestra un mensaje en lugar de detener el servidor.
     """
-    print(f"--- Verificando conexión a NEON ({settings.ENVIRONMENT}) ---")
+    logger.info("Verificando conexión a NEON (%s)", settings.ENVIRONMENT)
     try:
         # Intentamos una operación mínima: pedir la versión o un SELECT 1
         with engine.connect() as conn:
@@ -36,23 +160,22 @@ def create_tables():
         
         # Si llega aquí, la conexión es real. Creamos las tablas.
         Base.metadata.create_all(bind=engine)
-        print("✅ Conexión exitosa: Tablas verificadas/creadas en NEON.")
+        logger.info("Conexión exitosa: tablas verificadas/creadas en NEON")
         
     except OperationalError as e:
         # Aquí capturamos el error de "password authentication failed" o "host not found"
-        print("\n" + "!"*60)
-        print("⚠️  AVISO DE CONFIGURACIÓN DE BASE DE DATOS")
-        print(f"No se pudo conectar a la base de datos en: {settings.ENVIRONMENT}")
-        print("MENSAJE DEL SISTEMA: Revisa que la URL en tu archivo .env sea la correcta.")
-        print("El programa continuará ejecutándose, pero las consultas fallarán.")
-        print("!"*60 + "\n")
+        logger.error(
+            "No se pudo conectar a la base de datos en %s: revisa que la URL del .env sea la correcta. "
+            "El programa continuará ejecutándose, pero las consultas fallarán. (%s)",
+            settings.ENVIRONMENT, e.orig if e.orig is not None else e
+        )
         
-    except Exception as e:
-        print(f"❌ Ocurrió un error inesperado al inicializar la DB: {e}")
+    except Exception:
+        logger.exception("Ocurrió un error inesperado al inicializar la DB")
 
 def drop_tables():
     """Solo se ejecuta si realmente hay conexión"""
     try:
         Base.metadata.drop_all(bind=engine)
-    except Exception as e:
-        print(f"No se pudieron borrar las tablas: {e}")
\ No newline at end of file
+    except Exception:
+        logger.exception("No se pudieron borrar las tablas")
\ No newline at end of file
@@ -0,0 +1,180 @@
+"""
+Registro de consultas lentas.
+Cada sentencia que tarda DB_SLOW_QUERY_MS o más se registra como una línea
+JSON en el logger "app.db.slow_queries": SQL normalizado (ver
+query_metrics.fingerprint), parámetros redactados, ruta que la lanzó y
+duración. En una fracción DB_SLOW_QUERY_EXPLAIN_SAMPLE_RATE de los SELECT
+lentos se adjunta además su plan:
+
+- PostgreSQL: EXPLAIN (ANALYZE, BUFFERS), que vuelve a ejecutar la consulta
+  (por eso solo SELECT y muestreado).
+- SQLite: EXPLAIN QUERY PLAN (no tiene ANALYZE).
+
+El EXPLAIN va dentro de un SAVEPOINT en la misma conexión: si falla, la
+transacción de la petición sigue intacta. Con DB_SLOW_QUERY_LOG_FILE las
+líneas van también a un fichero rotativo, que escribe el hilo del
+QueueListener de setup_logging (nunca el de la petición).
+"""
+
+import json
+import logging
+import random
+import time
+from datetime import date, datetime, time as dt_time
+from decimal import Decimal
+from logging.handlers import RotatingFileHandler
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from app.core.logging_config import get_request_id
+from app.core.settings import settings
+from app.db.query_metrics import current_query_stats, fingerprint
+
+logger = logging.getLogger(__name__)
+
+# Tipos cuyos valores no identifican a nadie (IDs, fechas, flags): se registran tal cual
+_SAFE_TYPES = (bool, int, float, Decimal, date, datetime, dt_time, type(None))
+
+
+def redact_value(value: Any) -> Any:
+    """Texto y binarios (teléfonos, emails, nombres...) se sustituyen por su tipo y longitud."""
+    if isinstance(value, _SAFE_TYPES):
+        return value if isinstance(value, (bool, int, float, type(None))) else str(value)
+    if isinstance(value, (str, bytes)):
+        return f"<{type(value).__name__}:{len(value)}>"
+    return f"<{type(value).__name__}>"
+
+
+def redact_parameters(parameters: Any) -> Any:
+    if isinstance(parameters, dict):
+        return {key: redact_value(value) for key, value in parameters.items()}
+    if isinstance(parameters, (list, tuple)):
+        return [redact_parameters(item) if isinstance(item, (dict, list, tuple)) else redact_value(item) for item in parameters]
+    return redact_value(parameters)
+
+
+class SlowQueryLog:
+    """Escucha los eventos de cursor de los engines a los que se adjunta."""
+
+    def __init__(
+        self,
+        threshold_ms: float = 200.0,
+        explain_sample_rate: float = 0.0,
+        rng: Optional[random.Random] = None,
+        clock=time.perf_counter
+    ):
+        self.threshold_ms = threshold_ms
+        self.explain_sample_rate = explain_sample_rate
+        self.rng = rng or random.Random()
+        self._clock = clock
+        self.slow_queries = 0
+        self.explained = 0
+
+    def attach(self, engine: Engine) -> None:
+        """Para un AsyncEngine, pasar su `sync_engine`."""
+        if self.threshold_ms <= 0:
+            return
+        event.listen(engine, "before_cursor_execute", self._before_cursor_execute)
+        event.listen(engine, "after_cursor_execute", self._after_cursor_execute)
+
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        conn.info["slow_query_started"] = self._clock()
+
+    def _after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        started = conn.info.pop("slow_query_started", None)
+        if started is None:
+            return
+        duration_ms = (self._clock() - started) * 1000
+        if duration_ms < self.threshold_ms:
+            return
+
+        self.slow_queries += 1
+        stats = current_query_stats()
+        entry: Dict[str, Any] = {
+            "event": "slow_query",
+            "duration_ms": round(duration_ms, 1),
+            "route": stats.route if stats is not None else None,
+            "request_id": get_request_id(),
+            "dialect": conn.dialect.name,
+            "statement": fingerprint(statement),
+            "parameters": redact_parameters(parameters),
+            "executemany": executemany,
+        }
+        if not executemany and self._should_explain(statement):
+            entry["plan"] = self.explain(conn, statement, parameters)
+        logger.warning(json.dumps(entry, ensure_ascii=False, default=str))
+
+    def _should_explain(self, statement: str) -> bool:
+        return (
+            self.explain_sample_rate > 0
+            and statement.lstrip().upper().startswith("SELECT")
+            and self.rng.random() < self.explain_sample_rate
+        )
+
+    def explain(self, conn, statement: str, parameters: Any) -> Optional[List[str]]:
+        """Plan de la sentencia, o None si el dialecto no lo soporta o falla."""
+        if conn.dialect.name == "postgresql":
+            prefix = "EXPLAIN (ANALYZE, BUFFERS) "
+        elif conn.dialect.name == "sqlite":
+            prefix = "EXPLAIN QUERY PLAN "
+        else:
+            return None
+
+        # Cursor DBAPI directo: no vuelve a disparar los eventos (ni se cuenta como consulta)
+        cursor = conn.connection.cursor()
+        try:
+            cursor.execute("SAVEPOINT slow_query_explain")
+            try:
+                cursor.execute(prefix + statement, parameters)
+                rows = cursor.fetchall()
+            except Exception:
+                cursor.execute("ROLLBACK TO SAVEPOINT slow_query_explain")
+                raise
+            finally:
+                cursor.execute("RELEASE SAVEPOINT slow_query_explain")
+        except Exception as exc:
+            logger.debug("No se pudo obtener el plan de una consulta lenta: %s", exc)
+            return None
+        finally:
+            cursor.close()
+        self.explained += 1
+        # PostgreSQL: una línea de texto por fila; SQLite: (id, padre, 0, detalle)
+        return [str(row[-1]) for row in rows]
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "threshold_ms": self.threshold_ms,
+            "explain_sample_rate": self.explain_sample_rate,
+            "slow_queries": self.slow_queries,
+            "explained": self.explained,
+        }
+
+
+def build_slow_query_file_handlers() -> List[logging.Handler]:
+    """
+    Fichero rotativo de DB_SLOW_QUERY_LOG_FILE (ninguno si está vacío), para
+    pasarlo a setup_logging: solo recibe los registros de este logger.
+    """
+    if not settings.DB_SLOW_QUERY_LOG_FILE:
+        return []
+    handler = RotatingFileHandler(
+        settings.DB_SLOW_QUERY_LOG_FILE,
+        maxBytes=settings.DB_SLOW_QUERY_LOG_MAX_BYTES,
+        backupCount=settings.DB_SLOW_QUERY_LOG_BACKUPS,
+        encoding="utf-8",
+        delay=True,
+    )
+    handler.addFilter(logging.Filter(logger.name))
+    # El mensaje ya es la línea JSON; la fecha va delante para poder ordenar
+    handler.setFormatter(logging.Formatter("%(asctime)s %(message)s"))
+    return [handler]
+
+
+def build_slow_query_log() -> SlowQueryLog:
+    """SlowQueryLog según Settings."""
+    return SlowQueryLog(
+        threshold_ms=settings.DB_SLOW_QUERY_MS,
+        explain_sample_rate=settings.DB_SLOW_QUERY_EXPLAIN_SAMPLE_RATE,
+    )
@@ -1,18 +1,41 @@
-from fastapi import FastAPI, Depends
+from fastapi import FastAPI, Depends, Response
 from fastapi.middleware.cors import CORSMiddleware
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from contextlib import asynccontextmanager # Requerido para el nuevo Lifespan
 import uvicorn
 
+import logging
+
+from app.core.logging_config import REQUEST_ID_HEADER, RequestIdMiddleware, setup_logging, stop_logging
 from app.core.settings import settings
-from app.db.session import get_db, create_tables
+from app.db.session import get_async_db, create_tables
 from app.api.v1.api_route import api_router
+from app.db.query_metrics import QueryStatsMiddleware
+from app.db.slow_queries import build_slow_query_file_handlers
+from app.utils.metrics import MetricsMiddleware, MultiprocessMetrics, PROMETHEUS_CONTENT_TYPE, RequestMetrics
+
+logger = logging.getLogger(__name__)
+
+# Métricas HTTP por plantilla de ruta de este worker (se exponen en /metrics)
+http_metrics = MultiprocessMetrics(
+    RequestMetrics(),
+    directory=settings.METRICS_MULTIPROC_DIR,
+    flush_interval=settings.METRICS_FLUSH_INTERVAL_SECONDS,
+)
 
 # 1. Definimos el ciclo de vida (Lifespan)
 # Este reemplaza a @app.on_event("startup")
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    print(f"🚀 Starting FastAPI app in {settings.ENVIRONMENT} mode")
+    # Lo primero: a partir de aquí los logs salen por la cola (JSON, sin bloquear)
+    setup_logging(
+        level=settings.LOG_LEVEL,
+        levels=settings.LOG_LEVELS,
+        fmt=settings.LOG_FORMAT,
+        queue_size=settings.LOG_QUEUE_SIZE,
+        handlers=build_slow_query_file_handlers(),
+    )
+    logger.info("Starting FastAPI app in %s mode", settings.ENVIRONMENT)
 
     # --- VERIFICACIÓN DE ZONA HORARIA ---
     import pytz
@@ -20,37 +43,48 @@ async def lifespan(app: FastAPI):
     try:
         current_tz = pytz.timezone(settings.APP_TIMEZONE)
         local_time = datetime.now(current_tz)
-        print(f"🌍 Timezone: {settings.APP_TIMEZONE}")
-        print(f"🕒 Local Time: {local_time.strftime('%Y-%m-%d %H:%M:%S')}")
-    except Exception as e:
-        print(f"❌ Error configurando zona horaria: {e}")
+        logger.info("Timezone: %s. Local Time: %s", settings.APP_TIMEZONE, local_time.strftime('%Y-%m-%d %H:%M:%S'))
+    except Exception:
+        logger.exception("Error configurando zona horaria")
     # ------------------------------------
     
     # En lugar de imprimir settings.DATABASE_URL completo:
     if settings.DATABASE_URL:
-        print("🔗 Database URL: Configurada correctamente (Oculta por seguridad)")
+        logger.info("Database URL: configurada correctamente (oculta por seguridad)")
     else:
-        print("🔗 Database URL: No encontrada o incorrecta")
+        logger.warning("Database URL: no encontrada o incorrecta")
     # Aquí podrías conectar a Redis o cargar un modelo de IA pesado
     create_tables()
+
+    # Workers que procesan en segundo plano los mensajes del webhook de WhatsApp
+    from app.agents.whatsapp import message_pool, meta_client
+    meta_client.start()
+    await message_pool.start()
+    # Volcado periódico de métricas en su propio hilo (no en el event loop)
+    http_metrics.start()
     
     yield  # <--- Aquí la app está encendida y recibiendo clientes
     
     # --- CIERRE (SHUTDOWN) ---
-    print("👋 Iniciando proceso de apagado...")
+    logger.info("Iniciando proceso de apagado")
+
+    # Terminamos los mensajes encolados antes de cerrar las conexiones
+    await message_pool.stop(timeout=settings.WHATSAPP_SHUTDOWN_TIMEOUT_SECONDS)
+    logger.info("Cola de mensajes de WhatsApp vaciada")
+    await meta_client.aclose()
+    # Último volcado: los contadores de este worker siguen sumando en /metrics
+    http_metrics.stop()
     
-    # Ejemplo 1: Cerrar todas las conexiones a la DB para no saturar a Neon
-    from .db.session import engine
+    # Cerrar todas las conexiones a la DB para no saturar a Neon
+    from .db.session import engine, async_engine, read_async_engine
     engine.dispose() 
-    print("🔌 Conexiones a la base de datos cerradas.")
-    
-    # Ejemplo 2: Si tuvieras un sistema de logs en archivo, podrías cerrarlo
-    print("💾 Logs guardados y archivos cerrados.")
-    
-    # Ejemplo 3: Limpiar memoria temporal
-    print("🧹 Memoria temporal liberada.")
-    
-    print("✅ Apagado completo. ¡Hasta pronto!")
+    await async_engine.dispose()
+    if read_async_engine is not None:
+        await read_async_engine.dispose()
+    logger.info("Conexiones a la base de datos cerradas. Apagado completo")
+
+    # Lo último: el listener escribe lo que quede en la cola antes de salir
+    stop_logging()
 
 # 2. Inicializamos FastAPI con el lifespan
 app = FastAPI(
@@ -73,9 +107,26 @@ app.add_middleware(
     # Si es producción, limitamos a los métodos estándar
     allow_methods=["*"] if not settings.is_production else ["GET", "POST", "PUT", "DELETE"],
     allow_headers=["*"],
+    # El navegador solo deja leer al frontend las cabeceras expuestas explícitamente
+    expose_headers=["X-Next-Cursor", "X-DB-Queries", "X-DB-Time", REQUEST_ID_HEADER],
 )
 
-# 4. Incluir router de API v1
+# Sentencias SQL y tiempo de base de datos por petición (cabeceras solo fuera de producción)
+if settings.DB_QUERY_STATS_ENABLED:
+    app.add_middleware(
+        QueryStatsMiddleware,
+        expose_headers=not settings.is_production,
+        n_plus_one_threshold=settings.DB_N_PLUS_ONE_THRESHOLD,
+    )
+
+# 4. Métricas por ruta: al añadirse después de CORS, envuelve también su trabajo
+if settings.METRICS_ENABLED:
+    app.add_middleware(MetricsMiddleware, registry=http_metrics)
+
+# 5. request_id de cada petición en todos sus logs: el más externo, para que lo vean los demás
+app.add_middleware(RequestIdMiddleware)
+
+# 6. Incluir router de API v1
 app.include_router(api_router, prefix=settings.API_V1_STR)
 
 @app.get("/")
@@ -87,13 +138,13 @@ async def root():
     }
 
 @app.get("/health")
-async def health_check(db: Session = Depends(get_db)):
+async def health_check(db: AsyncSession = Depends(get_async_db)):
     """
     Endpoint de salud que verifica la conexión real a Neon de authCore
     """
     try:
         from sqlalchemy import text # Importante para SQLAlchemy 2.0
-        db.execute(text("SELECT 1"))
+        await db.execute(text("SELECT 1"))
         return {
             "status": "healthy" + " " + settings.TITLE_BACKEND,
             "environment": settings.ENVIRONMENT,
@@ -109,6 +160,24 @@ async def health_check(db: Session = Depends(get_db)):
             "error": str(e)
         }
 
+@app.get("/health/pool")
+async def pool_health():
+    """
+    Estado de los pools de conexiones de este worker: conexiones en uso,
+    overflow, esperas de checkout (histograma en ms), checkouts lentos y timeouts.
+    """
+    from app.db.session import pool_stats
+    return pool_stats()
+
+@app.get("/metrics", include_in_schema=False)
+def metrics():
+    """
+    Métricas HTTP en formato Prometheus: latencia, tamaño de respuesta,
+    códigos de estado y peticiones en curso por ruta. Con METRICS_MULTIPROC_DIR
+    suma las de todos los workers de la máquina.
+    """
+    return Response(http_metrics.render(), media_type=PROMETHEUS_CONTENT_TYPE)
+
 @app.get("/info")
 async def app_info():
     return {
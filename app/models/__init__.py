@@ -4,5 +4,7 @@ from .services import Service
 from .business_hours import BusinessHours, TimeSlot
 from .collaborators import Collaborator
 from .appointments import Appointment
+from .processed_messages import ProcessedMessage
+from .conversations import Conversation
 
-__all__ = ["Base", "Service", "BusinessHours", "TimeSlot", "Collaborator", "Appointment"]
+__all__ = ["Base", "Service", "BusinessHours", "TimeSlot", "Collaborator", "Appointment", "ProcessedMessage", "Conversation"]
@@ -3,7 +3,8 @@ Modelo SQLAlchemy para el dominio de citas (appointments).
 Este modelo representa las reservas de servicios con colaboradores específicos.
 """
 
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Enum, Text
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Enum, Text, DDL, Index, event, literal_column, text
+from sqlalchemy.dialects.postgresql import ExcludeConstraint
 from sqlalchemy.sql import func
 from sqlalchemy.orm import relationship
 import enum
@@ -20,6 +21,10 @@ class AppointmentStatus(str, enum.Enum):
     NO_SHOW = "no_show"          # No asistió
 
 
+# Restricción de exclusión de Postgres que impide solapar citas activas de un mismo colaborador
+APPOINTMENT_OVERLAP_CONSTRAINT = "appointments_no_overlap"
+
+
 class Appointment(Base):
     """
     Modelo de Appointment para la tabla de citas.
@@ -59,6 +64,21 @@ class Appointment(Base):
     created_at = Column(DateTime(timezone=True), server_default=func.now(), comment="Fecha de creación")
     updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now(), comment="Fecha de última actualización")
     
+    # --- INTEGRIDAD ---
+    # Dos citas activas del mismo colaborador no pueden solaparse (rango [inicio, fin)).
+    # Solo existe en Postgres (necesita btree_gist); en SQLite se valida en Python.
+    __table_args__ = (
+        ExcludeConstraint(
+            (collaborator_id, "="),
+            (func.tstzrange(start_time, end_time, literal_column("'[)'")), "&&"),
+            where=text("status IN ('SCHEDULED', 'CONFIRMED', 'IN_PROGRESS')"),
+            using="gist",
+            name=APPOINTMENT_OVERLAP_CONSTRAINT
+        ).ddl_if(dialect="postgresql"),
+        # Clave de la paginación por cursor de GET /appointments (start_time, id)
+        Index("ix_appointments_start_time_id", start_time, id),
+    )
+    
     # --- RELACIONES ORM (Para acceder desde Python) ---
     # Permite hacer: appointment.client.full_name
     client = relationship("Client", back_populates="appointments")
@@ -86,4 +106,12 @@ class Appointment(Base):
             "status": self.status.value if self.status else None,
             "created_at": self.created_at.isoformat() if self.created_at else None,
             "updated_at": self.updated_at.isoformat() if self.updated_at else None
-        }
\ No newline at end of file
+        }
+
+
+# btree_gist permite combinar la igualdad de collaborator_id con el solapamiento de rangos en GiST
+event.listen(
+    Appointment.__table__,
+    "before_create",
+    DDL("CREATE EXTENSION IF NOT EXISTS btree_gist").execute_if(dialect="postgresql")
+)
@@ -0,0 +1,30 @@
+"""
+Modelo SQLAlchemy para la memoria de conversación del agente de WhatsApp.
+Guarda por teléfono el historial reciente y los resultados de herramientas
+ya consultados, para que cualquier worker pueda continuar la conversación.
+"""
+
+from sqlalchemy import Column, String, DateTime, JSON
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.sql import func
+from app.models.base import Base
+
+
+class Conversation(Base):
+    """
+    Modelo de Conversation para la tabla de conversaciones.
+    Las filas sin actividad durante AGENT_CONVERSATION_TTL_SECONDS se purgan periódicamente.
+    """
+    
+    __tablename__ = "whatsapp_conversations"
+    
+    # Teléfono del usuario (wa_id): una conversación activa por número
+    phone = Column(String(32), primary_key=True, comment="Teléfono de WhatsApp del usuario")
+    
+    # Estado serializado (turnos y resultados de herramientas); JSONB en Postgres
+    state = Column(JSON().with_variant(JSONB, "postgresql"), nullable=False, comment="Historial y resultados de herramientas")
+    
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now(), nullable=False, index=True, comment="Fecha del último mensaje")
+    
+    def __repr__(self):
+        return f"<Conversation(phone='{self.phone}', updated_at={self.updated_at})>"
@@ -0,0 +1,26 @@
+"""
+Modelo SQLAlchemy para la deduplicación de webhooks de WhatsApp.
+Guarda los IDs de mensaje (messages[].id) ya procesados para que los
+reintentos de Meta no se procesen dos veces aunque lleguen a otro worker.
+"""
+
+from sqlalchemy import Column, String, DateTime
+from sqlalchemy.sql import func
+from app.models.base import Base
+
+
+class ProcessedMessage(Base):
+    """
+    Modelo de ProcessedMessage para la tabla de mensajes procesados.
+    Las filas más antiguas que WHATSAPP_DEDUP_TTL_SECONDS se purgan periódicamente.
+    """
+    
+    __tablename__ = "whatsapp_processed_messages"
+    
+    # ID de Meta (wamid.*): la clave primaria hace atómico el "marcar como visto"
+    message_id = Column(String(255), primary_key=True, comment="ID del mensaje de WhatsApp (wamid)")
+    
+    received_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False, index=True, comment="Fecha de la primera entrega")
+    
+    def __repr__(self):
+        return f"<ProcessedMessage(message_id='{self.message_id}', received_at={self.received_at})>"
@@ -2,7 +2,7 @@
 from .services import ServiceCreate, ServiceRead, ServiceUpdate
 from .business_hours import BusinessHoursCreate, BusinessHoursRead, BusinessHoursUpdate, TimeSlotCreate, TimeSlotRead, TimeSlotUpdate
 from .collaborators import CollaboratorCreate, CollaboratorRead, CollaboratorUpdate
-from .appointments import AppointmentCreate, AppointmentRead, AppointmentUpdate, TimeSlot, AvailableSlotsResponse
+from .appointments import AppointmentCreate, AppointmentRead, AppointmentUpdate, TimeSlot, AvailableSlotsResponse, AvailableDaySlots, AvailableSlotsRangeResponse
 
 __all__ = [
     "ServiceCreate", "ServiceRead", "ServiceUpdate",
@@ -10,5 +10,5 @@ __all__ = [
     "TimeSlotCreate", "TimeSlotRead", "TimeSlotUpdate",
     "CollaboratorCreate", "CollaboratorRead", "CollaboratorUpdate",
     "AppointmentCreate", "AppointmentRead", "AppointmentUpdate",
-    "TimeSlot", "AvailableSlotsResponse"
+    "TimeSlot", "AvailableSlotsResponse", "AvailableDaySlots", "AvailableSlotsRangeResponse"
 ]
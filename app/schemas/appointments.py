@@ -85,4 +85,17 @@ class AvailableSlotsResponse(BaseModel):
     service_id: int
     service_duration: int
     available_slots: List[TimeSlot]
-    total_slots: int
\ No newline at end of file
+    total_slots: int
+
+class AvailableDaySlots(BaseModel):
+    date: str
+    available_slots: List[TimeSlot]
+    total_slots: int
+
+class AvailableSlotsRangeResponse(BaseModel):
+    date_from: str
+    date_to: str
+    service_id: int
+    service_duration: int
+    days: List[AvailableDaySlots]
+    total_slots: int
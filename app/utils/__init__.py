@@ -1,4 +1,4 @@
 # Utilidades del proyecto
-from .availability import get_available_slots, check_appointment_conflict, is_valid_appointment_time
+from .availability import get_available_slots, get_available_slots_range, check_appointment_conflict, is_valid_appointment_time
 
-__all__ = ["get_available_slots", "check_appointment_conflict", "is_valid_appointment_time"]
+__all__ = ["get_available_slots", "get_available_slots_range", "check_appointment_conflict", "is_valid_appointment_time"]
@@ -3,15 +3,40 @@ Utilidades para cálculo de disponibilidad y huecos libres.
 Versión NAIVE: Sin zonas horarias para evitar desfases en la base de datos.
 """
 
-from datetime import datetime, timedelta, time
-from typing import List, Optional, Tuple
-from sqlalchemy.orm import Session
-from sqlalchemy import and_, or_
+from collections import defaultdict
+from datetime import date, datetime, timedelta, time
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+from sqlalchemy.orm import Session, contains_eager, selectinload
+from sqlalchemy import and_, or_, exists, func, select
 
 from app.models.appointments import Appointment, AppointmentStatus
-from app.models.business_hours import BusinessHours
+from app.models.business_hours import BusinessHours, TimeSlot
 from app.models.collaborators import Collaborator
 from app.models.services import Service
+from app.core.settings import settings
+from app.db.routing import READ_YOUR_WRITES_SESSION, REPLICA_SESSION
+from app.utils.cache import MISSING, TTLCache
+
+# Separación entre inicios de slots consecutivos
+SLOT_STEP_MINUTES = 15
+
+# Intervalos libres ya calculados por (collaborator_id, fecha).
+# Se invalida desde los endpoints de citas y horarios; el TTL cubre a los demás workers.
+availability_cache = TTLCache(
+    maxsize=settings.AVAILABILITY_CACHE_SIZE,
+    ttl=settings.AVAILABILITY_CACHE_TTL_SECONDS
+)
+
+# Cachés derivadas de la disponibilidad (p. ej. las herramientas del agente):
+# reciben la fecha invalidada, o None si cambió un horario y vale cualquier fecha
+_invalidation_listeners: List[Callable[[Optional[date]], None]] = []
+
+# Estados que ocupan la agenda de un profesional
+ACTIVE_APPOINTMENT_STATUSES = [
+    AppointmentStatus.SCHEDULED,
+    AppointmentStatus.CONFIRMED,
+    AppointmentStatus.IN_PROGRESS
+]
 
 def get_available_slots(
     db: Session,
@@ -22,94 +47,449 @@ def get_available_slots(
     """
     Calcula huecos libres. Si collaborator_id es None, devuelve todos los slots
     de todos los profesionales disponibles.
+    El número de consultas es constante: servicio, horarios (con colaborador),
+    time_slots (selectin) y, solo si falta algo en availability_cache, una única
+    consulta de citas para todo el día.
+    """
+    return get_available_slots_with_intervals(db, target_date, service_id, collaborator_id)[0]
+
+def get_available_slots_with_intervals(
+    db: Session,
+    target_date: datetime,
+    service_id: int,
+    collaborator_id: Optional[int] = None
+) -> Tuple[List[dict], Dict[int, List[Tuple[datetime, datetime]]]]:
+    """
+    get_available_slots más los huecos libres de cada colaborador (por turno
+    y en orden) en los que cabe el servicio: de ellos salen exactamente esos
+    slots, y sirven para resumirlos sin adivinar dónde acaba cada turno.
     """
     service = db.query(Service).filter(Service.id == service_id, Service.is_active == True).first()
     if not service:
-        return []
-    
-    service_duration = service.duration_minutes
-    day_of_week = target_date.weekday()
-    
-    # 1. Buscamos los horarios configurados
-    query = db.query(BusinessHours).join(Collaborator).filter(
+        return [], {}
+
+    # 1. Buscamos los horarios configurados (colaborador y time_slots precargados)
+    day = target_date.date()
+    schedules = load_schedules(db, [day.weekday()], collaborator_id)
+    if not schedules:
+        return [], {}
+
+    # 2. Intervalos libres (caché o una consulta de citas) y slots del servicio
+    free_intervals = load_free_intervals(db, [day], schedules)
+    duration = timedelta(minutes=service.duration_minutes)
+    intervals_by_collaborator: Dict[int, List[Tuple[datetime, datetime]]] = defaultdict(list)
+    for schedule in schedules:
+        intervals_by_collaborator[schedule.collaborator_id].extend(
+            interval for interval in free_intervals[(schedule.collaborator_id, day)]
+            if interval[1] - interval[0] >= duration
+        )
+    slots = slots_for_day(day, schedules, free_intervals, service.duration_minutes)
+    return slots, dict(intervals_by_collaborator)
+
+def get_available_slots_range(
+    db: Session,
+    date_from: datetime,
+    date_to: datetime,
+    service_id: int,
+    collaborator_id: Optional[int] = None
+) -> Dict[date, List[dict]]:
+    """
+    Calcula huecos libres para cada día entre date_from y date_to (ambos incluidos).
+    Carga los horarios una sola vez y todas las citas de la ventana en una
+    única consulta; devuelve los slots agrupados por día.
+    """
+    days = [
+        date_from.date() + timedelta(days=offset)
+        for offset in range((date_to.date() - date_from.date()).days + 1)
+    ]
+    if not days:
+        return {}
+
+    empty_result = {day: [] for day in days}
+
+    service = db.query(Service).filter(Service.id == service_id, Service.is_active == True).first()
+    if not service:
+        return empty_result
+
+    schedules = load_schedules(db, {day.weekday() for day in days}, collaborator_id)
+    if not schedules:
+        return empty_result
+
+    return build_slots_for_days(db, days, schedules, service.duration_minutes)
+
+def build_slots_for_days(
+    db: Session,
+    days: List[date],
+    schedules: List[BusinessHours],
+    service_duration: int
+) -> Dict[date, List[dict]]:
+    """
+    Núcleo común de get_available_slots y get_available_slots_range:
+    intervalos libres (load_free_intervals) convertidos en slots del servicio.
+    """
+    free_intervals = load_free_intervals(db, days, schedules)
+    return {
+        day: slots_for_day(day, schedules, free_intervals, service_duration)
+        for day in days
+    }
+
+def load_free_intervals(
+    db: Session,
+    days: List[date],
+    schedules: List[BusinessHours]
+) -> Dict[Tuple[int, date], List[Tuple[datetime, datetime]]]:
+    """
+    Intervalos libres de cada (colaborador, día). Salen de availability_cache;
+    los que faltan se calculan con una única consulta de citas para toda la
+    ventana y se guardan para las siguientes lecturas.
+    """
+    schedules_by_weekday: Dict[int, List[BusinessHours]] = defaultdict(list)
+    for schedule in schedules:
+        schedules_by_weekday[schedule.day_of_week].append(schedule)
+
+    use_cache = settings.AVAILABILITY_CACHE_ENABLED
+    # Quien acaba de escribir no lee de la caché: otro worker pudo llenarla
+    # desde la réplica con datos anteriores a su escritura
+    read_cache = use_cache and not db.info.get(READ_YOUR_WRITES_SESSION)
+    # Lo calculado sobre la réplica puede ir retrasado: caduca con la ventana de lag
+    cache_ttl = min(availability_cache.ttl, settings.READ_YOUR_WRITES_SECONDS) if db.info.get(REPLICA_SESSION) else None
+    generation = availability_cache.generation
+    free_intervals: Dict[Tuple[int, date], List[Tuple[datetime, datetime]]] = {}
+    missing: List[Tuple[date, BusinessHours]] = []
+
+    for day in days:
+        for schedule in schedules_by_weekday.get(day.weekday(), []):
+            key = (schedule.collaborator_id, day)
+            cached = availability_cache.get(key) if read_cache else MISSING
+            if cached is MISSING:
+                missing.append((day, schedule))
+            else:
+                free_intervals[key] = cached
+
+    if missing:
+        missing_days = [day for day, _ in missing]
+        appointments_by_day = get_appointments_by_day(
+            db,
+            {schedule.collaborator_id for _, schedule in missing},
+            min(missing_days),
+            max(missing_days)
+        )
+        for day, schedule in missing:
+            key = (schedule.collaborator_id, day)
+            free_intervals[key] = compute_free_intervals(
+                day,
+                schedule,
+                appointments_by_day.get(day, {}).get(schedule.collaborator_id, [])
+            )
+            if use_cache:
+                # Si hubo una escritura mientras calculábamos, no guardamos datos viejos
+                availability_cache.set(key, free_intervals[key], ttl=cache_ttl, generation=generation)
+    return free_intervals
+
+def slots_for_day(
+    day: date,
+    schedules: List[BusinessHours],
+    free_intervals: Dict[Tuple[int, date], List[Tuple[datetime, datetime]]],
+    service_duration: int
+) -> List[dict]:
+    """Slots del servicio de un día a partir de los intervalos libres, en orden cronológico."""
+    day_slots = []
+    for schedule in schedules:
+        if schedule.day_of_week != day.weekday():
+            continue
+        day_slots.extend(slots_from_intervals(
+            free_intervals[(schedule.collaborator_id, day)],
+            service_duration,
+            schedule.collaborator
+        ))
+    # Ordenamos cronológicamente
+    day_slots.sort(key=lambda x: x['start_time'])
+    return day_slots
+
+def load_schedules(
+    db: Session,
+    days_of_week: Iterable[int],
+    collaborator_id: Optional[int] = None
+) -> List[BusinessHours]:
+    """
+    Horarios habilitados de colaboradores activos para los días indicados,
+    con el colaborador y sus time_slots ya cargados.
+    """
+    query = db.query(BusinessHours).join(BusinessHours.collaborator).filter(
         and_(
-            BusinessHours.day_of_week == day_of_week,
+            BusinessHours.day_of_week.in_(list(days_of_week)),
             BusinessHours.is_enabled == True,
             Collaborator.is_active == True
         )
+    ).options(
+        contains_eager(BusinessHours.collaborator),
+        selectinload(BusinessHours.time_slots)
     )
     
     if collaborator_id:
         query = query.filter(BusinessHours.collaborator_id == collaborator_id)
     
-    schedules = query.all()
-    if not schedules:
-        return []
-    
+    return query.all()
+
+def compute_free_intervals(
+    day: date,
+    schedule: BusinessHours,
+    existing_appointments: List[Appointment]
+) -> List[Tuple[datetime, datetime]]:
+    """Huecos libres (inicio, fin) de un horario en un día, en el orden de sus time_slots."""
+    intervals = []
+    for time_slot in schedule.time_slots:
+        # Combinamos fecha y hora sin aplicar zonas horarias (Naive)
+        intervals.extend(free_intervals_in_range(
+            datetime.combine(day, time_slot.start_time),
+            datetime.combine(day, time_slot.end_time),
+            existing_appointments
+        ))
+    return intervals
+
+def slots_from_intervals(
+    intervals: List[Tuple[datetime, datetime]],
+    service_duration: int,
+    collaborator: Collaborator
+) -> List[dict]:
+    """
+    Convierte huecos libres en slots discretos para la duración del servicio.
+    Equivale a generate_discrete_slots sobre cada hueco, pero calcula de antemano
+    cuántos inicios caben en lugar de avanzar timedelta a timedelta.
+    """
+    duration = timedelta(minutes=service_duration)
+    step = timedelta(minutes=SLOT_STEP_MINUTES)
+    collaborator_id = collaborator.id
+    collaborator_name = collaborator.name
+    slots = []
+    for interval_start, interval_end in intervals:
+        spare = interval_end - interval_start - duration
+        if spare < timedelta(0):
+            continue
+        for index in range(spare // step + 1):
+            slot_start = interval_start + step * index
+            slots.append({
+                'start_time': slot_start,
+                'end_time': slot_start + duration,
+                'collaborator_id': collaborator_id,
+                'collaborator_name': collaborator_name,
+                'available_minutes': service_duration
+            })
+    return slots
+
+def generate_day_slots(
+    day: date,
+    schedules: List[BusinessHours],
+    appointments_by_collaborator: Dict[int, List[Appointment]],
+    service_duration: int
+) -> List[dict]:
+    """
+    Genera y ordena los slots de un día a partir de datos ya cargados (sin caché).
+    """
     all_raw_slots = []
     
-    # 2. Generamos slots por cada colaborador/horario
     for schedule in schedules:
-        collaborator = schedule.collaborator
-        # Fechas límite del día (NAIVE) para filtrar citas
-        start_of_day = datetime.combine(target_date.date(), time.min)
-        end_of_day = datetime.combine(target_date.date(), time.max)
-        
-        existing_appointments = db.query(Appointment).filter(
-            and_(
-                Appointment.collaborator_id == collaborator.id,
-                Appointment.start_time < end_of_day,
-                Appointment.end_time > start_of_day,
-                Appointment.status.in_([
-                    AppointmentStatus.SCHEDULED,
-                    AppointmentStatus.CONFIRMED,
-                    AppointmentStatus.IN_PROGRESS
-                ])
-            )
-        ).order_by(Appointment.start_time).all()
-        
-        for time_slot in schedule.time_slots:
-            # Combinamos fecha y hora sin aplicar zonas horarias (Naive)
-            slot_start_time = datetime.combine(target_date.date(), time_slot.start_time)
-            slot_end_time = datetime.combine(target_date.date(), time_slot.end_time)
-            
-            slots = generate_slots_in_range(
-                slot_start_time, 
-                slot_end_time, 
-                existing_appointments, 
-                service_duration,
-                collaborator
-            )
-            all_raw_slots.extend(slots)
+        intervals = compute_free_intervals(
+            day,
+            schedule,
+            appointments_by_collaborator.get(schedule.collaborator_id, [])
+        )
+        all_raw_slots.extend(slots_from_intervals(intervals, service_duration, schedule.collaborator))
 
     # Ordenamos cronológicamente
     all_raw_slots.sort(key=lambda x: x['start_time'])
     return all_raw_slots
 
+def invalidate_availability(
+    collaborator_id: int,
+    start_time: datetime,
+    end_time: Optional[datetime] = None
+) -> int:
+    """
+    Invalida los días que ocupa una cita del colaborador.
+    Se llama tras crear, modificar o cancelar citas.
+    """
+    st = start_time.replace(tzinfo=None) if start_time.tzinfo else start_time
+    et = end_time.replace(tzinfo=None) if end_time and end_time.tzinfo else (end_time or st)
+    removed = 0
+    day = st.date()
+    while day <= et.date():
+        removed += availability_cache.invalidate((collaborator_id, day))
+        _notify_invalidation(day)
+        day += timedelta(days=1)
+    return removed
+
+def invalidate_collaborator_availability(
+    collaborator_id: Optional[int],
+    day_of_week: Optional[int] = None
+) -> int:
+    """
+    Invalida todas las fechas cacheadas de un colaborador (o solo las de un día
+    de la semana). Se llama tras cambios en sus horarios.
+    """
+    _notify_invalidation(None)
+    return availability_cache.invalidate_where(
+        lambda key: key[0] == collaborator_id and (day_of_week is None or key[1].weekday() == day_of_week)
+    )
+
+def add_invalidation_listener(listener: Callable[[Optional[date]], None]) -> None:
+    """Registra una caché derivada para vaciarla junto con availability_cache."""
+    if listener not in _invalidation_listeners:
+        _invalidation_listeners.append(listener)
+
+def _notify_invalidation(day: Optional[date]) -> None:
+    for listener in _invalidation_listeners:
+        listener(day)
+
+def get_appointments_by_collaborator(
+    db: Session,
+    collaborator_ids: Iterable[int],
+    range_start: datetime,
+    range_end: datetime
+) -> Dict[int, List[Appointment]]:
+    """
+    Carga en una sola consulta las citas activas que se solapan con el rango
+    y las agrupa por colaborador, ordenadas por hora de inicio.
+    """
+    collaborator_ids = list(collaborator_ids)
+    grouped: Dict[int, List[Appointment]] = defaultdict(list)
+    if not collaborator_ids:
+        return grouped
+
+    appointments = db.query(Appointment).filter(
+        and_(
+            Appointment.collaborator_id.in_(collaborator_ids),
+            Appointment.start_time < range_end,
+            Appointment.end_time > range_start,
+            Appointment.status.in_(ACTIVE_APPOINTMENT_STATUSES)
+        )
+    ).order_by(Appointment.start_time).all()
+
+    for appointment in appointments:
+        grouped[appointment.collaborator_id].append(appointment)
+    return grouped
+
+def get_appointments_by_day(
+    db: Session,
+    collaborator_ids: Iterable[int],
+    first_day: date,
+    last_day: date
+) -> Dict[date, Dict[int, List[Appointment]]]:
+    """
+    Citas activas entre first_day y last_day (una sola consulta) agrupadas por
+    día y colaborador. Una cita que cruza la medianoche aparece en ambos días.
+    """
+    appointments_by_collaborator = get_appointments_by_collaborator(
+        db,
+        collaborator_ids,
+        datetime.combine(first_day, time.min),
+        datetime.combine(last_day, time.max)
+    )
+
+    appointments_by_day: Dict[date, Dict[int, List[Appointment]]] = defaultdict(lambda: defaultdict(list))
+    for collab_id, appointments in appointments_by_collaborator.items():
+        for appointment in appointments:
+            apt_start = appointment.start_time.replace(tzinfo=None) if appointment.start_time.tzinfo else appointment.start_time
+            apt_end = appointment.end_time.replace(tzinfo=None) if appointment.end_time.tzinfo else appointment.end_time
+            day = max(apt_start.date(), first_day)
+            while day <= min(apt_end.date(), last_day):
+                appointments_by_day[day][collab_id].append(appointment)
+                day += timedelta(days=1)
+    return appointments_by_day
+
 def find_available_collaborator(
     db: Session,
     start_time: datetime,
     end_time: datetime,
-    service_id: int
+    service_id: int,
+    order_by: str = "first"
 ) -> Optional[int]:
     """
     Busca al primer colaborador disponible para una hora específica.
     Asegura que las fechas sean Naive antes de validar.
     """
+    candidates = find_available_collaborators(db, start_time, end_time, service_id, order_by=order_by)
+    return candidates[0] if candidates else None
+
+def find_available_collaborators(
+    db: Session,
+    start_time: datetime,
+    end_time: datetime,
+    service_id: int,
+    order_by: str = "first"
+) -> List[int]:
+    """
+    Devuelve en UNA sola consulta los colaboradores que pueden atender el rango:
+    activos, con horario habilitado ese día, un TimeSlot que cubra el rango
+    y ninguna cita activa que se solape.
+
+    order_by:
+    - "first": por ID de colaborador (comportamiento histórico).
+    - "least_booked": primero quien tenga menos citas activas ese día.
+    """
+    if order_by not in COLLABORATOR_ORDERINGS:
+        raise ValueError(f"Estrategia de orden desconocida: {order_by}")
+
     # Limpiamos zona horaria por si acaso
     st_naive = start_time.replace(tzinfo=None) if start_time.tzinfo else start_time
     et_naive = end_time.replace(tzinfo=None) if end_time.tzinfo else end_time
 
-    # Buscamos colaboradores activos
-    collaborators = db.query(Collaborator).filter(Collaborator.is_active == True).all()
-    
-    for colab in collaborators:
-        # Reutilizamos la validación Naive
-        is_valid, _ = is_valid_appointment_time(db, colab.id, st_naive, et_naive)
-        if is_valid:
-            return colab.id
-            
-    return None
+    # Mismas reglas que is_valid_appointment_time: nada en el pasado
+    # y la cita debe caber dentro de un único día laboral.
+    if st_naive < datetime.now() or et_naive <= st_naive or et_naive.date() != st_naive.date():
+        return []
+
+    slot_fits = exists().where(
+        and_(
+            TimeSlot.business_hours_id == BusinessHours.id,
+            TimeSlot.start_time <= st_naive.time(),
+            TimeSlot.end_time >= et_naive.time()
+        )
+    )
+    has_conflict = exists().where(
+        and_(
+            Appointment.collaborator_id == Collaborator.id,
+            Appointment.status.in_(ACTIVE_APPOINTMENT_STATUSES),
+            Appointment.start_time < et_naive,
+            Appointment.end_time > st_naive
+        )
+    )
+
+    query = db.query(Collaborator.id).join(
+        BusinessHours,
+        and_(
+            BusinessHours.collaborator_id == Collaborator.id,
+            BusinessHours.day_of_week == st_naive.weekday(),
+            BusinessHours.is_enabled == True
+        )
+    ).filter(
+        Collaborator.is_active == True,
+        slot_fits,
+        ~has_conflict
+    )
+
+    query = query.order_by(*COLLABORATOR_ORDERINGS[order_by](st_naive.date()))
+    return [collab_id for (collab_id,) in query.all()]
+
+def _order_by_id(day: date) -> list:
+    return [Collaborator.id]
+
+def _order_by_least_booked(day: date) -> list:
+    day_load = select(func.count(Appointment.id)).where(
+        and_(
+            Appointment.collaborator_id == Collaborator.id,
+            Appointment.status.in_(ACTIVE_APPOINTMENT_STATUSES),
+            Appointment.start_time >= datetime.combine(day, time.min),
+            Appointment.start_time <= datetime.combine(day, time.max)
+        )
+    ).correlate(Collaborator).scalar_subquery()
+    return [day_load, Collaborator.id]
+
+# Estrategias de orden disponibles para find_available_collaborators
+COLLABORATOR_ORDERINGS = {
+    "first": _order_by_id,
+    "least_booked": _order_by_least_booked
+}
 
 def generate_slots_in_range(
     slot_start: datetime,
@@ -118,7 +498,16 @@ def generate_slots_in_range(
     service_duration: int,
     collaborator: Collaborator
 ) -> List[dict]:
-    available_slots = []
+    intervals = free_intervals_in_range(slot_start, slot_end, existing_appointments)
+    return slots_from_intervals(intervals, service_duration, collaborator)
+
+def free_intervals_in_range(
+    slot_start: datetime,
+    slot_end: datetime,
+    existing_appointments: List[Appointment]
+) -> List[Tuple[datetime, datetime]]:
+    """Motor "interval": recorre las citas ordenadas y devuelve los huecos entre ellas."""
+    free_intervals = []
     current_time = slot_start
     
     occupied_intervals = []
@@ -134,19 +523,13 @@ def generate_slots_in_range(
     
     for occupied_start, occupied_end in occupied_intervals:
         if current_time < occupied_start:
-            available_min = (occupied_start - current_time).total_seconds() / 60
-            if available_min >= service_duration:
-                slots = generate_discrete_slots(current_time, occupied_start, service_duration, collaborator)
-                available_slots.extend(slots)
+            free_intervals.append((current_time, occupied_start))
         current_time = max(current_time, occupied_end)
     
     if current_time < slot_end:
-        available_min = (slot_end - current_time).total_seconds() / 60
-        if available_min >= service_duration:
-            slots = generate_discrete_slots(current_time, slot_end, service_duration, collaborator)
-            available_slots.extend(slots)
+        free_intervals.append((current_time, slot_end))
     
-    return available_slots
+    return free_intervals
 
 def generate_discrete_slots(
     start_time: datetime,
@@ -166,7 +549,7 @@ def generate_discrete_slots(
             'collaborator_name': collaborator.name,
             'available_minutes': service_duration
         })
-        current_slot_start += timedelta(minutes=15)
+        current_slot_start += timedelta(minutes=SLOT_STEP_MINUTES)
     
     return slots
 
@@ -174,10 +557,13 @@ def is_valid_appointment_time(
     db: Session,
     collaborator_id: int,
     start_time: datetime,
-    end_time: datetime
+    end_time: datetime,
+    check_conflicts: bool = True
 ) -> Tuple[bool, str]:
     """
     Valida disponibilidad usando comparaciones Naive (sin TZ).
+    Con check_conflicts=False solo valida fecha y horario laboral: los solapes
+    los rechaza la restricción de exclusión de Postgres al insertar.
     """
     now = datetime.now()
     st_naive = start_time.replace(tzinfo=None) if start_time.tzinfo else start_time
@@ -209,6 +595,9 @@ def is_valid_appointment_time(
     if not in_slot:
         return False, "Fuera del horario laboral."
 
+    if not check_conflicts:
+        return True, "Disponible"
+
     # Conflicto con otras citas (Comparación Naive)
     conflict = db.query(Appointment).filter(
         and_(
@@ -0,0 +1,103 @@
+"""
+Caché en memoria acotada (LRU) con caducidad (TTL).
+Es local a cada worker: sirve para resultados baratos de recalcular que
+pueden quedar desfasados como mucho `ttl` segundos entre procesos.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional
+
+# Centinela para distinguir "no está en caché" de un valor None guardado
+MISSING = object()
+
+
+class TTLCache:
+    """
+    Diccionario LRU con tamaño máximo y caducidad por entrada.
+    Seguro entre hilos y con contadores de aciertos y fallos.
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 60.0, clock: Callable[[], float] = time.monotonic):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._clock = clock
+        self._data: "OrderedDict[Hashable, tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        # Aumenta con cada invalidación: permite descartar valores calculados
+        # con datos leídos antes de una escritura concurrente.
+        self.generation = 0
+
+    def get(self, key: Hashable, default: Any = MISSING) -> Any:
+        """Devuelve el valor vigente o `default`, contando acierto o fallo."""
+        with self._lock:
+            item = self._data.get(key)
+            if item is not None:
+                expires_at, value = item
+                if expires_at > self._clock():
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._data[key]
+            self.misses += 1
+            return default
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None, generation: Optional[int] = None) -> bool:
+        """
+        Guarda el valor y expulsa la entrada menos usada si se supera maxsize.
+        Con `generation`, solo guarda si no ha habido invalidaciones desde entonces.
+        """
+        if self.maxsize <= 0:
+            return False
+        with self._lock:
+            if generation is not None and generation != self.generation:
+                return False
+            self._data[key] = (self._clock() + (self.ttl if ttl is None else ttl), value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+            return True
+
+    def invalidate(self, key: Hashable) -> bool:
+        """Elimina una entrada concreta. Devuelve True si existía."""
+        with self._lock:
+            self.generation += 1
+            return self._data.pop(key, MISSING) is not MISSING
+
+    def invalidate_where(self, predicate: Callable[[Hashable], bool]) -> int:
+        """Elimina todas las entradas cuya clave cumpla el predicado."""
+        with self._lock:
+            self.generation += 1
+            keys = [key for key in self._data if predicate(key)]
+            for key in keys:
+                del self._data[key]
+            return len(keys)
+
+    def clear(self) -> None:
+        """Vacía la caché y reinicia los contadores."""
+        with self._lock:
+            self.generation += 1
+            self._data.clear()
+            self.hits = self.misses = self.evictions = 0
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def stats(self) -> Dict[str, Any]:
+        """Resumen para exponer en endpoints de diagnóstico."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._data),
+                "maxsize": self.maxsize,
+                "ttl_seconds": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0
+            }
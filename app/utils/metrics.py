@@ -0,0 +1,344 @@
+"""
+Métricas HTTP por ruta en formato Prometheus.
+MetricsMiddleware mide cada petición y la agrupa por método y plantilla de
+ruta ("/api/v1/appointments/{appointment_id}", no la URL concreta), así el
+número de series no crece con los IDs:
+
+- http_requests_total{method,route,status}           (contador)
+- http_request_duration_seconds{method,route}        (histograma)
+- http_response_size_bytes{method,route}             (histograma)
+- http_requests_in_flight{method,route}              (gauge)
+
+Cada worker acumula en memoria. Con METRICS_MULTIPROC_DIR, además vuelca su
+snapshot a un fichero JSON propio desde un hilo de fondo (cada
+METRICS_FLUSH_INTERVAL_SECONDS, nunca en el camino de la petición) y /metrics
+suma los de todos los workers: los contadores de un worker que ya terminó se
+conservan y sus peticiones en curso se descartan.
+"""
+
+import json
+import os
+import threading
+import time
+import uuid
+from bisect import bisect_left
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+# Límites superiores de los cubos; el último es +Inf
+LATENCY_BUCKETS_SECONDS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS_BYTES = (100, 1_000, 10_000, 100_000, 1_000_000, 10_000_000)
+
+# Plantilla para las peticiones que no casan con ninguna ruta (404): una sola serie
+UNMATCHED_ROUTE = "<unmatched>"
+
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+RouteKey = Tuple[str, str]
+
+
+class Histogram:
+    """Cubos acumulados al estilo Prometheus, más suma y cuenta."""
+
+    def __init__(self, bounds: Tuple[float, ...]):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"counts": list(self.counts), "sum": self.sum, "count": self.count}
+
+
+class RequestMetrics:
+    """Métricas HTTP de este worker. Seguro entre hilos."""
+
+    def __init__(
+        self,
+        latency_buckets: Tuple[float, ...] = LATENCY_BUCKETS_SECONDS,
+        size_buckets: Tuple[float, ...] = SIZE_BUCKETS_BYTES
+    ):
+        self.latency_buckets = latency_buckets
+        self.size_buckets = size_buckets
+        self._lock = threading.Lock()
+        self.requests: Dict[Tuple[str, str, str], int] = {}
+        self.latency: Dict[RouteKey, Histogram] = {}
+        self.sizes: Dict[RouteKey, Histogram] = {}
+        self.in_flight: Dict[RouteKey, int] = {}
+
+    def start(self, method: str, route: str) -> None:
+        with self._lock:
+            key = (method, route)
+            self.in_flight[key] = self.in_flight.get(key, 0) + 1
+
+    def finish(self, method: str, route: str, status: int, seconds: float, size: int) -> None:
+        key = (method, route)
+        with self._lock:
+            self.in_flight[key] -= 1
+            status_key = (method, route, str(status))
+            self.requests[status_key] = self.requests.get(status_key, 0) + 1
+            if key not in self.latency:
+                self.latency[key] = Histogram(self.latency_buckets)
+                self.sizes[key] = Histogram(self.size_buckets)
+            self.latency[key].observe(seconds)
+            self.sizes[key].observe(size)
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Estado serializable en JSON (el formato de los ficheros por worker)."""
+        with self._lock:
+            return {
+                "latency_buckets": list(self.latency_buckets),
+                "size_buckets": list(self.size_buckets),
+                "requests": [[*key, count] for key, count in self.requests.items()],
+                "latency": [[*key, histogram.to_dict()] for key, histogram in self.latency.items()],
+                "sizes": [[*key, histogram.to_dict()] for key, histogram in self.sizes.items()],
+                "in_flight": [[*key, count] for key, count in self.in_flight.items()],
+            }
+
+
+def _merge_histograms(target: Dict[RouteKey, Dict[str, Any]], rows: Iterable[list]) -> None:
+    for method, route, data in rows:
+        merged = target.setdefault((method, route), {"counts": [0] * len(data["counts"]), "sum": 0.0, "count": 0})
+        merged["counts"] = [a + b for a, b in zip(merged["counts"], data["counts"])]
+        merged["sum"] += data["sum"]
+        merged["count"] += data["count"]
+
+
+def merge_snapshots(snapshots: List[Dict[str, Any]], live: Optional[List[bool]] = None) -> Dict[str, Any]:
+    """
+    Suma los snapshots de varios workers. `live[i]` indica si el worker i
+    sigue vivo: solo cuentan sus peticiones en curso. Todos deben usar los
+    mismos cubos (salen de la misma versión del código).
+    """
+    live = live if live is not None else [True] * len(snapshots)
+    requests: Dict[Tuple[str, str, str], int] = {}
+    latency: Dict[RouteKey, Dict[str, Any]] = {}
+    sizes: Dict[RouteKey, Dict[str, Any]] = {}
+    in_flight: Dict[RouteKey, int] = {}
+    for snapshot, alive in zip(snapshots, live):
+        for method, route, status, count in snapshot["requests"]:
+            requests[(method, route, status)] = requests.get((method, route, status), 0) + count
+        _merge_histograms(latency, snapshot["latency"])
+        _merge_histograms(sizes, snapshot["sizes"])
+        for method, route, count in snapshot["in_flight"]:
+            in_flight[(method, route)] = in_flight.get((method, route), 0) + (count if alive else 0)
+    first = snapshots[0] if snapshots else {}
+    return {
+        "latency_buckets": first.get("latency_buckets", list(LATENCY_BUCKETS_SECONDS)),
+        "size_buckets": first.get("size_buckets", list(SIZE_BUCKETS_BYTES)),
+        "requests": [[*key, count] for key, count in requests.items()],
+        "latency": [[*key, data] for key, data in latency.items()],
+        "sizes": [[*key, data] for key, data in sizes.items()],
+        "in_flight": [[*key, count] for key, count in in_flight.items()],
+    }
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(**labels: str) -> str:
+    return "{" + ",".join(f'{name}="{_escape(str(value))}"' for name, value in labels.items()) + "}"
+
+
+def _number(value: float) -> str:
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def _render_histogram(lines: List[str], name: str, bounds: List[float], rows: List[list]) -> None:
+    for method, route, data in sorted(rows, key=lambda row: (row[1], row[0])):
+        cumulative = 0
+        for bound, count in zip([*map(_number, bounds), "+Inf"], data["counts"]):
+            cumulative += count
+            lines.append(f"{name}_bucket{_labels(method=method, route=route, le=bound)} {cumulative}")
+        lines.append(f"{name}_sum{_labels(method=method, route=route)} {_number(data['sum'])}")
+        lines.append(f"{name}_count{_labels(method=method, route=route)} {data['count']}")
+
+
+def render_prometheus(snapshot: Dict[str, Any]) -> str:
+    """Formato de exposición de texto de Prometheus (0.0.4)."""
+    lines = [
+        "# HELP http_requests_total Peticiones HTTP terminadas.",
+        "# TYPE http_requests_total counter",
+    ]
+    for method, route, status, count in sorted(snapshot["requests"], key=lambda row: (row[1], row[0], row[2])):
+        lines.append(f"http_requests_total{_labels(method=method, route=route, status=status)} {count}")
+
+    lines += [
+        "# HELP http_request_duration_seconds Tiempo hasta terminar de enviar la respuesta.",
+        "# TYPE http_request_duration_seconds histogram",
+    ]
+    _render_histogram(lines, "http_request_duration_seconds", snapshot["latency_buckets"], snapshot["latency"])
+
+    lines += [
+        "# HELP http_response_size_bytes Bytes del cuerpo de la respuesta.",
+        "# TYPE http_response_size_bytes histogram",
+    ]
+    _render_histogram(lines, "http_response_size_bytes", snapshot["size_buckets"], snapshot["sizes"])
+
+    lines += [
+        "# HELP http_requests_in_flight Peticiones en curso.",
+        "# TYPE http_requests_in_flight gauge",
+    ]
+    for method, route, count in sorted(snapshot["in_flight"], key=lambda row: (row[1], row[0])):
+        lines.append(f"http_requests_in_flight{_labels(method=method, route=route)} {count}")
+    return "\n".join(lines) + "\n"
+
+
+def _pid_alive(pid: int) -> bool:
+    # La señal 0 solo comprueba que el proceso existe (en Windows os.kill lo mataría)
+    if os.name != "posix":
+        return True
+    # 0 y los negativos se refieren a grupos de procesos, no a un worker
+    if pid <= 0:
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class MultiprocessMetrics:
+    """
+    Comparte las métricas de los workers a través de un directorio: cada
+    proceso escribe `http-<pid>-<token>.json` (el token evita que un PID
+    reutilizado pise los contadores de un worker anterior).
+    start() lanza el hilo que lo vuelca periódicamente; stop() lo para con un
+    último volcado. collect() también vuelca antes de leer.
+    """
+
+    def __init__(self, metrics: RequestMetrics, directory: str = "", flush_interval: float = 1.0):
+        self.metrics = metrics
+        self.directory = directory
+        self.flush_interval = flush_interval
+        self._lock = threading.Lock()
+        self._last_flush = 0.0
+        self._pid = None
+        self._path = None
+        self._stopping = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def _own_path(self) -> str:
+        # Recalculado tras un fork: el hijo no debe escribir en el fichero del padre
+        if self._pid != os.getpid():
+            self._pid = os.getpid()
+            self._path = os.path.join(self.directory, f"http-{self._pid}-{uuid.uuid4().hex[:8]}.json")
+        return self._path
+
+    def flush(self, force: bool = False) -> None:
+        """Vuelca el snapshot de este worker (escritura atómica con os.replace)."""
+        if not self.directory:
+            return
+        now = time.monotonic()
+        with self._lock:
+            if not force and now - self._last_flush < self.flush_interval:
+                return
+            self._last_flush = now
+            path = self._own_path()
+            data = {"pid": self._pid, **self.metrics.snapshot()}
+            os.makedirs(self.directory, exist_ok=True)
+            tmp_path = f"{path}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as handle:
+                json.dump(data, handle, separators=(",", ":"))
+            os.replace(tmp_path, path)
+
+    def start(self) -> None:
+        """Arranca el volcado periódico (en el worker, después del fork)."""
+        if not self.directory or (self._thread is not None and self._thread.is_alive()):
+            return
+        self._stopping.clear()
+        self._thread = threading.Thread(target=self._flush_loop, name="metrics-flush", daemon=True)
+        self._thread.start()
+
+    def _flush_loop(self) -> None:
+        while not self._stopping.wait(self.flush_interval):
+            self.flush(force=True)
+
+    def stop(self) -> None:
+        """Para el hilo y hace el último volcado."""
+        self._stopping.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.flush(force=True)
+
+    def collect(self) -> Dict[str, Any]:
+        """Métricas de todos los workers (o solo de este si no hay directorio)."""
+        if not self.directory:
+            return self.metrics.snapshot()
+        self.flush(force=True)
+        snapshots, live = [], []
+        for name in sorted(os.listdir(self.directory)):
+            if not (name.startswith("http-") and name.endswith(".json")):
+                continue
+            try:
+                with open(os.path.join(self.directory, name), encoding="utf-8") as handle:
+                    data = json.load(handle)
+            except (OSError, ValueError):
+                continue
+            snapshots.append(data)
+            live.append(data.get("pid") == os.getpid() or _pid_alive(data.get("pid", 0)))
+        return merge_snapshots(snapshots, live)
+
+    def render(self) -> str:
+        return render_prometheus(self.collect())
+
+
+def resolve_route(app: Any, scope: Dict[str, Any]) -> str:
+    """Plantilla de la ruta que atenderá la petición (sin ejecutar el enrutado)."""
+    from starlette.routing import Match
+
+    partial = None
+    for route in getattr(app, "routes", ()):
+        match, _ = route.matches(scope)
+        if match == Match.FULL:
+            return getattr(route, "path_format", getattr(route, "path", UNMATCHED_ROUTE))
+        if match == Match.PARTIAL and partial is None:
+            # Misma ruta con otro método: la petición acabará en 405
+            partial = getattr(route, "path_format", getattr(route, "path", UNMATCHED_ROUTE))
+    return partial or UNMATCHED_ROUTE
+
+
+class MetricsMiddleware:
+    """
+    Middleware ASGI puro (no envuelve el cuerpo como BaseHTTPMiddleware):
+    mide desde que llega la petición hasta el último fragmento de la
+    respuesta, y cuenta los bytes enviados. Solo actualiza la memoria: el
+    volcado a disco lo hace el hilo de MultiprocessMetrics.
+    """
+
+    def __init__(self, app: Any, registry: MultiprocessMetrics):
+        self.app = app
+        self.registry = registry
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        metrics = self.registry.metrics
+        method = scope["method"]
+        # Starlette deja la propia aplicación (con sus rutas) en scope["app"]
+        route = resolve_route(scope.get("app", self.app), scope)
+        state = {"status": 500, "size": 0}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                state["status"] = message["status"]
+            elif message["type"] == "http.response.body":
+                state["size"] += len(message.get("body", b""))
+            await send(message)
+
+        metrics.start(method, route)
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            metrics.finish(method, route, state["status"], time.perf_counter() - started, state["size"])
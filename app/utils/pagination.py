@@ -0,0 +1,31 @@
+"""
+Paginación por cursor (keyset).
+El cursor es opaco para el cliente: codifica en base64 la clave de ordenación
+(start_time, id) de la última fila devuelta, y la siguiente página empieza
+justo después de ella sin que la base de datos tenga que saltarse filas.
+"""
+
+import base64
+import binascii
+import json
+from datetime import datetime
+from typing import Tuple
+
+
+def encode_cursor(start_time: datetime, row_id: int) -> str:
+    """Construye el cursor a partir de la última fila de la página."""
+    payload = json.dumps({"s": start_time.isoformat(), "i": row_id}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    """
+    Devuelve (start_time, id) del cursor.
+    Lanza ValueError si el cursor está mal formado o ha sido manipulado.
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        return datetime.fromisoformat(payload["s"]), int(payload["i"])
+    except (binascii.Error, UnicodeDecodeError, json.JSONDecodeError, KeyError, TypeError, ValueError) as e:
+        raise ValueError("Cursor de paginación inválido") from e
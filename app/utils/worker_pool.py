@@ -0,0 +1,200 @@
+"""
+Pool acotado de workers asyncio con cola de capacidad fija.
+Sirve para sacar trabajo lento (IA, llamadas a Meta) del ciclo
+petición-respuesta: el endpoint encola y responde al momento, y como
+máximo `workers` trabajos se ejecutan a la vez. Si la cola está llena,
+submit() lo rechaza en lugar de acumular memoria (backpressure).
+Los trabajos con la misma `key` se ejecutan en orden y de uno en uno,
+sin ocupar workers mientras esperan su turno.
+Cada trabajo se ejecuta en una copia del contexto (contextvars) de quien lo
+encoló: conserva, por ejemplo, el request_id de la petición que lo originó,
+pero cuenta sus consultas SQL en un QueryStats propio.
+"""
+
+import asyncio
+import contextvars
+import logging
+import time
+from collections import defaultdict, deque
+from typing import Any, Awaitable, Callable, Deque, Dict, Hashable, List, NamedTuple, Optional, Set
+
+from app.core.settings import settings
+from app.db.query_metrics import log_repeated_queries, track_queries
+
+logger = logging.getLogger(__name__)
+
+Job = Callable[..., Awaitable[Any]]
+
+
+class _Item(NamedTuple):
+    enqueued_at: float
+    job: Job
+    args: tuple
+    key: Optional[Hashable]
+    context: contextvars.Context
+
+
+class BoundedWorkerPool:
+    """
+    Cola FIFO con `maxsize` huecos atendida por `workers` tareas.
+    Cuenta encolados, rechazados, completados y fallidos, y mide la espera
+    en cola y la duración de cada trabajo.
+    """
+
+    def __init__(self, name: str, workers: int = 4, maxsize: int = 100, clock: Callable[[], float] = time.monotonic):
+        self.name = name
+        self.workers = workers
+        self.maxsize = maxsize
+        self._clock = clock
+        self._queue: Optional[asyncio.Queue] = None
+        self._tasks: List[asyncio.Task] = []
+        # Claves con un trabajo en curso y los trabajos aparcados detrás de él
+        self._active_keys: Set[Hashable] = set()
+        self._parked: Dict[Hashable, Deque[_Item]] = defaultdict(deque)
+        self._parked_count = 0
+        self.in_flight = 0
+        self.submitted = 0
+        self.rejected = 0
+        self.completed = 0
+        self.failed = 0
+        self.max_depth = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+        self.total_run = 0.0
+        self.max_run = 0.0
+
+    @property
+    def running(self) -> bool:
+        return bool(self._tasks)
+
+    async def start(self) -> None:
+        """Crea la cola y los workers en el event loop actual."""
+        if self.running:
+            return
+        # La capacidad la controla submit(): cuenta también los aparcados
+        self._queue = asyncio.Queue()
+        self._tasks = [
+            asyncio.create_task(self._worker(), name=f"{self.name}-worker-{index}")
+            for index in range(self.workers)
+        ]
+
+    @property
+    def depth(self) -> int:
+        """Trabajos pendientes: en cola más aparcados esperando a su clave."""
+        return (self._queue.qsize() if self._queue is not None else 0) + self._parked_count
+
+    def submit(self, job: Job, *args: Any, key: Optional[Hashable] = None) -> bool:
+        """
+        Encola job(*args) sin bloquear. Devuelve False si el pool no está
+        arrancado o la cola está llena. Con `key`, respeta el orden de envío
+        frente a otros trabajos de la misma clave.
+        """
+        if not self.running:
+            self.rejected += 1
+            return False
+        if self.depth >= self.maxsize:
+            self.rejected += 1
+            logger.warning("Cola %s llena (%d): trabajo rechazado", self.name, self.maxsize)
+            return False
+        self._queue.put_nowait(_Item(self._clock(), job, args, key, contextvars.copy_context()))
+        self.submitted += 1
+        self.max_depth = max(self.max_depth, self.depth)
+        return True
+
+    async def join(self) -> None:
+        """Espera a que se procesen todos los trabajos encolados."""
+        if self._queue is not None:
+            await self._queue.join()
+
+    async def stop(self, timeout: float = 10.0) -> None:
+        """Deja terminar lo encolado durante `timeout` segundos y cancela los workers."""
+        if not self.running:
+            return
+        try:
+            await asyncio.wait_for(self._queue.join(), timeout)
+        except asyncio.TimeoutError:
+            logger.warning("Pool %s detenido con %d trabajos pendientes", self.name, self.depth)
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def _worker(self) -> None:
+        while True:
+            item: Optional[_Item] = await self._queue.get()
+            if item.key is not None:
+                if item.key in self._active_keys:
+                    # Otro worker está con esta clave: lo ejecutará él al terminar
+                    self._parked[item.key].append(item)
+                    self._parked_count += 1
+                    continue
+                self._active_keys.add(item.key)
+            # Encadenamos los aparcados de la misma clave en este worker, en orden
+            while item is not None:
+                await self._run(item)
+                item = self._next_for_key(item.key)
+
+    def _next_for_key(self, key: Optional[Hashable]) -> Optional[_Item]:
+        if key is None:
+            return None
+        parked = self._parked.get(key)
+        if parked:
+            self._parked_count -= 1
+            item = parked.popleft()
+            if not parked:
+                del self._parked[key]
+            return item
+        self._active_keys.discard(key)
+        return None
+
+    async def _run(self, item: _Item) -> None:
+        started = self._clock()
+        wait = started - item.enqueued_at
+        self.total_wait += wait
+        self.max_wait = max(self.max_wait, wait)
+        self.in_flight += 1
+        try:
+            await asyncio.create_task(self._job_with_own_stats(item), context=item.context)
+            self.completed += 1
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            self.failed += 1
+            logger.exception("Error en un trabajo del pool %s", self.name)
+        finally:
+            elapsed = self._clock() - started
+            self.total_run += elapsed
+            self.max_run = max(self.max_run, elapsed)
+            self.in_flight -= 1
+            self._queue.task_done()
+
+    async def _job_with_own_stats(self, item: _Item) -> None:
+        # El QueryStats heredado es el de la petición que encoló, que ya terminó
+        with track_queries() as stats:
+            try:
+                await item.job(*item.args)
+            finally:
+                log_repeated_queries(stats, settings.DB_N_PLUS_ONE_THRESHOLD, f"trabajo del pool {self.name}")
+
+    def stats(self) -> Dict[str, Any]:
+        """Resumen para exponer en endpoints de diagnóstico."""
+        finished = self.completed + self.failed
+        started = finished + self.in_flight
+        return {
+            "workers": self.workers,
+            "running": self.running,
+            "queue_depth": self.depth,
+            "queue_maxsize": self.maxsize,
+            "parked": self._parked_count,
+            "active_keys": len(self._active_keys),
+            "max_queue_depth": self.max_depth,
+            "in_flight": self.in_flight,
+            "submitted": self.submitted,
+            "rejected": self.rejected,
+            "completed": self.completed,
+            "failed": self.failed,
+            "avg_wait_ms": round(self.total_wait / started * 1000, 3) if started else 0.0,
+            "max_wait_ms": round(self.max_wait * 1000, 3),
+            "avg_run_ms": round(self.total_run / finished * 1000, 3) if finished else 0.0,
+            "max_run_ms": round(self.max_run * 1000, 3),
+        }
@@ -0,0 +1,145 @@
+"""
+Benchmark del tamaño del prompt y la latencia del agente con LLM.
+Compara el resultado de la herramienta get_availability enviado tal cual
+("raw": json.dumps de todos los slots, el formato anterior) con el resumen
+compacto de app.agents.slot_summary ("summary").
+
+OpenAI se sustituye por el servidor falso de benchmarks.fakes: la primera
+llamada pide la herramienta y la segunda responde texto. Su latencia crece con
+el tamaño del prompt (--base-ms + --ms-per-1k-tokens), como el prefill de un
+modelo real.
+La agenda vive en una SQLite temporal con N profesionales y citas aleatorias.
+
+Informa bytes y tokens aproximados (caracteres / 4) del prompt de la segunda
+llamada y la latencia de extremo a extremo de run_llm_agent.
+
+Uso:
+    python -m benchmarks.agent_prompt [--collaborators 50] [--requests 20]
+    python -m benchmarks.agent_prompt --base-ms 300 --ms-per-1k-tokens 40
+"""
+
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import time as timer
+from datetime import datetime, time, timedelta
+
+from openai import OpenAI
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.agents import booking_agent, tools
+from app.models.appointments import Appointment, AppointmentStatus
+from app.models.base import Base
+from app.models.business_hours import BusinessHours, TimeSlot
+from app.models.clients import Client  # noqa: F401  (registra el mapper usado por Appointment.client)
+from app.models.collaborators import Collaborator
+from app.models.services import Service
+from app.utils.availability import availability_cache
+from benchmarks.fakes import FaultInjector, approx_tokens, build_fake_openai, default_script, start_server
+
+TARGET_DATE = datetime(2030, 1, 7)
+
+
+def build_database(url: str, collaborators_count: int, seed: int = 42) -> sessionmaker:
+    """Turno partido para todos los profesionales el día objetivo y hasta 6 citas cada uno."""
+    rng = random.Random(seed)
+    engine = create_engine(url, connect_args={"check_same_thread": False})
+    tables = [table for name, table in Base.metadata.tables.items() if name != "clients"]
+    Base.metadata.create_all(bind=engine, tables=tables)
+    Session = sessionmaker(bind=engine, autoflush=False)
+
+    db = Session()
+    db.add(Service(id=1, name="Corte", duration_minutes=30, price=15.0))
+    for index in range(collaborators_count):
+        collaborator = Collaborator(name=f"Profesional {index}", email=f"p{index}@example.com")
+        db.add(collaborator)
+        db.flush()
+        schedule = BusinessHours(
+            day_of_week=TARGET_DATE.weekday(), day_name="Lunes", is_enabled=True,
+            is_split_shift=True, collaborator_id=collaborator.id
+        )
+        db.add(schedule)
+        db.flush()
+        db.add_all([
+            TimeSlot(start_time=time(9, 0), end_time=time(14, 0), slot_order=1, business_hours_id=schedule.id),
+            TimeSlot(start_time=time(16, 0), end_time=time(20, 0), slot_order=2, business_hours_id=schedule.id),
+        ])
+        for _ in range(rng.randint(0, 6)):
+            start = TARGET_DATE.replace(hour=9) + timedelta(minutes=rng.randrange(0, 11 * 60, 15))
+            db.add(Appointment(
+                service_id=1, collaborator_id=collaborator.id, client_name="Cliente",
+                start_time=start, end_time=start + timedelta(minutes=rng.choice([30, 45, 60])),
+                status=AppointmentStatus.SCHEDULED
+            ))
+    db.commit()
+    db.close()
+    return Session
+
+
+def raw_slots(slots, max_suggestions=None, free_intervals=None):
+    """Formato anterior: todos los slots sin resumir (summary_content los serializa con default=str)."""
+    return slots
+
+
+def run_mode(requests: int):
+    prompt = "¿Qué huecos tenéis el lunes para corte?"
+    latencies = []
+    for _ in range(requests):
+        started = timer.perf_counter()
+        booking_agent.run_llm_agent(prompt)
+        latencies.append((timer.perf_counter() - started) * 1000)
+    return latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--collaborators", type=int, default=50)
+    parser.add_argument("--requests", type=int, default=20)
+    parser.add_argument("--base-ms", type=float, default=200.0, help="Latencia fija por llamada del OpenAI falso")
+    parser.add_argument("--ms-per-1k-tokens", type=float, default=25.0, help="Latencia extra por cada 1000 tokens de prompt")
+    args = parser.parse_args()
+
+    tmp_dir = tempfile.TemporaryDirectory()
+    Session = build_database(f"sqlite:///{os.path.join(tmp_dir.name, 'bench.db')}", args.collaborators)
+    prompt_sizes = []
+    fake_openai = build_fake_openai(
+        script=default_script(TARGET_DATE.strftime("%Y-%m-%d")),
+        faults=FaultInjector(latency_ms=args.base_ms),
+        ms_per_1k_tokens=args.ms_per_1k_tokens,
+        prompt_sizes=prompt_sizes
+    )
+    server = start_server(fake_openai)
+
+    original = (booking_agent.client, booking_agent.SessionLocal, tools.SessionLocal, tools.summarize_slots)
+    booking_agent.client = OpenAI(api_key="bench", base_url=f"{server.base_url}/v1")
+    booking_agent.SessionLocal = tools.SessionLocal = Session
+    modes = {"raw": raw_slots, "summary": original[3]}
+
+    print(f"{args.collaborators} profesionales, {args.requests} peticiones por modo, "
+          f"OpenAI falso {args.base_ms:.0f} ms + {args.ms_per_1k_tokens:.0f} ms/1k tokens")
+    print(f"{'modo':<10}{'bytes':>10}{'~tokens':>10}{'p50 ms':>10}{'p95 ms':>10}{'max ms':>10}")
+    try:
+        for name, content_fn in modes.items():
+            tools.summarize_slots = content_fn
+            availability_cache.clear()
+            tools.tool_cache.clear()
+            prompt_sizes.clear()
+            latencies = run_mode(args.requests)
+            size = int(statistics.median(prompt_sizes))
+            ordered = sorted(latencies)
+            p95 = ordered[max(0, round(0.95 * len(ordered)) - 1)]
+            print(
+                f"{name:<10}{size:>10}{approx_tokens(size):>10}{statistics.median(latencies):>10.1f}"
+                f"{p95:>10.1f}{ordered[-1]:>10.1f}"
+            )
+    finally:
+        booking_agent.client, booking_agent.SessionLocal, tools.SessionLocal, tools.summarize_slots = original
+        server.should_exit = True
+        tmp_dir.cleanup()
+
+
+if __name__ == "__main__":
+    main()
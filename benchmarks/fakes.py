@@ -0,0 +1,214 @@
+"""
+Servidores falsos de OpenAI (chat completions) y Meta (Graph API de WhatsApp)
+para benchmarks y pruebas de carga sin gastar créditos ni cuota.
+
+Ambos se sirven con uvicorn en un hilo (start_server) y permiten configurar:
+- latencia fija + variable (jitter) y, en OpenAI, proporcional al prompt,
+- una tasa de errores inyectados (500/503/429, con Retry-After en los 429),
+- en OpenAI, un guion de respuestas: qué herramientas pide según el mensaje
+  del usuario y qué texto final devuelve tras recibir sus resultados.
+
+El guion es una lista de reglas (la primera cuyo `match` aparezca en el último
+mensaje del usuario, sin distinguir mayúsculas; "" casa con todo):
+
+    [
+        {"match": "semana", "tool_calls": [
+            {"name": "get_availability", "arguments": {"service_id": 1, "target_date": "2030-01-07"}},
+            {"name": "get_availability", "arguments": {"service_id": 1, "target_date": "2030-01-08"}}
+        ]},
+        {"match": "hola", "reply": "¡Hola! ¿En qué te ayudo?"},
+        {"match": "", "tool_calls": [...], "final_reply": "Tenemos hueco a las 10:00."}
+    ]
+"""
+
+import asyncio
+import json
+import random
+import socket
+import threading
+import time as timer
+from typing import Any, Callable, Dict, List, Optional
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+DEFAULT_FINAL_REPLY = "Tenemos hueco a las 10:00 y a las 16:30. ¿Te reservo alguna?"
+
+
+def approx_tokens(size: int) -> int:
+    # Aproximación habitual para texto y JSON en modelos GPT: ~4 caracteres por token
+    return size // 4
+
+
+def default_script(target_date: str = "2030-01-07", service_id: int = 1) -> List[Dict[str, Any]]:
+    """Guion por defecto: cualquier mensaje consulta disponibilidad de un día."""
+    return [{
+        "match": "",
+        "tool_calls": [{
+            "name": "get_availability",
+            "arguments": {"service_id": service_id, "target_date": target_date},
+        }],
+    }]
+
+
+def load_script(path: str) -> List[Dict[str, Any]]:
+    with open(path, encoding="utf-8") as handle:
+        return json.load(handle)
+
+
+class FaultInjector:
+    """Latencia y errores aleatorios (reproducibles con `seed`)."""
+
+    def __init__(self, latency_ms: float = 0.0, jitter_ms: float = 0.0, error_rate: float = 0.0, seed: int = 42):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.rng = random.Random(seed)
+        self.requests = 0
+        self.errors = 0
+
+    async def delay(self, extra_ms: float = 0.0) -> None:
+        seconds = (self.latency_ms + extra_ms + self.rng.uniform(0, self.jitter_ms)) / 1000
+        if seconds > 0:
+            await asyncio.sleep(seconds)
+
+    def error_response(self) -> Optional[JSONResponse]:
+        """Respuesta de error a inyectar en esta petición, o None."""
+        self.requests += 1
+        if self.error_rate <= 0 or self.rng.random() >= self.error_rate:
+            return None
+        self.errors += 1
+        status = self.rng.choice([429, 500, 503])
+        headers = {"Retry-After": "0"} if status == 429 else None
+        return JSONResponse({"error": {"message": "error inyectado", "code": status}}, status_code=status, headers=headers)
+
+    def stats(self) -> Dict[str, Any]:
+        return {"requests": self.requests, "injected_errors": self.errors}
+
+
+def _pick_rule(script: List[Dict[str, Any]], text: str) -> Dict[str, Any]:
+    lowered = text.lower()
+    for rule in script:
+        if rule.get("match", "").lower() in lowered:
+            return rule
+    return {"reply": DEFAULT_FINAL_REPLY}
+
+
+def _completion(model: str, message: Dict[str, Any], finish_reason: str, prompt_tokens: int) -> Dict[str, Any]:
+    return {
+        "id": "chatcmpl-fake",
+        "object": "chat.completion",
+        "created": int(timer.time()),
+        "model": model,
+        "choices": [{"index": 0, "message": message, "finish_reason": finish_reason}],
+        "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": 20, "total_tokens": prompt_tokens + 20},
+    }
+
+
+def build_fake_openai(
+    script: Optional[List[Dict[str, Any]]] = None,
+    faults: Optional[FaultInjector] = None,
+    ms_per_1k_tokens: float = 0.0,
+    prompt_sizes: Optional[list] = None
+) -> FastAPI:
+    """
+    /v1/chat/completions con la forma de la API de OpenAI. La primera llamada
+    de un turno sigue el guion; la que trae resultados de herramientas
+    devuelve el texto final. La latencia crece con el tamaño del prompt
+    (`ms_per_1k_tokens`), como el prefill de un modelo real.
+    `prompt_sizes` recibe los bytes de cada prompt con resultados de herramientas.
+    """
+    script = script if script is not None else default_script()
+    faults = faults or FaultInjector()
+    app = FastAPI()
+    app.state.faults = faults
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        raw = await request.body()
+        body = json.loads(raw)
+        prompt_tokens = approx_tokens(len(raw))
+        await faults.delay(prompt_tokens / 1000 * ms_per_1k_tokens)
+        error = faults.error_response()
+        if error is not None:
+            return error
+
+        messages = body["messages"]
+        last_user = next((m.get("content") or "" for m in reversed(messages) if m.get("role") == "user"), "")
+        rule = _pick_rule(script, last_user)
+
+        if messages[-1].get("role") == "tool":
+            if prompt_sizes is not None:
+                prompt_sizes.append(len(raw))
+            message = {"role": "assistant", "content": rule.get("final_reply", DEFAULT_FINAL_REPLY)}
+            return _completion(body["model"], message, "stop", prompt_tokens)
+
+        if rule.get("tool_calls") and body.get("tools"):
+            message = {
+                "role": "assistant",
+                "content": None,
+                "tool_calls": [
+                    {
+                        "id": f"call_{index}",
+                        "type": "function",
+                        "function": {"name": call["name"], "arguments": json.dumps(call["arguments"])},
+                    }
+                    for index, call in enumerate(rule["tool_calls"])
+                ],
+            }
+            return _completion(body["model"], message, "tool_calls", prompt_tokens)
+
+        message = {"role": "assistant", "content": rule.get("reply", DEFAULT_FINAL_REPLY)}
+        return _completion(body["model"], message, "stop", prompt_tokens)
+
+    return app
+
+
+def build_fake_meta(
+    faults: Optional[FaultInjector] = None,
+    on_message: Optional[Callable[[str, str], None]] = None
+) -> FastAPI:
+    """
+    POST /{version}/{phone_number_id}/messages de la Graph API. `on_message`
+    recibe (teléfono, texto) de cada envío aceptado, en el hilo del servidor.
+    """
+    faults = faults or FaultInjector()
+    app = FastAPI()
+    app.state.faults = faults
+    counter = {"sent": 0}
+
+    @app.post("/{version}/{phone_number_id}/messages")
+    async def send_message(version: str, phone_number_id: str, request: Request):
+        await faults.delay()
+        error = faults.error_response()
+        if error is not None:
+            return error
+        body = await request.json()
+        counter["sent"] += 1
+        if on_message is not None:
+            on_message(body["to"], body["text"]["body"])
+        return {
+            "messaging_product": "whatsapp",
+            "contacts": [{"input": body["to"], "wa_id": body["to"]}],
+            "messages": [{"id": f"wamid.fake.{counter['sent']}"}],
+        }
+
+    return app
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_server(app: FastAPI, port: Optional[int] = None) -> uvicorn.Server:
+    """Sirve la app en 127.0.0.1 desde un hilo propio (con su event loop). Devuelve el Server."""
+    port = port or free_port()
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    server.base_url = f"http://127.0.0.1:{port}"
+    threading.Thread(target=server.run, daemon=True, name=f"fake-server-{port}").start()
+    while not server.started:
+        timer.sleep(0.01)
+    return server
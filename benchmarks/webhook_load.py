@@ -0,0 +1,254 @@
+"""
+Prueba de carga de extremo a extremo del webhook de WhatsApp.
+Lanza miles de POST sintéticos contra /ai_booking/whatsapp (handle_whatsapp_message)
+con OpenAI y Meta sustituidos por los servidores falsos de benchmarks.fakes:
+
+    driver --POST--> webhook --message_pool--> agente (atajo / LLM falso) --> Meta falso
+
+La latencia de respuesta se mide desde el POST hasta que el Meta falso recibe
+la respuesta para ese teléfono (los mensajes de un teléfono se responden en
+orden). En paralelo un monitor mide el retraso del event loop: cuánto tarda en
+despertar un asyncio.sleep(intervalo), es decir, cuánto tiempo estuvo bloqueado.
+
+Informa throughput, percentiles del acuse del webhook y de la respuesta
+completa, rechazos por cola llena (503), reintentos hacia Meta, tasa de
+acierto del atajo y tiempo de event loop bloqueado.
+
+Uso:
+    python -m benchmarks.webhook_load [--messages 2000] [--phones 200] [--concurrency 50]
+    python -m benchmarks.webhook_load --openai-ms 400 --meta-ms 80 --error-rate 0.02
+    python -m benchmarks.webhook_load --no-fast-path --openai-script guion.json
+"""
+
+import argparse
+import asyncio
+import logging
+import os
+import statistics
+import tempfile
+import threading
+import time as timer
+from collections import defaultdict, deque
+from typing import Deque, Dict, List
+
+import httpx
+from fastapi import FastAPI
+from openai import OpenAI
+
+from app.agents import booking_agent, tools, whatsapp
+from app.agents.dedup import MessageDeduplicator
+from app.agents.fast_path import AgentMetrics
+from app.agents.meta_client import build_meta_client
+from app.api.v1.endpoints import ai_booking
+from app.core.settings import settings
+from app.utils.worker_pool import BoundedWorkerPool
+from benchmarks.agent_prompt import TARGET_DATE, build_database
+from benchmarks.fakes import FaultInjector, build_fake_meta, build_fake_openai, default_script, load_script, start_server
+
+# Mezcla de mensajes: consultas que resuelve el atajo y otras que van al LLM
+PROMPTS = (
+    "¿Hay hueco el {date} para corte?",
+    "Hola, ¿qué tal? Quería información",
+    "¿Tenéis cita el {date} por la tarde para corte?",
+    "Quiero cambiar mi cita del {date}",
+)
+
+
+class ReplyTracker:
+    """Empareja cada respuesta recibida por Meta con el POST que la originó (FIFO por teléfono)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pending: Dict[str, Deque[float]] = defaultdict(deque)
+        self.outstanding = 0
+        self.latencies_ms: List[float] = []
+        self.unexpected = 0
+        self.done = threading.Event()
+
+    def sent(self, phone: str, started: float) -> None:
+        with self._lock:
+            self._pending[phone].append(started)
+            self.outstanding += 1
+            self.done.clear()
+
+    def unsent(self, phone: str) -> None:
+        """El webhook rechazó el mensaje (503): no habrá respuesta para él."""
+        with self._lock:
+            self._pending[phone].pop()
+            self.outstanding -= 1
+
+    def replied(self, phone: str, text: str) -> None:
+        now = timer.perf_counter()
+        with self._lock:
+            if not self._pending[phone]:
+                self.unexpected += 1
+                return
+            self.latencies_ms.append((now - self._pending[phone].popleft()) * 1000)
+            self.outstanding -= 1
+            if self.outstanding == 0:
+                self.done.set()
+
+
+async def monitor_event_loop(interval: float, lags_ms: List[float], stop: asyncio.Event) -> None:
+    """Retraso de cada despertar respecto a `interval`: tiempo con el loop bloqueado."""
+    while not stop.is_set():
+        started = timer.perf_counter()
+        await asyncio.sleep(interval)
+        lags_ms.append(max(0.0, (timer.perf_counter() - started - interval) * 1000))
+
+
+def webhook_payload(phone: str, text: str, message_id: str) -> dict:
+    message = {"id": message_id, "from": phone, "type": "text", "text": {"body": text}}
+    return {"object": "whatsapp_business_account", "entry": [{"changes": [{"value": {"messages": [message]}}]}]}
+
+
+async def drive(client: httpx.AsyncClient, args, tracker: ReplyTracker, ack_ms: List[float], counters: dict) -> None:
+    """
+    `concurrency` emisores; cada teléfono pertenece a un solo emisor, que envía
+    sus mensajes de uno en uno (el orden por teléfono queda garantizado).
+    Los 503 se reintentan como haría Meta.
+    """
+    day = TARGET_DATE.strftime("%d/%m/%Y")
+    phones = [f"34600{index:06d}" for index in range(args.phones)]
+
+    async def sender(worker: int) -> None:
+        own_phones = phones[worker::args.concurrency]
+        if not own_phones:
+            return
+        for sequence in range(worker, args.messages, args.concurrency):
+            phone = own_phones[(sequence // args.concurrency) % len(own_phones)]
+            text = PROMPTS[sequence % len(PROMPTS)].format(date=day)
+            payload = webhook_payload(phone, text, f"wamid.bench.{sequence}")
+            while True:
+                started = timer.perf_counter()
+                tracker.sent(phone, started)
+                response = await client.post("/ai_booking/whatsapp", json=payload)
+                ack_ms.append((timer.perf_counter() - started) * 1000)
+                if response.status_code != 503:
+                    break
+                tracker.unsent(phone)
+                counters["rejected"] += 1
+                await asyncio.sleep(args.retry_ms / 1000)
+
+    await asyncio.gather(*(sender(worker) for worker in range(args.concurrency)))
+
+
+def percentiles(values: List[float]) -> str:
+    if not values:
+        return f"{'-':>9}{'-':>9}{'-':>9}{'-':>9}"
+    ordered = sorted(values)
+
+    def pick(pct):
+        return ordered[max(0, min(len(ordered) - 1, round(pct / 100 * len(ordered)) - 1))]
+
+    return f"{statistics.median(ordered):>9.1f}{pick(95):>9.1f}{pick(99):>9.1f}{ordered[-1]:>9.1f}"
+
+
+async def main_async(args) -> None:
+    tmp_dir = tempfile.TemporaryDirectory()
+    Session = build_database(f"sqlite:///{os.path.join(tmp_dir.name, 'bench.db')}", args.collaborators)
+    tracker = ReplyTracker()
+
+    script = load_script(args.openai_script) if args.openai_script else [
+        {"match": "hola", "reply": "¡Hola! ¿En qué te puedo ayudar?"},
+        *default_script(TARGET_DATE.strftime("%Y-%m-%d")),
+    ]
+    openai_faults = FaultInjector(args.openai_ms, args.jitter_ms, args.error_rate, seed=1)
+    meta_faults = FaultInjector(args.meta_ms, args.jitter_ms, args.error_rate, seed=2)
+    openai_server = start_server(build_fake_openai(script, openai_faults, ms_per_1k_tokens=args.ms_per_1k_tokens))
+    meta_server = start_server(build_fake_meta(meta_faults, on_message=tracker.replied))
+
+    pool = BoundedWorkerPool("whatsapp-bench", workers=args.workers, maxsize=args.queue_size)
+    meta_client = build_meta_client(base_url=f"{meta_server.base_url}/v22.0", token="bench", phone_number_id="bench", backoff=0.05)
+    patches = [
+        (booking_agent, "client", OpenAI(api_key="bench", base_url=f"{openai_server.base_url}/v1")),
+        (booking_agent, "SessionLocal", Session),
+        (booking_agent, "agent_metrics", AgentMetrics()),
+        (tools, "SessionLocal", Session),
+        (whatsapp, "meta_client", meta_client),
+        (ai_booking, "message_pool", pool),
+        (ai_booking, "message_deduplicator", MessageDeduplicator()),
+        (settings, "AGENT_FAST_PATH_ENABLED", not args.no_fast_path),
+    ]
+    originals = [(target, name, getattr(target, name)) for target, name, _ in patches]
+    for target, name, value in patches:
+        setattr(target, name, value)
+
+    app = FastAPI()
+    app.include_router(ai_booking.router, prefix="/ai_booking")
+    ack_ms: List[float] = []
+    lags_ms: List[float] = []
+    counters = {"rejected": 0}
+    stop_monitor = asyncio.Event()
+
+    print(
+        f"{args.messages} mensajes, {args.phones} teléfonos, {args.concurrency} emisores, "
+        f"{args.workers} workers (cola {args.queue_size}), OpenAI {args.openai_ms:.0f} ms, "
+        f"Meta {args.meta_ms:.0f} ms, errores {args.error_rate:.0%}, "
+        f"atajo {'off' if args.no_fast_path else 'on'}"
+    )
+    # Los 503 ya se cuentan en el informe: sin un aviso por cada rechazo
+    logging.getLogger("app.utils.worker_pool").setLevel(logging.ERROR)
+    try:
+        meta_client.start()
+        await pool.start()
+        monitor = asyncio.create_task(monitor_event_loop(args.monitor_ms / 1000, lags_ms, stop_monitor))
+        transport = httpx.ASGITransport(app=app)
+        started = timer.perf_counter()
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            await drive(client, args, tracker, ack_ms, counters)
+        sent_elapsed = timer.perf_counter() - started
+        completed = await asyncio.to_thread(tracker.done.wait, args.timeout)
+        elapsed = timer.perf_counter() - started
+        stop_monitor.set()
+        await monitor
+    finally:
+        await pool.stop(timeout=1)
+        await meta_client.aclose()
+        openai_server.should_exit = meta_server.should_exit = True
+        agent_stats = booking_agent.agent_metrics.stats()
+        for target, name, value in originals:
+            setattr(target, name, value)
+        tmp_dir.cleanup()
+
+    replies = len(tracker.latencies_ms)
+    blocked = [lag for lag in lags_ms if lag >= args.block_threshold_ms]
+    print(f"\n{'':<22}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'max ms':>9}")
+    print(f"{'acuse del webhook':<22}{percentiles(ack_ms)}")
+    print(f"{'respuesta completa':<22}{percentiles(tracker.latencies_ms)}")
+    print(f"{'retraso event loop':<22}{percentiles(lags_ms)}")
+    print()
+    print(f"Respuestas: {replies}/{args.messages}{'' if completed else ' (timeout)'} en {elapsed:.2f} s "
+          f"-> {replies / elapsed:.1f} respuestas/s (envío: {args.messages / sent_elapsed:.1f} POST/s)")
+    print(f"Rechazos 503 (cola llena): {counters['rejected']}  |  Respuestas sin emparejar: {tracker.unexpected}")
+    print(f"Event loop bloqueado >= {args.block_threshold_ms:.0f} ms: {len(blocked)} veces, "
+          f"{sum(blocked):.1f} ms en total ({sum(blocked) / (elapsed * 1000):.2%} del tiempo)")
+    print(f"Atajo: {agent_stats['fast_path_hit_rate']:.0%} de {agent_stats['requests']} mensajes  |  "
+          f"OpenAI falso: {openai_faults.stats()}  |  Meta falso: {meta_faults.stats()}  |  "
+          f"Cliente Meta: {meta_client.stats()}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--messages", type=int, default=2000)
+    parser.add_argument("--phones", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=50, help="Emisores simultáneos de webhooks")
+    parser.add_argument("--workers", type=int, default=settings.WHATSAPP_WORKERS)
+    parser.add_argument("--queue-size", type=int, default=settings.WHATSAPP_QUEUE_SIZE)
+    parser.add_argument("--collaborators", type=int, default=10)
+    parser.add_argument("--openai-ms", type=float, default=300.0, help="Latencia fija del OpenAI falso")
+    parser.add_argument("--ms-per-1k-tokens", type=float, default=25.0)
+    parser.add_argument("--meta-ms", type=float, default=50.0, help="Latencia del Meta falso")
+    parser.add_argument("--jitter-ms", type=float, default=20.0)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fracción de peticiones con 429/500/503 inyectado")
+    parser.add_argument("--openai-script", default=None, help="JSON con el guion de herramientas (ver benchmarks.fakes)")
+    parser.add_argument("--no-fast-path", action="store_true", help="Desactiva el atajo por reglas del agente")
+    parser.add_argument("--retry-ms", type=float, default=100.0, help="Espera antes de reintentar un 503")
+    parser.add_argument("--monitor-ms", type=float, default=10.0, help="Intervalo del monitor del event loop")
+    parser.add_argument("--block-threshold-ms", type=float, default=5.0)
+    parser.add_argument("--timeout", type=float, default=120.0, help="Segundos máximos esperando respuestas")
+    asyncio.run(main_async(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
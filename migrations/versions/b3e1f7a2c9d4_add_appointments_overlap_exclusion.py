@@ -0,0 +1,43 @@
+"""add appointments overlap exclusion constraint
+
+Revision ID: b3e1f7a2c9d4
+Revises: 9c76e0f02ae6
+Create Date: 2026-10-17 10:12:31.482917
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b3e1f7a2c9d4'
+down_revision: Union[str, Sequence[str], None] = '9c76e0f02ae6'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # 1. btree_gist permite usar '=' sobre collaborator_id dentro de un índice GiST
+    op.execute("CREATE EXTENSION IF NOT EXISTS btree_gist")
+
+    # 2. Dos citas activas del mismo colaborador no pueden solaparse.
+    #    El rango es [inicio, fin): una cita que empieza cuando acaba otra no choca.
+    #    Si ya existen solapes en la tabla, esta sentencia falla y hay que limpiarlos antes.
+    op.execute(
+        """
+        ALTER TABLE appointments
+        ADD CONSTRAINT appointments_no_overlap
+        EXCLUDE USING gist (
+            collaborator_id WITH =,
+            tstzrange(start_time, end_time, '[)') WITH &&
+        )
+        WHERE (status IN ('SCHEDULED', 'CONFIRMED', 'IN_PROGRESS'))
+        """
+    )
+
+
+def downgrade() -> None:
+    # Dejamos la extensión instalada: puede usarla otro objeto de la base de datos
+    op.execute("ALTER TABLE appointments DROP CONSTRAINT IF EXISTS appointments_no_overlap")
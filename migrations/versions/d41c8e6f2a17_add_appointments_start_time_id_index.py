@@ -0,0 +1,27 @@
+"""add appointments (start_time, id) index for keyset pagination
+
+Revision ID: d41c8e6f2a17
+Revises: b3e1f7a2c9d4
+Create Date: 2026-10-17 11:05:47.210334
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd41c8e6f2a17'
+down_revision: Union[str, Sequence[str], None] = 'b3e1f7a2c9d4'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Postgres recorre el índice hacia atrás para ORDER BY start_time DESC, id DESC
+    op.create_index('ix_appointments_start_time_id', 'appointments', ['start_time', 'id'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_appointments_start_time_id', table_name='appointments')
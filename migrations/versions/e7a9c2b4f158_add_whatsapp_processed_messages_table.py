@@ -0,0 +1,34 @@
+"""add whatsapp processed messages table
+
+Revision ID: e7a9c2b4f158
+Revises: d41c8e6f2a17
+Create Date: 2026-10-17 12:20:09.664501
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e7a9c2b4f158'
+down_revision: Union[str, Sequence[str], None] = 'd41c8e6f2a17'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('whatsapp_processed_messages',
+    sa.Column('message_id', sa.String(length=255), nullable=False, comment='ID del mensaje de WhatsApp (wamid)'),
+    sa.Column('received_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False, comment='Fecha de la primera entrega'),
+    sa.PrimaryKeyConstraint('message_id')
+    )
+    op.create_index(op.f('ix_whatsapp_processed_messages_received_at'), 'whatsapp_processed_messages', ['received_at'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_whatsapp_processed_messages_received_at'), table_name='whatsapp_processed_messages')
+    op.drop_table('whatsapp_processed_messages')
@@ -0,0 +1,36 @@
+"""add whatsapp conversations table
+
+Revision ID: f2c4d8a6b1e3
+Revises: e7a9c2b4f158
+Create Date: 2026-10-17 15:02:41.318207
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f2c4d8a6b1e3'
+down_revision: Union[str, Sequence[str], None] = 'e7a9c2b4f158'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('whatsapp_conversations',
+    sa.Column('phone', sa.String(length=32), nullable=False, comment='Teléfono de WhatsApp del usuario'),
+    sa.Column('state', postgresql.JSONB(astext_type=sa.Text()), nullable=False, comment='Historial y resultados de herramientas'),
+    sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False, comment='Fecha del último mensaje'),
+    sa.PrimaryKeyConstraint('phone')
+    )
+    op.create_index(op.f('ix_whatsapp_conversations_updated_at'), 'whatsapp_conversations', ['updated_at'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_whatsapp_conversations_updated_at'), table_name='whatsapp_conversations')
+    op.drop_table('whatsapp_conversations')
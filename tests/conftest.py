@@ -3,24 +3,36 @@ Configuración de pytest con fixtures para tests.
 """
 
 import pytest
+import pytest_asyncio
 from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import NullPool
 from fastapi.testclient import TestClient
 from app.main import app
-from app.db.session import get_db
+from app.db.session import get_async_db, get_db, get_read_db
 from app.models.base import Base
+from app.agents.tools import tool_cache
+from app.utils.availability import availability_cache
 # Importar todos los modelos para que se registren
 from app.models import services, business_hours, appointments, collaborators
 
 
-# Base de datos en memoria para tests
-SQLALCHEMY_DATABASE_URL = "sqlite:///:memory:"
+# Base de datos en memoria para tests.
+# Con cache=shared el engine sync y el async ven la misma base de datos
+# mientras el engine sync mantenga abierta su conexión.
+SQLALCHEMY_DATABASE_URL = "sqlite:///file:test_db?mode=memory&cache=shared&uri=true"
+SQLALCHEMY_ASYNC_DATABASE_URL = "sqlite+aiosqlite:///file:test_db?mode=memory&cache=shared&uri=true"
 
 engine = create_engine(
     SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False}
 )
 TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# NullPool: cada test (y cada TestClient) corre en su propio event loop
+async_engine = create_async_engine(SQLALCHEMY_ASYNC_DATABASE_URL, poolclass=NullPool)
+TestingAsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
 
 @pytest.fixture(scope="function")
 def db_session():
@@ -36,6 +48,39 @@ def db_session():
         session.close()
 
 
+@pytest.fixture(scope="function")
+def db_tables(db_session):
+    """
+    Fixture que crea las tablas del núcleo de reservas sobre la sesión de tests.
+    Omite 'clients' porque su columna JSONB no existe en SQLite.
+    Vacía availability_cache y tool_cache para que los IDs reutilizados no hereden datos.
+    """
+    availability_cache.clear()
+    tool_cache.clear()
+    tables = [
+        table for name, table in Base.metadata.tables.items()
+        if name != "clients"
+    ]
+    Base.metadata.create_all(bind=engine, tables=tables)
+    yield db_session
+    db_session.rollback()
+    Base.metadata.drop_all(bind=engine, tables=tables)
+    availability_cache.clear()
+    tool_cache.clear()
+
+
+@pytest_asyncio.fixture(scope="function")
+async def async_db(db_tables):
+    """
+    Sesión async sobre la misma base de datos que db_tables.
+    Los datos sembrados con la sesión sync deben estar confirmados (commit)
+    y la sesión sync sin transacción abierta antes de escribir desde aquí.
+    """
+    db_tables.commit()
+    async with TestingAsyncSessionLocal() as session:
+        yield session
+
+
 @pytest.fixture(scope="function")
 def client(db_session):
     """
@@ -48,7 +93,13 @@ def client(db_session):
         finally:
             pass
     
+    async def override_get_async_db():
+        async with TestingAsyncSessionLocal() as session:
+            yield session
+
     app.dependency_overrides[get_db] = override_get_db
+    app.dependency_overrides[get_async_db] = override_get_async_db
+    app.dependency_overrides[get_read_db] = override_get_async_db
     
     # Importar y crear tablas manualmente para el test
     Base.metadata.create_all(bind=engine)
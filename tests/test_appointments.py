@@ -9,6 +9,7 @@ from fastapi.testclient import TestClient
 from app.models.appointments import Appointment, AppointmentStatus
 from app.models.services import Service
 from app.models.collaborators import Collaborator
+from app.core.settings import settings
 
 
 class TestAppointmentsAPI:
@@ -419,3 +420,182 @@ class TestAppointmentsModel:
         repr_str = repr(appointment)
         assert "Carmen Ortiz" in repr_str
         assert "scheduled" in repr_str
+
+
+class TestAppointmentOverlapConstraint:
+    """Tests para la restricción de exclusión que impide solapar citas."""
+
+    def test_postgres_ddl_includes_exclusion(self):
+        """En Postgres la tabla se crea con EXCLUDE USING gist sobre citas activas."""
+        from sqlalchemy.dialects import postgresql
+        from sqlalchemy.schema import CreateTable
+
+        ddl = str(CreateTable(Appointment.__table__).compile(dialect=postgresql.dialect()))
+
+        assert "CONSTRAINT appointments_no_overlap EXCLUDE USING gist" in ddl
+        assert "tstzrange(start_time, end_time, '[)') WITH &&" in ddl
+        assert "WHERE (status IN ('SCHEDULED', 'CONFIRMED', 'IN_PROGRESS'))" in ddl
+
+    def test_sqlite_overlap_still_rejected_in_python(self, db_tables):
+        """Sin la restricción (SQLite) el solape se sigue detectando con la consulta previa."""
+        from app.utils.availability import is_valid_appointment_time
+        from tests.test_availability import book, create_collaborators, create_service
+
+        service = create_service(db_tables)
+        collaborator, = create_collaborators(db_tables, 1)
+        book(db_tables, service, collaborator, datetime(2030, 1, 7, 10, 0), datetime(2030, 1, 7, 11, 0))
+        start, end = datetime(2030, 1, 7, 10, 30), datetime(2030, 1, 7, 11, 30)
+
+        assert is_valid_appointment_time(db_tables, collaborator.id, start, end) == (False, "Horario ya ocupado.")
+        assert is_valid_appointment_time(db_tables, collaborator.id, start, end, check_conflicts=False)[0]
+
+    @pytest.mark.parametrize("orig, expected", [
+        (type("AsyncpgError", (Exception,), {"sqlstate": "23P01"})("conflicting key value"), True),
+        (type("Psycopg2Error", (Exception,), {"pgcode": "23P01"})("conflicting key value"), True),
+        (Exception('violates exclusion constraint "appointments_no_overlap"'), True),
+        (type("AsyncpgError", (Exception,), {"sqlstate": "23505"})("duplicate key value"), False),
+    ])
+    def test_overlap_violation_maps_to_conflict(self, orig, expected):
+        """Solo la violación de appointments_no_overlap se traduce a 409."""
+        from sqlalchemy.exc import IntegrityError
+        from app.api.v1.endpoints.appointments import _is_overlap_violation
+
+        assert _is_overlap_violation(IntegrityError("INSERT INTO appointments ...", {}, orig)) is expected
+
+
+class TestAppointmentsKeysetPagination:
+    """Tests para la paginación por cursor de GET /appointments."""
+
+    @staticmethod
+    def seed(db_tables, count):
+        from tests.test_availability import book, create_collaborators, create_service
+
+        service = create_service(db_tables)
+        collaborator, = create_collaborators(db_tables, 1)
+        # Varias citas comparten start_time para comprobar el desempate por id
+        for index in range(count):
+            start = datetime(2030, 1, 7, 9, 0) + timedelta(minutes=30 * (index // 2))
+            book(db_tables, service, collaborator, start, start + timedelta(minutes=30))
+        db_tables.commit()
+
+    async def list_page(self, db, **params):
+        from fastapi import Response
+        from app.api.v1.endpoints.appointments import get_appointments
+
+        response = Response()
+        query = dict(skip=0, limit=100, cursor=None, collaborator_id=None, service_id=None,
+                     status=None, date_from=None, date_to=None)
+        query.update(params)
+        items = await get_appointments(response=response, db=db, **query)
+        return [item.id for item in items], response.headers.get("X-Next-Cursor")
+
+    @pytest.mark.asyncio
+    async def test_cursor_pages_match_offset_order(self, db_tables, async_db):
+        """Recorrer con cursor devuelve las mismas filas que offset, sin huecos ni repetidos."""
+        self.seed(db_tables, 7)
+        expected, _ = await self.list_page(async_db, limit=100)
+
+        seen, cursor = [], None
+        while True:
+            ids, cursor = await self.list_page(async_db, limit=3, cursor=cursor)
+            seen.extend(ids)
+            if not cursor:
+                break
+
+        assert seen == expected
+        assert len(seen) == 7
+
+    @pytest.mark.asyncio
+    async def test_last_page_has_no_cursor(self, db_tables, async_db):
+        """Con todas las filas en una página no se devuelve X-Next-Cursor."""
+        self.seed(db_tables, 2)
+
+        ids, cursor = await self.list_page(async_db, limit=2)
+
+        assert len(ids) == 2
+        assert cursor is None
+
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize("params", [{"cursor": "no-es-un-cursor"}, {"cursor": "eyJzIjoxfQ", "skip": 5}])
+    async def test_invalid_cursor_is_rejected(self, db_tables, async_db, params):
+        """Un cursor manipulado o combinado con skip devuelve 400."""
+        from fastapi import HTTPException
+
+        with pytest.raises(HTTPException) as exc_info:
+            await self.list_page(async_db, **params)
+
+        assert exc_info.value.status_code == 400
+
+
+class TestAppointmentsSummary:
+    """Tests para el resumen de citas por estado."""
+
+    @pytest.fixture(autouse=True)
+    def clear_summary_cache(self):
+        from app.api.v1.endpoints.appointments import stats_summary_cache
+
+        stats_summary_cache.clear()
+        yield
+        stats_summary_cache.clear()
+
+    @staticmethod
+    def seed(db_tables):
+        from tests.test_availability import book, create_collaborators, create_service
+
+        service = create_service(db_tables)
+        first, second = create_collaborators(db_tables, 2)
+        start = datetime(2030, 1, 7, 9, 0)
+        for collaborator, status in [
+            (first, AppointmentStatus.SCHEDULED), (first, AppointmentStatus.COMPLETED),
+            (first, AppointmentStatus.NO_SHOW), (second, AppointmentStatus.COMPLETED),
+            (second, AppointmentStatus.IN_PROGRESS),
+        ]:
+            book(db_tables, service, collaborator, start, start + timedelta(minutes=30), status=status)
+        db_tables.commit()
+        return service, first, second
+
+    @staticmethod
+    async def summary(db, **params):
+        from app.api.v1.endpoints.appointments import get_appointments_summary
+
+        query = dict(date_from=None, date_to=None, by_collaborator=False, by_service=False)
+        query.update(params)
+        return await get_appointments_summary(db=db, **query)
+
+    @pytest.mark.asyncio
+    async def test_all_statuses_and_breakdowns_in_one_query(self, db_tables, async_db):
+        """Un único SELECT devuelve todos los estados y ambos desgloses."""
+        from tests.test_availability import count_queries
+
+        service, first, second = self.seed(db_tables)
+
+        with count_queries(async_db) as statements:
+            summary = await self.summary(async_db, by_collaborator=True, by_service=True)
+
+        assert len(statements) == 1
+        assert summary["total_appointments"] == 5
+        assert summary["in_progress"] == summary["no_show"] == summary["scheduled"] == 1
+        assert summary["completed"] == 2 and summary["cancelled"] == summary["confirmed"] == 0
+        assert summary["completion_rate"] == 40.0
+        assert [(row["collaborator_id"], row["total_appointments"], row["completed"])
+                for row in summary["by_collaborator"]] == [(first.id, 3, 1), (second.id, 2, 1)]
+        assert [(row["service_id"], row["total_appointments"]) for row in summary["by_service"]] == [(service.id, 5)]
+
+    @pytest.mark.asyncio
+    async def test_cache_serves_repeated_polls(self, db_tables, async_db, monkeypatch):
+        """Dentro del TTL la segunda consulta no toca la base de datos; con TTL 0 siempre consulta."""
+        from tests.test_availability import count_queries
+
+        self.seed(db_tables)
+
+        with count_queries(async_db) as statements:
+            first = await self.summary(async_db)
+            second = await self.summary(async_db)
+        assert first == second
+        assert len(statements) == 1
+
+        monkeypatch.setattr(settings, "STATS_SUMMARY_CACHE_TTL_SECONDS", 0)
+        with count_queries(async_db) as statements:
+            await self.summary(async_db)
+            await self.summary(async_db)
+        assert len(statements) == 2
@@ -0,0 +1,375 @@
+"""
+Tests para las utilidades de disponibilidad.
+Cubre el cálculo de huecos libres y el número de consultas que emite.
+"""
+
+import time as time_module
+from contextlib import contextmanager
+from datetime import datetime, time, timedelta
+
+import pytest
+from fastapi import HTTPException, Response
+from sqlalchemy import event
+
+from app.api.v1.endpoints.appointments import delete_appointment
+from app.api.v1.endpoints.availability import read_availability_range
+
+from app.models.appointments import Appointment, AppointmentStatus
+from app.models.business_hours import BusinessHours, TimeSlot
+from app.models.collaborators import Collaborator
+from app.models.services import Service
+from app.core.settings import settings
+from app.db.routing import READ_YOUR_WRITES_SESSION, REPLICA_SESSION
+from app.utils.availability import (
+    availability_cache, find_available_collaborator, find_available_collaborators,
+    get_available_slots, get_available_slots_range, invalidate_availability,
+    invalidate_collaborator_availability
+)
+
+# Lunes lejano en el futuro para no depender de la fecha actual
+TARGET_DATE = datetime(2030, 1, 7)
+
+
+@contextmanager
+def count_queries(db_session):
+    """Cuenta las sentencias SQL emitidas por la sesión dentro del bloque."""
+    statements = []
+    bind = db_session.get_bind()
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(bind, "before_cursor_execute", before_cursor_execute)
+    try:
+        yield statements
+    finally:
+        event.remove(bind, "before_cursor_execute", before_cursor_execute)
+
+
+def create_service(db_session, duration_minutes=30):
+    service = Service(name="Corte", duration_minutes=duration_minutes, price=15.0)
+    db_session.add(service)
+    db_session.commit()
+    return service
+
+
+def create_collaborators(db_session, count, day_of_week=TARGET_DATE.weekday()):
+    """Crea colaboradores con turno partido y una cita a media mañana."""
+    collaborators = []
+    for index in range(count):
+        collaborator = Collaborator(name=f"Profesional {index}", email=f"p{index}@example.com")
+        db_session.add(collaborator)
+        db_session.flush()
+
+        schedule = BusinessHours(
+            day_of_week=day_of_week,
+            day_name="Lunes",
+            is_enabled=True,
+            is_split_shift=True,
+            collaborator_id=collaborator.id
+        )
+        db_session.add(schedule)
+        db_session.flush()
+        db_session.add_all([
+            TimeSlot(start_time=time(9, 0), end_time=time(13, 0), slot_order=1, business_hours_id=schedule.id),
+            TimeSlot(start_time=time(15, 0), end_time=time(19, 0), slot_order=2, business_hours_id=schedule.id),
+        ])
+        collaborators.append(collaborator)
+    db_session.commit()
+    return collaborators
+
+
+def book(db_session, service, collaborator, start, end, status=AppointmentStatus.SCHEDULED):
+    appointment = Appointment(
+        service_id=service.id,
+        collaborator_id=collaborator.id,
+        client_name="Cliente",
+        start_time=start,
+        end_time=end,
+        status=status
+    )
+    db_session.add(appointment)
+    db_session.commit()
+    return appointment
+
+
+class TestGetAvailableSlots:
+    """Tests para get_available_slots."""
+
+    def test_slots_skip_booked_ranges(self, db_tables):
+        """Los huecos no se solapan con citas activas del colaborador."""
+        service = create_service(db_tables)
+        collaborator, = create_collaborators(db_tables, 1)
+        book(db_tables, service, collaborator, datetime(2030, 1, 7, 10, 0), datetime(2030, 1, 7, 11, 0))
+
+        slots = get_available_slots(db_tables, TARGET_DATE, service.id)
+
+        starts = [slot["start_time"] for slot in slots]
+        assert datetime(2030, 1, 7, 9, 30) in starts
+        assert datetime(2030, 1, 7, 9, 45) not in starts
+        assert datetime(2030, 1, 7, 10, 30) not in starts
+        assert datetime(2030, 1, 7, 11, 0) in starts
+        assert starts == sorted(starts)
+        assert all(slot["collaborator_id"] == collaborator.id for slot in slots)
+
+    def test_cancelled_appointments_do_not_block(self, db_tables):
+        """Las citas canceladas no ocupan la agenda."""
+        service = create_service(db_tables)
+        collaborator, = create_collaborators(db_tables, 1)
+        book(
+            db_tables, service, collaborator,
+            datetime(2030, 1, 7, 10, 0), datetime(2030, 1, 7, 11, 0),
+            status=AppointmentStatus.CANCELLED
+        )
+
+        starts = [slot["start_time"] for slot in get_available_slots(db_tables, TARGET_DATE, service.id)]
+
+        assert datetime(2030, 1, 7, 10, 0) in starts
+
+    def test_filter_by_collaborator(self, db_tables):
+        """Con collaborator_id solo se devuelven los huecos de ese profesional."""
+        service = create_service(db_tables)
+        first, second = create_collaborators(db_tables, 2)
+
+        slots = get_available_slots(db_tables, TARGET_DATE, service.id, collaborator_id=second.id)
+
+        assert slots
+        assert {slot["collaborator_id"] for slot in slots} == {second.id}
+
+    @pytest.mark.parametrize("collaborators_count", [1, 5, 25])
+    def test_query_count_is_constant(self, db_tables, collaborators_count):
+        """El número de consultas no crece con el número de colaboradores."""
+        service = create_service(db_tables)
+        collaborators = create_collaborators(db_tables, collaborators_count)
+        for collaborator in collaborators:
+            book(db_tables, service, collaborator, datetime(2030, 1, 7, 10, 0), datetime(2030, 1, 7, 10, 30))
+        service_id = service.id
+        collaborator_ids = {collaborator.id for collaborator in collaborators}
+        db_tables.expire_all()
+
+        with count_queries(db_tables) as statements:
+            slots = get_available_slots(db_tables, TARGET_DATE, service_id)
+
+        assert {slot["collaborator_id"] for slot in slots} == collaborator_ids
+        # Servicio + horarios con colaborador + time_slots + citas del día
+        assert len(statements) == 4
+
+
+class TestGetAvailableSlotsRange:
+    """Tests para get_available_slots_range y su endpoint."""
+
+    def test_range_matches_single_day_calls(self, db_tables):
+        """Cada día del rango coincide con la consulta de un solo día."""
+        service = create_service(db_tables)
+        collaborators = create_collaborators(db_tables, 2)
+        book(db_tables, service, collaborators[0], datetime(2030, 1, 7, 10, 0), datetime(2030, 1, 7, 11, 0))
+        book(db_tables, service, collaborators[1], datetime(2030, 1, 14, 16, 0), datetime(2030, 1, 14, 17, 0))
+
+        date_to = TARGET_DATE + timedelta(days=13)
+        slots_by_day = get_available_slots_range(db_tables, TARGET_DATE, date_to, service.id)
+
+        assert len(slots_by_day) == 14
+        for day, slots in slots_by_day.items():
+            target = datetime.combine(day, time.min)
+            assert slots == get_available_slots(db_tables, target, service.id)
+        # Solo los lunes tienen horario configurado
+        assert {day.weekday() for day, slots in slots_by_day.items() if slots} == {0}
+
+    def test_range_query_count_is_constant(self, db_tables):
+        """Dos semanas cuestan las mismas consultas que un solo día."""
+        service = create_service(db_tables)
+        create_collaborators(db_tables, 3)
+        service_id = service.id
+        db_tables.expire_all()
+
+        with count_queries(db_tables) as statements:
+            get_available_slots_range(db_tables, TARGET_DATE, TARGET_DATE + timedelta(days=13), service_id)
+
+        assert len(statements) == 4
+
+    @pytest.mark.asyncio
+    async def test_range_endpoint_groups_by_day(self, db_tables, async_db):
+        """El endpoint devuelve un bloque por día y el total agregado."""
+        service = create_service(db_tables)
+        create_collaborators(db_tables, 1)
+        db_tables.commit()
+
+        response = await read_availability_range(
+            db=async_db,
+            date_from="2030-01-07",
+            date_to="2030-01-09",
+            service_id=service.id,
+            collaborator_id=None
+        )
+
+        assert [day["date"] for day in response["days"]] == ["2030-01-07", "2030-01-08", "2030-01-09"]
+        assert response["total_slots"] == response["days"][0]["total_slots"] > 0
+
+    @pytest.mark.asyncio
+    async def test_range_endpoint_rejects_inverted_range(self, db_tables, async_db):
+        """date_to anterior a date_from devuelve 400."""
+        service = create_service(db_tables)
+        db_tables.commit()
+
+        with pytest.raises(HTTPException) as exc_info:
+            await read_availability_range(
+                db=async_db,
+                date_from="2030-01-09",
+                date_to="2030-01-07",
+                service_id=service.id,
+                collaborator_id=None
+            )
+
+        assert exc_info.value.status_code == 400
+
+
+class TestFindAvailableCollaborators:
+    """Tests para la búsqueda de colaboradores libres en una sola consulta."""
+
+    def test_excludes_conflicts_and_out_of_hours(self, db_tables):
+        """Solo aparecen profesionales con turno que cubre el rango y sin solapes."""
+        service = create_service(db_tables)
+        free, busy, off_day = create_collaborators(db_tables, 3)
+        book(db_tables, service, busy, datetime(2030, 1, 7, 10, 15), datetime(2030, 1, 7, 10, 45))
+        db_tables.query(BusinessHours).filter(BusinessHours.collaborator_id == off_day.id).update(
+            {"is_enabled": False}
+        )
+        db_tables.commit()
+
+        start, end = datetime(2030, 1, 7, 10, 0), datetime(2030, 1, 7, 11, 0)
+
+        assert find_available_collaborators(db_tables, start, end, service.id) == [free.id]
+        # 12:30-13:30 sale del turno de mañana
+        assert find_available_collaborators(
+            db_tables, datetime(2030, 1, 7, 12, 30), datetime(2030, 1, 7, 13, 30), service.id
+        ) == []
+
+    def test_least_booked_ordering(self, db_tables):
+        """least_booked prioriza al profesional con menos citas ese día."""
+        service = create_service(db_tables)
+        first, second = create_collaborators(db_tables, 2)
+        book(db_tables, service, first, datetime(2030, 1, 7, 9, 0), datetime(2030, 1, 7, 9, 30))
+        start, end = datetime(2030, 1, 7, 16, 0), datetime(2030, 1, 7, 16, 30)
+
+        assert find_available_collaborator(db_tables, start, end, service.id) == first.id
+        assert find_available_collaborator(db_tables, start, end, service.id, order_by="least_booked") == second.id
+
+    def test_single_query(self, db_tables):
+        """La búsqueda emite una única sentencia SQL sin importar el equipo."""
+        service = create_service(db_tables)
+        create_collaborators(db_tables, 10)
+        service_id = service.id
+        db_tables.expire_all()
+
+        with count_queries(db_tables) as statements:
+            candidates = find_available_collaborators(
+                db_tables, datetime(2030, 1, 7, 10, 0), datetime(2030, 1, 7, 10, 30), service_id,
+                order_by="least_booked"
+            )
+
+        assert len(candidates) == 10
+        assert len(statements) == 1
+
+    def test_unknown_ordering(self, db_tables):
+        """Una estrategia de orden desconocida es un error de programación."""
+        with pytest.raises(ValueError):
+            find_available_collaborators(
+                db_tables, datetime(2030, 1, 7, 10, 0), datetime(2030, 1, 7, 10, 30), 1, order_by="random"
+            )
+
+
+class TestAvailabilityCache:
+    """Tests de la caché de intervalos libres por (colaborador, fecha)."""
+
+    def test_second_read_skips_appointments_query(self, db_tables):
+        """Con la caché caliente no se consultan las citas."""
+        service = create_service(db_tables)
+        create_collaborators(db_tables, 3)
+        service_id = service.id
+
+        expected = get_available_slots(db_tables, TARGET_DATE, service_id)
+        db_tables.expire_all()
+        with count_queries(db_tables) as statements:
+            cached = get_available_slots(db_tables, TARGET_DATE, service_id)
+
+        assert cached == expected
+        assert not any("FROM appointments" in statement for statement in statements)
+        assert availability_cache.stats()["hits"] == 3
+
+    def test_cached_intervals_serve_other_services(self, db_tables):
+        """Los intervalos no dependen de la duración: otro servicio reutiliza la caché."""
+        short_service = create_service(db_tables, duration_minutes=15)
+        long_service = create_service(db_tables, duration_minutes=120)
+        create_collaborators(db_tables, 1)
+
+        get_available_slots(db_tables, TARGET_DATE, short_service.id)
+        slots = get_available_slots(db_tables, TARGET_DATE, long_service.id)
+
+        assert availability_cache.stats()["hits"] == 1
+        assert {(slot["end_time"] - slot["start_time"]).seconds for slot in slots} == {7200}
+
+    def test_invalidation_after_booking(self, db_tables):
+        """Una cita nueva invalida solo el día y colaborador afectados."""
+        service = create_service(db_tables)
+        first, second = create_collaborators(db_tables, 2)
+        get_available_slots(db_tables, TARGET_DATE, service.id)
+
+        book(db_tables, service, first, datetime(2030, 1, 7, 10, 0), datetime(2030, 1, 7, 11, 0))
+        assert invalidate_availability(first.id, datetime(2030, 1, 7, 10, 0), datetime(2030, 1, 7, 11, 0)) == 1
+
+        starts = {
+            (slot["collaborator_id"], slot["start_time"])
+            for slot in get_available_slots(db_tables, TARGET_DATE, service.id)
+        }
+        assert (first.id, datetime(2030, 1, 7, 10, 0)) not in starts
+        assert (second.id, datetime(2030, 1, 7, 10, 0)) in starts
+
+    @pytest.mark.asyncio
+    async def test_cancel_endpoint_invalidates(self, db_tables, async_db):
+        """Cancelar una cita por el endpoint libera el hueco en la siguiente lectura."""
+        service = create_service(db_tables)
+        collaborator, = create_collaborators(db_tables, 1)
+        appointment = book(db_tables, service, collaborator, datetime(2030, 1, 7, 10, 0), datetime(2030, 1, 7, 11, 0))
+        get_available_slots(db_tables, TARGET_DATE, service.id)
+        db_tables.commit()
+
+        await delete_appointment(appointment.id, response=Response(), hard_delete=False, db=async_db)
+
+        starts = [slot["start_time"] for slot in get_available_slots(db_tables, TARGET_DATE, service.id)]
+        assert datetime(2030, 1, 7, 10, 0) in starts
+
+    def test_schedule_change_invalidates_weekday(self, db_tables):
+        """Cambiar el horario de un día invalida todas las fechas de ese día de la semana."""
+        service = create_service(db_tables)
+        collaborator, = create_collaborators(db_tables, 1)
+        get_available_slots_range(db_tables, TARGET_DATE, TARGET_DATE + timedelta(days=13), service.id)
+        assert len(availability_cache) == 2
+
+        assert invalidate_collaborator_availability(collaborator.id, day_of_week=TARGET_DATE.weekday()) == 2
+        assert invalidate_collaborator_availability(collaborator.id, day_of_week=1) == 0
+
+    def test_read_your_writes_session_skips_cache(self, db_tables):
+        """Tras escribir, el cliente lee de la principal sin pasar por la caché."""
+        service = create_service(db_tables)
+        create_collaborators(db_tables, 1)
+        get_available_slots(db_tables, TARGET_DATE, service.id)
+
+        db_tables.info[READ_YOUR_WRITES_SESSION] = True
+        with count_queries(db_tables) as statements:
+            get_available_slots(db_tables, TARGET_DATE, service.id)
+
+        assert any("FROM appointments" in statement for statement in statements)
+        assert availability_cache.stats()["hits"] == 0
+
+    def test_replica_entries_expire_with_lag_window(self, db_tables, monkeypatch):
+        """Lo calculado sobre la réplica caduca a los READ_YOUR_WRITES_SECONDS."""
+        monkeypatch.setattr(settings, "READ_YOUR_WRITES_SECONDS", 0.001)
+        service = create_service(db_tables)
+        create_collaborators(db_tables, 1)
+
+        db_tables.info[REPLICA_SESSION] = True
+        get_available_slots(db_tables, TARGET_DATE, service.id)
+        time_module.sleep(0.01)
+        get_available_slots(db_tables, TARGET_DATE, service.id)
+
+        assert availability_cache.stats()["hits"] == 0
@@ -0,0 +1,72 @@
+"""
+Tests para la caché en memoria TTLCache.
+"""
+
+from app.utils.cache import MISSING, TTLCache
+
+
+class FakeClock:
+    """Reloj manual para controlar la caducidad en los tests."""
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestTTLCache:
+    """Tests de LRU, TTL, invalidación y contadores."""
+
+    def test_hits_and_misses(self):
+        """Un None guardado cuenta como acierto, no como fallo."""
+        cache = TTLCache(maxsize=10, ttl=60)
+
+        assert cache.get("a") is MISSING
+        cache.set("a", None)
+
+        assert cache.get("a") is None
+        assert cache.stats()["hits"] == 1
+        assert cache.stats()["misses"] == 1
+
+    def test_entries_expire(self):
+        """Las entradas dejan de servirse al cumplir su TTL."""
+        clock = FakeClock()
+        cache = TTLCache(maxsize=10, ttl=5, clock=clock)
+        cache.set("a", 1)
+
+        clock.now = 4.9
+        assert cache.get("a") == 1
+        clock.now = 5.0
+        assert cache.get("a") is MISSING
+        assert len(cache) == 0
+
+    def test_least_recently_used_is_evicted(self):
+        """Al superar maxsize se expulsa la entrada menos usada."""
+        cache = TTLCache(maxsize=2, ttl=60)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        cache.get("a")
+        cache.set("c", 3)
+
+        assert cache.get("b") is MISSING
+        assert cache.get("a") == 1
+        assert cache.stats()["evictions"] == 1
+
+    def test_invalidate_where(self):
+        """Se pueden invalidar grupos de claves con un predicado."""
+        cache = TTLCache(maxsize=10, ttl=60)
+        for key in [(1, "lunes"), (1, "martes"), (2, "lunes")]:
+            cache.set(key, True)
+
+        assert cache.invalidate_where(lambda key: key[0] == 1) == 2
+        assert cache.get((2, "lunes")) is True
+
+    def test_stale_generation_is_not_stored(self):
+        """Un valor calculado antes de una invalidación no se guarda."""
+        cache = TTLCache(maxsize=10, ttl=60)
+        generation = cache.generation
+        cache.invalidate("a")
+
+        assert cache.set("a", "viejo", generation=generation) is False
+        assert cache.get("a") is MISSING
@@ -0,0 +1,233 @@
+"""
+Tests para la memoria de conversación del agente de WhatsApp.
+"""
+
+from datetime import date, datetime
+
+import pytest
+
+from app.agents import booking_agent, tools
+from app.agents.conversation import ConversationState, ConversationStore, tool_result_key
+from app.agents.fast_path import AgentMetrics
+from app.models.collaborators import Collaborator
+from app.models.services import Service
+from app.utils.cache import MISSING
+from tests.conftest import TestingSessionLocal
+from app.utils.availability import invalidate_availability
+from tests.test_availability import TARGET_DATE, book, count_queries, create_collaborators
+
+
+class FakeClock:
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+class TestConversationState:
+    """Tests para el estado serializable de una conversación."""
+
+    def test_history_is_bounded(self):
+        state = ConversationState("34600")
+        for index in range(5):
+            state.add_turn(f"pregunta {index}", f"respuesta {index}", max_turns=3)
+
+        assert [turn["user"] for turn in state.turns] == ["pregunta 2", "pregunta 3", "pregunta 4"]
+        assert state.history_messages()[0] == {"role": "user", "content": "pregunta 2"}
+        assert state.history_messages()[-1] == {"role": "assistant", "content": "respuesta 4"}
+
+    def test_round_trip(self):
+        state = ConversationState("34600")
+        state.add_turn("hola", "buenas", max_turns=6)
+        state.remember_query(3, date(2030, 1, 7))
+        state.set_tool_result("k", {"free": ["09:00-10:00"]}, now=10.0)
+
+        restored = ConversationState("34600", state.to_dict())
+
+        assert restored.turns == state.turns
+        assert restored.last_service_id == 3
+        assert restored.last_date == date(2030, 1, 7)
+        assert restored.get_tool_result("k", ttl=5, now=12.0) == {"free": ["09:00-10:00"]}
+        assert restored.get_tool_result("k", ttl=5, now=20.0) is MISSING
+
+
+class TestConversationStore:
+    """Tests para la caché LRU + TTL de conversaciones."""
+
+    def test_resumes_until_ttl(self):
+        clock = FakeClock()
+        store = ConversationStore(ttl=60, clock=clock)
+        state = store.load("34600")
+        state.add_turn("hola", "buenas", store.max_turns)
+        store.save(state)
+
+        clock.now += 30
+        assert store.load("34600").turns == state.turns
+        clock.now += 61
+        assert store.load("34600").turns == []
+        assert store.stats()["resumed"] == 1
+
+    def test_lru_eviction(self):
+        store = ConversationStore(maxsize=2, clock=FakeClock())
+        for phone in ("1", "2", "3"):
+            store.save(ConversationState(phone, {"turns": [{"user": phone, "assistant": "ok"}]}))
+
+        assert store.load("1").turns == []
+        assert store.load("3").turns[0]["user"] == "3"
+
+    def test_tool_results_computed_once_per_ttl(self):
+        clock = FakeClock()
+        store = ConversationStore(tool_result_ttl=120, clock=clock)
+        state = store.load("34600")
+        calls = []
+
+        def compute():
+            calls.append(1)
+            return {"total_slots": len(calls)}
+
+        assert store.remember_tool_result(state, "k", compute) == {"total_slots": 1}
+        assert store.remember_tool_result(state, "k", compute) == {"total_slots": 1}
+        clock.now += 121
+        assert store.remember_tool_result(state, "k", compute) == {"total_slots": 2}
+        assert store.stats()["tool_result_hits"] == 1
+        assert store.remember_tool_result(None, "k", compute) == {"total_slots": 3}
+
+
+class TestSharedConversationStore:
+    """Tests para el backend en base de datos (SQLite en tests, Postgres en producción)."""
+
+    def test_other_worker_resumes_conversation(self, db_tables):
+        clock = FakeClock()
+        first = ConversationStore(session_factory=TestingSessionLocal, clock=clock)
+        state = first.load("34600")
+        state.add_turn("hola", "buenas", first.max_turns)
+        state.remember_query(1, date(2030, 1, 7))
+        first.save(state)
+        state.add_turn("¿y mañana?", "también", first.max_turns)
+        first.save(state)
+
+        # Otro worker: caché local vacía, lee la fila compartida
+        second = ConversationStore(session_factory=TestingSessionLocal, clock=clock)
+        resumed = second.load("34600")
+
+        assert [turn["user"] for turn in resumed.turns] == ["hola", "¿y mañana?"]
+        assert resumed.last_date == date(2030, 1, 7)
+
+    def test_workers_alternate_mid_conversation(self, db_tables):
+        clock = FakeClock()
+        worker_a = ConversationStore(session_factory=TestingSessionLocal, clock=clock)
+        worker_b = ConversationStore(session_factory=TestingSessionLocal, clock=clock)
+
+        # A -> B -> A: A no debe reanudar su copia local sin el turno de B
+        for store, text in ((worker_a, "hola"), (worker_b, "¿y mañana?"), (worker_a, "¿y el lunes?")):
+            clock.now += 1
+            state = store.load("34600")
+            state.add_turn(text, "ok", store.max_turns)
+            store.save(state)
+
+        turns = ConversationStore(session_factory=TestingSessionLocal, clock=clock).load("34600").turns
+        assert [turn["user"] for turn in turns] == ["hola", "¿y mañana?", "¿y el lunes?"]
+
+    def test_expired_and_cleared(self, db_tables):
+        clock = FakeClock()
+        store = ConversationStore(ttl=60, session_factory=TestingSessionLocal, clock=clock)
+        state = store.load("34600")
+        state.add_turn("hola", "buenas", store.max_turns)
+        store.save(state)
+
+        clock.now += 61
+        assert ConversationStore(ttl=60, session_factory=TestingSessionLocal, clock=clock).load("34600").turns == []
+
+        store.clear("34600")
+        clock.now -= 61
+        assert ConversationStore(session_factory=TestingSessionLocal, clock=clock).load("34600").turns == []
+
+
+class TestMultiTurnAgent:
+    """Tests para la continuación de conversaciones en run_booking_agent."""
+
+    @pytest.fixture
+    def agent(self, monkeypatch, db_tables):
+        db_tables.add(Service(name="Corte de pelo", duration_minutes=30, price=15.0))
+        db_tables.commit()
+        create_collaborators(db_tables, 2)
+        llm_calls = []
+
+        def fake_llm(prompt, conversation=None):
+            llm_calls.append((prompt, conversation.history_messages() if conversation else None))
+            return "respuesta del LLM"
+
+        store = ConversationStore()
+        monkeypatch.setattr(booking_agent, "SessionLocal", TestingSessionLocal)
+        monkeypatch.setattr(tools, "SessionLocal", TestingSessionLocal)
+        monkeypatch.setattr(booking_agent, "run_llm_agent", fake_llm)
+        monkeypatch.setattr(booking_agent, "agent_metrics", AgentMetrics())
+        monkeypatch.setattr(booking_agent, "conversation_store", store)
+        return store, llm_calls
+
+    def test_follow_up_reuses_slots_without_llm(self, agent, db_tables):
+        store, llm_calls = agent
+        target = TARGET_DATE.strftime("%d/%m/%Y")
+
+        first = booking_agent.run_booking_agent(f"¿Hay hueco el {target} para corte?", "34600")
+        with count_queries(db_tables) as statements:
+            follow_up = booking_agent.run_booking_agent("¿Y por la tarde?", "34600")
+
+        assert first.startswith("Para Corte de pelo")
+        assert "09:00" in first
+        assert follow_up.startswith("Para Corte de pelo")
+        assert "a las 15:00," in follow_up and "09:00" not in follow_up
+        # Solo el catálogo de servicios: la disponibilidad sale de la conversación
+        assert len(statements) == 1
+        assert llm_calls == []
+        assert store.stats()["tool_result_hits"] == 1
+
+    def test_booking_invalidates_remembered_availability(self, agent, db_tables):
+        store, _ = agent
+        target = TARGET_DATE.strftime("%d/%m/%Y")
+        question = f"¿Hay hueco el {target} para corte?"
+
+        assert "09:00" in booking_agent.run_booking_agent(question, "34600")
+        service = db_tables.query(Service).one()
+        start, end = datetime(2030, 1, 7, 9, 0), datetime(2030, 1, 7, 10, 0)
+        for collaborator in db_tables.query(Collaborator).all():
+            book(db_tables, service, collaborator, start, end)
+            invalidate_availability(collaborator.id, start, end)
+
+        again = booking_agent.run_booking_agent(question, "34600")
+        assert again.startswith("Para Corte de pelo")
+        assert "09:00" not in again and "10:00" in again
+        assert store.stats()["tool_result_hits"] == 0
+
+    def test_llm_receives_history(self, agent):
+        store, llm_calls = agent
+        target = TARGET_DATE.strftime("%d/%m/%Y")
+
+        booking_agent.run_booking_agent(f"¿Hay hueco el {target} para corte?", "34600")
+        assert booking_agent.run_booking_agent("¿Y a las 17:00?", "34600") == "respuesta del LLM"
+
+        prompt, history = llm_calls[0]
+        assert prompt == "¿Y a las 17:00?"
+        assert history[0] == {"role": "user", "content": f"¿Hay hueco el {target} para corte?"}
+        assert len(store.load("34600").turns) == 2
+
+    def test_phones_do_not_share_context(self, agent):
+        _, llm_calls = agent
+        target = TARGET_DATE.strftime("%d/%m/%Y")
+
+        booking_agent.run_booking_agent(f"¿Hay hueco el {target} para corte?", "34600")
+        assert booking_agent.run_booking_agent("¿Y por la tarde?", "34700") == "respuesta del LLM"
+        assert llm_calls == [("¿Y por la tarde?", [])]
+
+    def test_context_messages_include_known_availability(self, agent):
+        store, _ = agent
+        state = store.load("34600")
+        store.set_tool_result(state, tool_result_key(1, TARGET_DATE.date()), {"total_slots": 3})
+        state.add_turn("hola", "buenas", store.max_turns)
+
+        messages = booking_agent.context_messages(state)
+
+        assert messages[0]["role"] == "system"
+        assert 'get_availability:1:2030-01-07: {"total_slots":3}' in messages[0]["content"]
+        assert messages[1:] == [{"role": "user", "content": "hola"}, {"role": "assistant", "content": "buenas"}]
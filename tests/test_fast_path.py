@@ -0,0 +1,159 @@
+"""
+Tests para el atajo por reglas del agente de reservas.
+"""
+
+from datetime import date, datetime
+
+import pytest
+
+from app.agents import booking_agent, tools
+from app.agents.fast_path import AgentMetrics, match_service, normalize, parse_date, try_fast_path
+from app.models.services import Service
+from tests.conftest import TestingSessionLocal
+from tests.test_availability import TARGET_DATE, book, create_collaborators
+
+# Domingo anterior a TARGET_DATE (lunes 2030-01-07): "mañana" es TARGET_DATE
+NOW = datetime(2030, 1, 6, 20, 0)
+TODAY = NOW.date()
+
+
+@pytest.fixture
+def catalog(db_tables):
+    """Dos servicios activos, uno inactivo y un profesional con turno partido el lunes."""
+    corte = Service(name="Corte de pelo", duration_minutes=30, price=15.0)
+    manicura = Service(name="Manicura", duration_minutes=60, price=20.0)
+    tinte = Service(name="Tinte", duration_minutes=90, price=40.0, is_active=False)
+    db_tables.add_all([corte, manicura, tinte])
+    db_tables.commit()
+    collaborator, = create_collaborators(db_tables, 1)
+    return corte, manicura, collaborator
+
+
+class TestParseDate:
+    """Tests para la resolución de expresiones de fecha."""
+
+    @pytest.mark.parametrize("text, expected", [
+        ("hay hueco hoy", date(2030, 1, 6)),
+        ("hay hueco manana", date(2030, 1, 7)),
+        ("hay hueco pasado manana", date(2030, 1, 8)),
+        ("el viernes", date(2030, 1, 11)),
+        ("el domingo", date(2030, 1, 6)),
+        ("el 5 de febrero", date(2030, 2, 5)),
+        ("el 3/1", date(2031, 1, 3)),
+        ("el 10/01/2030", date(2030, 1, 10)),
+        ("el 2030-01-09", date(2030, 1, 9)),
+    ])
+    def test_expressions(self, text, expected):
+        assert parse_date(text, TODAY) == expected
+
+    @pytest.mark.parametrize("text", [
+        "hay hueco",
+        "hoy o manana",
+        "el 31/02",
+    ])
+    def test_missing_or_ambiguous(self, text):
+        assert parse_date(text, TODAY) is None
+
+
+class TestMatchService:
+    """Tests para la identificación del servicio."""
+
+    def test_full_and_partial_name(self):
+        services = [Service(id=1, name="Corte de pelo"), Service(id=2, name="Manicura")]
+        assert match_service(normalize("¿Tenéis corte de pelo?"), services).id == 1
+        assert match_service(normalize("hueco para cortes"), services).id == 1
+        assert match_service(normalize("una manicura"), services).id == 2
+
+    def test_ambiguous_or_unknown(self):
+        services = [Service(id=1, name="Corte de pelo"), Service(id=2, name="Corte de barba")]
+        assert match_service(normalize("un corte"), services) is None
+        assert match_service(normalize("un masaje"), services) is None
+
+
+class TestTryFastPath:
+    """Tests para la respuesta por reglas contra la base de datos."""
+
+    def test_answers_availability_question(self, db_tables, catalog):
+        corte, _, collaborator = catalog
+        book(db_tables, corte, collaborator, datetime(2030, 1, 7, 9, 0), datetime(2030, 1, 7, 12, 0))
+
+        reply, reason = try_fast_path(db_tables, "¿Hay hueco mañana para corte?", now=NOW, max_times=3)
+
+        assert reason == "hit"
+        assert reply.startswith("Para Corte de pelo mañana tenemos hueco a las 12:00, 12:15, 12:30")
+        assert "más" in reply
+
+    def test_period_filter(self, db_tables, catalog):
+        reply, reason = try_fast_path(db_tables, "¿Hay hueco el lunes por la tarde para manicura?", now=NOW)
+
+        assert reason == "hit"
+        assert "a las 15:00," in reply
+        assert "09:00" not in reply
+
+    def test_no_slots_left(self, db_tables, catalog):
+        corte, _, collaborator = catalog
+        book(db_tables, corte, collaborator, datetime(2030, 1, 7, 9, 0), datetime(2030, 1, 7, 13, 0))
+        book(db_tables, corte, collaborator, datetime(2030, 1, 7, 15, 0), datetime(2030, 1, 7, 19, 0))
+
+        reply, reason = try_fast_path(db_tables, "hay cita mañana para corte", now=NOW)
+
+        assert reason == "hit"
+        assert reply.startswith("Lo siento, no quedan huecos para Corte de pelo mañana")
+
+    @pytest.mark.parametrize("prompt, reason", [
+        ("Hola, buenas tardes", "no_intent"),
+        ("Quiero cancelar mi cita de mañana", "unsupported_intent"),
+        ("¿Hay hueco para corte?", "no_date"),
+        ("¿Hay hueco mañana?", "no_service"),
+        ("¿Hay hueco mañana para tinte?", "no_service"),
+        ("¿Hay hueco el 01/01/2030 para corte?", "past_date"),
+        ("¿Hay hueco mañana para corte? " + "x" * 200, "too_long"),
+    ])
+    def test_falls_back_when_unsure(self, db_tables, catalog, prompt, reason):
+        assert try_fast_path(db_tables, prompt, now=NOW) == (None, reason)
+
+
+class TestRunBookingAgent:
+    """Tests para el reparto entre atajo y LLM con sus métricas."""
+
+    @pytest.fixture
+    def agent(self, monkeypatch, catalog):
+        llm_calls = []
+
+        def fake_llm(prompt, conversation=None):
+            llm_calls.append(prompt)
+            return "respuesta del LLM"
+
+        monkeypatch.setattr(booking_agent, "SessionLocal", TestingSessionLocal)
+        monkeypatch.setattr(tools, "SessionLocal", TestingSessionLocal)
+        monkeypatch.setattr(booking_agent, "run_llm_agent", fake_llm)
+        monkeypatch.setattr(booking_agent, "agent_metrics", AgentMetrics())
+        return llm_calls
+
+    def test_fast_path_skips_llm(self, agent):
+        target = TARGET_DATE.strftime("%d/%m/%Y")
+        reply = booking_agent.run_booking_agent(f"¿Hay hueco el {target} para corte?")
+
+        assert reply.startswith("Para Corte de pelo")
+        assert agent == []
+
+    def test_fallback_and_metrics(self, agent):
+        target = TARGET_DATE.strftime("%d/%m/%Y")
+        booking_agent.run_booking_agent(f"¿Hay hueco el {target} para corte?")
+        assert booking_agent.run_booking_agent("Quiero cambiar mi cita") == "respuesta del LLM"
+
+        stats = booking_agent.agent_metrics.stats()
+        assert agent == ["Quiero cambiar mi cita"]
+        assert stats["requests"] == 2
+        assert stats["fast_path_hits"] == 1
+        assert stats["fast_path_hit_rate"] == 0.5
+        assert stats["fallback_reasons"] == {"unsupported_intent": 1}
+        assert stats["fast_path"]["count"] == 1
+        assert stats["llm"]["count"] == 1
+
+    def test_disabled(self, agent, monkeypatch):
+        monkeypatch.setattr(booking_agent.settings, "AGENT_FAST_PATH_ENABLED", False)
+        target = TARGET_DATE.strftime("%d/%m/%Y")
+
+        assert booking_agent.run_booking_agent(f"¿Hay hueco el {target} para corte?") == "respuesta del LLM"
+        assert booking_agent.agent_metrics.stats()["fallback_reasons"] == {"disabled": 1}
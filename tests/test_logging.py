@@ -0,0 +1,144 @@
+"""
+Tests para el logging estructurado: formato JSON, cola sin bloqueo,
+niveles por módulo y propagación del request_id.
+"""
+
+import asyncio
+import io
+import json
+import logging
+import queue
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.agents import booking_agent
+from app.core.logging_config import (
+    JsonFormatter, RequestIdMiddleware, StructuredQueueHandler, bind_request_id, get_request_id,
+    parse_levels, setup_logging, stop_logging
+)
+from app.utils.worker_pool import BoundedWorkerPool
+from tests.test_tools import tool_call
+
+
+@pytest.fixture
+def log_output():
+    """Logging configurado como en la app, escribiendo en un buffer; devuelve las líneas JSON."""
+    stream = io.StringIO()
+    root_level = logging.getLogger().level
+    setup_logging(level="INFO", levels="tests.ruidoso=ERROR", stream=stream)
+
+    def lines():
+        stop_logging()
+        return [json.loads(line) for line in stream.getvalue().splitlines()]
+
+    yield lines
+    stop_logging()
+    logging.getLogger().setLevel(root_level)
+    logging.getLogger("tests.ruidoso").setLevel(logging.NOTSET)
+
+
+class TestStructuredLogging:
+    """Tests para el pipeline QueueHandler -> QueueListener -> JSON."""
+
+    def test_json_lines_with_request_id_and_extra(self, log_output):
+        logger = logging.getLogger("tests.logging")
+        with bind_request_id("req-1"):
+            logger.info("Mensaje recibido de %s", "34600", extra={"message_id": "wamid.1"})
+        logger.debug("no sale: la raíz está en INFO")
+
+        entry, = log_output()
+        assert entry["message"] == "Mensaje recibido de 34600"
+        assert entry["level"] == "INFO"
+        assert entry["logger"] == "tests.logging"
+        assert entry["request_id"] == "req-1"
+        assert entry["message_id"] == "wamid.1"
+
+    def test_exception_is_kept_apart(self, log_output):
+        try:
+            raise ValueError("fallo")
+        except ValueError:
+            logging.getLogger("tests.logging").exception("Error crítico")
+
+        entry, = log_output()
+        assert entry["message"] == "Error crítico"
+        assert "ValueError: fallo" in entry["exc"]
+
+    def test_per_module_levels(self, log_output):
+        logging.getLogger("tests.ruidoso").warning("silenciado")
+        logging.getLogger("tests.ruidoso").error("visible")
+
+        assert [entry["message"] for entry in log_output()] == ["visible"]
+
+    def test_full_queue_drops_instead_of_blocking(self):
+        handler = StructuredQueueHandler(queue.Queue(maxsize=1))
+        record = logging.makeLogRecord({"msg": "x"})
+        handler.emit(record)
+        handler.emit(record)
+
+        assert handler.dropped == 1
+
+    def test_parse_levels(self):
+        assert parse_levels(" app.db=debug, httpx=WARNING ,") == {"app.db": "DEBUG", "httpx": "WARNING"}
+        with pytest.raises(ValueError):
+            parse_levels("app.db")
+
+    def test_formatter_without_context(self):
+        record = logging.makeLogRecord({"name": "x", "msg": "hola", "levelname": "INFO"})
+        assert json.loads(JsonFormatter().format(record))["request_id"] is None
+
+
+class TestRequestIdPropagation:
+    """Tests para la correlación por request_id."""
+
+    def test_middleware_generates_or_reuses_header(self):
+        app = FastAPI()
+        app.add_middleware(RequestIdMiddleware)
+
+        @app.get("/sync")
+        def sync_endpoint():
+            return {"request_id": get_request_id()}
+
+        client = TestClient(app)
+        response = client.get("/sync", headers={"X-Request-ID": "abc-123"})
+        assert response.headers["x-request-id"] == "abc-123"
+        assert response.json()["request_id"] == "abc-123"
+
+        generated = client.get("/sync", headers={"X-Request-ID": "id con espacios"})
+        assert generated.headers["x-request-id"] == generated.json()["request_id"]
+        assert len(generated.headers["x-request-id"]) == 32
+
+    def test_pool_jobs_keep_submitter_request_id(self):
+        seen = []
+
+        async def job():
+            seen.append(get_request_id())
+
+        async def scenario():
+            pool = BoundedWorkerPool("test", workers=1)
+            await pool.start()
+            with bind_request_id("webhook-1"):
+                pool.submit(job)
+            with bind_request_id("webhook-2"):
+                pool.submit(job)
+            await pool.join()
+            await pool.stop()
+
+        asyncio.run(scenario())
+        assert seen == ["webhook-1", "webhook-2"]
+
+    def test_parallel_tool_calls_keep_request_id(self, monkeypatch):
+        seen = []
+
+        def fake_execute(call, conversation=None):
+            seen.append(get_request_id())
+            return "{}", None
+
+        monkeypatch.setattr(booking_agent, "execute_tool_call", fake_execute)
+        calls = [tool_call(str(day), 1, f"2030-01-0{day}") for day in (7, 8, 9)]
+
+        with bind_request_id("req-agent"):
+            booking_agent.run_tool_calls(calls)
+
+        assert seen == ["req-agent"] * 3
@@ -0,0 +1,173 @@
+"""
+Tests para el cliente compartido de la Cloud API de Meta, contra un Meta falso local.
+"""
+
+import httpx
+import pytest
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+from app.agents.meta_client import build_meta_client
+
+
+def fake_meta(failures=0, status_code=503, headers=None):
+    """App ASGI que imita POST /{version}/{phone_number_id}/messages y falla las primeras `failures` veces."""
+    app = FastAPI()
+    app.state.requests = []
+
+    @app.post("/{version}/{phone_number_id}/messages")
+    async def messages(version: str, phone_number_id: str, request: Request):
+        app.state.requests.append({
+            "phone_number_id": phone_number_id,
+            "authorization": request.headers.get("authorization"),
+            "body": await request.json(),
+        })
+        if len(app.state.requests) <= failures:
+            return JSONResponse({"error": {"message": "falla simulada"}}, status_code=status_code, headers=headers)
+        return {"messages": [{"id": f"wamid.{len(app.state.requests)}"}]}
+
+    return app
+
+
+def make_client(app, **overrides):
+    options = dict(
+        base_url="http://meta.test/v22.0",
+        token="token-test",
+        phone_number_id="123",
+        retries=2,
+        backoff=0,
+        transport=httpx.ASGITransport(app=app),
+    )
+    options.update(overrides)
+    return build_meta_client(**options)
+
+
+class TestMetaClient:
+    """Tests del envío de mensajes con reintentos."""
+
+    @pytest.mark.asyncio
+    async def test_send_text_reuses_client(self):
+        """Los envíos comparten un único AsyncClient y llevan el token de Meta."""
+        app = fake_meta()
+        meta = make_client(app)
+
+        await meta.send_text("34600111222", "Hola")
+        shared = meta.client
+        await meta.send_text("34600111222", "Adiós")
+        assert meta.client is shared
+        await meta.aclose()
+
+        assert shared.is_closed
+        assert [r["body"]["text"]["body"] for r in app.state.requests] == ["Hola", "Adiós"]
+        assert app.state.requests[0]["authorization"] == "Bearer token-test"
+        assert app.state.requests[0]["phone_number_id"] == "123"
+        assert meta.stats()["sent"] == 2
+
+    @pytest.mark.asyncio
+    async def test_retries_transient_errors(self):
+        """Un 503 se reintenta y el mensaje acaba enviado."""
+        app = fake_meta(failures=2)
+        meta = make_client(app)
+
+        response = await meta.send_text("34600111222", "Hola")
+
+        assert response.status_code == 200
+        assert len(app.state.requests) == 3
+        assert meta.stats()["retried"] == 2
+
+    @pytest.mark.asyncio
+    async def test_gives_up_after_retries(self):
+        app = fake_meta(failures=10)
+        meta = make_client(app)
+
+        response = await meta.send_text("34600111222", "Hola")
+
+        assert response.status_code == 503
+        assert len(app.state.requests) == 3
+        assert meta.stats()["failed"] == 1
+
+    @pytest.mark.asyncio
+    async def test_client_errors_are_not_retried(self):
+        """Un 400 (p. ej. número inválido) no mejora reintentando."""
+        app = fake_meta(failures=1, status_code=400)
+        meta = make_client(app)
+
+        response = await meta.send_text("invalido", "Hola")
+
+        assert response.status_code == 400
+        assert len(app.state.requests) == 1
+
+    @pytest.mark.asyncio
+    async def test_network_errors_are_retried(self):
+        """Un fallo de conexión se reintenta sobre el mismo cliente."""
+        app = fake_meta()
+        asgi = httpx.ASGITransport(app=app)
+        attempts = []
+
+        class FlakyTransport(httpx.AsyncBaseTransport):
+            async def handle_async_request(self, request):
+                attempts.append(request)
+                if len(attempts) == 1:
+                    raise httpx.ConnectError("conexión rechazada", request=request)
+                return await asgi.handle_async_request(request)
+
+        meta = make_client(app, transport=FlakyTransport())
+
+        response = await meta.send_text("34600111222", "Hola")
+
+        assert response.status_code == 200
+        assert len(attempts) == 2
+
+    @pytest.mark.asyncio
+    async def test_read_timeouts_are_not_retried(self):
+        """Meta pudo recibir el POST: reenviarlo duplicaría la respuesta al cliente."""
+        attempts = []
+
+        class SlowTransport(httpx.AsyncBaseTransport):
+            async def handle_async_request(self, request):
+                attempts.append(request)
+                raise httpx.ReadTimeout("sin respuesta", request=request)
+
+        meta = make_client(fake_meta(), transport=SlowTransport())
+
+        with pytest.raises(httpx.ReadTimeout):
+            await meta.send_text("34600111222", "Hola")
+        assert len(attempts) == 1
+        assert meta.stats()["failed"] == 1
+
+    @pytest.mark.asyncio
+    async def test_short_retry_after_is_respected(self, monkeypatch):
+        app = fake_meta(failures=1, status_code=429, headers={"Retry-After": "2"})
+        meta = make_client(app, max_backoff=5)
+        delays = []
+
+        async def fake_sleep(seconds):
+            delays.append(seconds)
+
+        monkeypatch.setattr("app.agents.meta_client.asyncio.sleep", fake_sleep)
+        response = await meta.send_text("34600111222", "Hola")
+
+        assert response.status_code == 200
+        assert delays == [2.0]
+
+    @pytest.mark.asyncio
+    async def test_long_retry_after_gives_up(self, monkeypatch):
+        """Un Retry-After por encima de max_backoff no bloquea al worker: se desiste."""
+        app = fake_meta(failures=10, status_code=429, headers={"Retry-After": "3600"})
+        meta = make_client(app, max_backoff=5)
+        delays = []
+
+        async def fake_sleep(seconds):
+            delays.append(seconds)
+
+        monkeypatch.setattr("app.agents.meta_client.asyncio.sleep", fake_sleep)
+        response = await meta.send_text("34600111222", "Hola")
+
+        assert response.status_code == 429
+        assert len(app.state.requests) == 1
+        assert delays == []
+        assert meta.stats()["failed"] == 1
+
+    def test_backoff_is_capped(self):
+        meta = make_client(fake_meta(), backoff=1, max_backoff=5)
+        assert all(meta._delay(attempt, None) <= 5 for attempt in range(10))
@@ -0,0 +1,166 @@
+"""
+Tests para las métricas HTTP por ruta y su exposición en formato Prometheus.
+"""
+
+import json
+import time
+
+from fastapi import FastAPI, HTTPException
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.utils.metrics import (
+    UNMATCHED_ROUTE, MetricsMiddleware, MultiprocessMetrics, RequestMetrics, merge_snapshots, render_prometheus
+)
+
+
+def instrumented_app(registry):
+    app = FastAPI()
+    app.add_middleware(MetricsMiddleware, registry=registry)
+
+    @app.get("/items/{item_id}")
+    async def read_item(item_id: int):
+        if item_id == 0:
+            raise HTTPException(status_code=404, detail="no existe")
+        return {"item_id": item_id, "payload": "x" * 100}
+
+    @app.get("/boom")
+    async def boom():
+        raise RuntimeError("fallo")
+
+    return app
+
+
+def series(text, name):
+    """{línea de etiquetas: valor} de una métrica en el texto expuesto."""
+    return {
+        line.rsplit(" ", 1)[0][len(name):]: float(line.rsplit(" ", 1)[1])
+        for line in text.splitlines()
+        if line.startswith(name + "{")
+    }
+
+
+class TestMetricsMiddleware:
+    """Tests para el middleware de métricas."""
+
+    def test_groups_by_route_template(self):
+        registry = MultiprocessMetrics(RequestMetrics())
+        client = TestClient(instrumented_app(registry))
+        for item_id in (1, 2, 3, 0):
+            client.get(f"/items/{item_id}")
+        client.get("/no-existe")
+        client.post("/items/1")
+
+        text = registry.render()
+        requests = series(text, "http_requests_total")
+
+        assert requests['{method="GET",route="/items/{item_id}",status="200"}'] == 3
+        assert requests['{method="GET",route="/items/{item_id}",status="404"}'] == 1
+        assert requests[f'{{method="GET",route="{UNMATCHED_ROUTE}",status="404"}}'] == 1
+        assert requests['{method="POST",route="/items/{item_id}",status="405"}'] == 1
+        assert not any("/items/1" in labels for labels in requests)
+
+    def test_histograms_and_in_flight(self):
+        registry = MultiprocessMetrics(RequestMetrics())
+        client = TestClient(instrumented_app(registry))
+        client.get("/items/7")
+        client.get("/items/8")
+
+        text = registry.render()
+        labels = '{method="GET",route="/items/{item_id}"}'
+        assert series(text, "http_request_duration_seconds_count")[labels] == 2
+        assert series(text, "http_request_duration_seconds_bucket")[
+            '{method="GET",route="/items/{item_id}",le="+Inf"}'
+        ] == 2
+        assert series(text, "http_response_size_bytes_sum")[labels] > 200
+        assert series(text, "http_response_size_bytes_bucket")[
+            '{method="GET",route="/items/{item_id}",le="100"}'
+        ] == 0
+        assert series(text, "http_requests_in_flight")[labels] == 0
+        assert "# TYPE http_request_duration_seconds histogram" in text
+
+    def test_unhandled_error_counts_as_500(self):
+        registry = MultiprocessMetrics(RequestMetrics())
+        client = TestClient(instrumented_app(registry), raise_server_exceptions=False)
+
+        assert client.get("/boom").status_code == 500
+        requests = series(registry.render(), "http_requests_total")
+        assert requests['{method="GET",route="/boom",status="500"}'] == 1
+
+
+class TestMultiprocessMetrics:
+    """Tests para la agregación entre workers a través del directorio compartido."""
+
+    def test_workers_are_summed(self, tmp_path):
+        first = RequestMetrics()
+        first.start("GET", "/a")
+        first.finish("GET", "/a", 200, 0.02, 50)
+        first.start("GET", "/a")  # sigue en curso
+        second = MultiprocessMetrics(RequestMetrics(), directory=str(tmp_path))
+        second.metrics.start("GET", "/a")
+        second.metrics.finish("GET", "/a", 200, 0.2, 5000)
+
+        # Un worker vivo y otro que ya terminó (sus peticiones en curso no cuentan)
+        (tmp_path / "http-1-aaaa.json").write_text(json.dumps({"pid": -1, **first.snapshot()}))
+        text = second.render()
+
+        assert series(text, "http_requests_total")['{method="GET",route="/a",status="200"}'] == 2
+        assert series(text, "http_request_duration_seconds_sum")['{method="GET",route="/a"}'] == 0.22
+        assert series(text, "http_requests_in_flight")['{method="GET",route="/a"}'] == 0
+        assert len(list(tmp_path.glob("http-*.json"))) == 2
+
+    def test_flush_is_throttled(self, tmp_path):
+        registry = MultiprocessMetrics(RequestMetrics(), directory=str(tmp_path), flush_interval=60)
+        registry.flush()
+        registry.metrics.start("GET", "/a")
+        registry.metrics.finish("GET", "/a", 200, 0.01, 10)
+        registry.flush()
+
+        path, = tmp_path.glob("http-*.json")
+        assert json.loads(path.read_text())["requests"] == []
+        registry.flush(force=True)
+        assert json.loads(path.read_text())["requests"] == [["GET", "/a", "200", 1]]
+
+    def test_requests_do_not_touch_disk(self, tmp_path):
+        registry = MultiprocessMetrics(RequestMetrics(), directory=str(tmp_path), flush_interval=0)
+        client = TestClient(instrumented_app(registry))
+        client.get("/items/1")
+
+        assert list(tmp_path.glob("http-*.json")) == []
+        assert series(registry.render(), "http_requests_total")['{method="GET",route="/items/{item_id}",status="200"}'] == 1
+
+    def test_background_thread_flushes_until_stopped(self, tmp_path):
+        registry = MultiprocessMetrics(RequestMetrics(), directory=str(tmp_path), flush_interval=0.01)
+        registry.start()
+        try:
+            registry.metrics.start("GET", "/a")
+            registry.metrics.finish("GET", "/a", 200, 0.01, 10)
+            deadline = time.monotonic() + 5
+            while not list(tmp_path.glob("http-*.json")) and time.monotonic() < deadline:
+                time.sleep(0.01)
+        finally:
+            registry.stop()
+
+        path, = tmp_path.glob("http-*.json")
+        assert json.loads(path.read_text())["requests"] == [["GET", "/a", "200", 1]]
+        assert registry._thread is None
+
+    def test_live_in_flight_and_label_escaping(self):
+        metrics = RequestMetrics()
+        metrics.start("GET", 'ruta "rara"')
+
+        merged = merge_snapshots([metrics.snapshot(), metrics.snapshot()])
+        text = render_prometheus(merged)
+
+        assert series(text, "http_requests_in_flight")['{method="GET",route="ruta \\"rara\\""}'] == 2
+
+
+def test_metrics_endpoint():
+    # Sin `with`: no arranca el lifespan (ni tablas ni workers)
+    client = TestClient(app)
+    client.get("/info")
+    response = client.get("/metrics")
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+    assert series(response.text, "http_requests_total")['{method="GET",route="/info",status="200"}'] >= 1
@@ -0,0 +1,69 @@
+"""
+Tests para la instrumentación del pool de conexiones.
+"""
+
+import logging
+import sqlite3
+
+import pytest
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+
+from app.db.pool_metrics import InstrumentedQueuePool, PoolMetrics, WAIT_BUCKETS_MS
+
+
+def make_pool(metrics, **kwargs):
+    pool = InstrumentedQueuePool(lambda: sqlite3.connect(":memory:"), **kwargs)
+    pool.metrics = metrics
+    return pool
+
+
+class TestPoolMetrics:
+    """Tests para PoolMetrics y los pools instrumentados."""
+
+    def test_checkouts_fill_histogram_and_status(self):
+        """Cada checkout suma al histograma y el snapshot refleja la ocupación."""
+        metrics = PoolMetrics("test", slow_checkout_ms=10_000)
+        pool = make_pool(metrics, pool_size=2, max_overflow=1)
+
+        first, second, third = pool.connect(), pool.connect(), pool.connect()
+        snapshot = metrics.snapshot(pool)
+        for connection in (first, second, third):
+            connection.close()
+
+        assert snapshot["checkouts"] == 3
+        assert snapshot["checked_out"] == 3
+        assert snapshot["overflow"] == 1
+        assert sum(bucket["count"] for bucket in snapshot["wait_histogram"]) == 3
+        assert len(snapshot["wait_histogram"]) == len(WAIT_BUCKETS_MS) + 1
+        assert snapshot["slow_checkouts"] == 0
+
+    def test_slow_checkout_is_logged(self, caplog):
+        """Un checkout por encima del umbral se cuenta y se registra como aviso."""
+        metrics = PoolMetrics("test", slow_checkout_ms=0)
+        pool = make_pool(metrics, pool_size=1, max_overflow=0)
+
+        with caplog.at_level(logging.WARNING, logger="app.db.pool_metrics"):
+            pool.connect().close()
+
+        assert metrics.slow_checkouts == 1
+        assert "Checkout lento en el pool test" in caplog.text
+
+    def test_exhausted_pool_counts_timeout(self):
+        """Sin conexiones libres el checkout expira y se cuenta como timeout."""
+        metrics = PoolMetrics("test")
+        pool = make_pool(metrics, pool_size=1, max_overflow=0, timeout=0.01)
+        held = pool.connect()
+
+        with pytest.raises(PoolTimeoutError):
+            pool.connect()
+        held.close()
+
+        assert metrics.timeouts == 1
+        assert metrics.checkouts == 1
+
+    def test_recreate_keeps_metrics(self):
+        """engine.dispose() recrea el pool sin perder las métricas."""
+        metrics = PoolMetrics("test")
+        pool = make_pool(metrics, pool_size=1, max_overflow=0)
+
+        assert pool.recreate().metrics is metrics
@@ -0,0 +1,147 @@
+"""
+Tests para el contador de consultas por petición y el detector de N+1.
+"""
+
+import asyncio
+import logging
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import select, text
+
+from app.core.settings import settings
+from app.db.query_metrics import (
+    QueryStatsMiddleware, current_query_stats, fingerprint, install_query_listeners, track_queries
+)
+from app.models.business_hours import BusinessHours
+from tests.conftest import TestingAsyncSessionLocal, TestingSessionLocal
+from app.utils.worker_pool import BoundedWorkerPool
+from tests.test_availability import create_collaborators
+
+
+def query_app(**options):
+    app = FastAPI()
+    app.add_middleware(QueryStatsMiddleware, **options)
+
+    @app.get("/sync/{n}")
+    def sync_queries(n: int):
+        db = TestingSessionLocal()
+        try:
+            for value in range(n):
+                db.execute(text("SELECT :value"), {"value": value})
+        finally:
+            db.close()
+        return {"ok": True}
+
+    @app.get("/async")
+    async def async_queries():
+        async with TestingAsyncSessionLocal() as session:
+            await session.execute(text("SELECT 1"))
+            await session.execute(text("SELECT 2"))
+        return {"ok": True}
+
+    return app
+
+
+class TestFingerprint:
+    """Tests para la normalización de sentencias."""
+
+    def test_parameters_and_literals_are_removed(self):
+        assert fingerprint("SELECT * FROM t WHERE id = ?") == fingerprint("SELECT *  FROM t\nWHERE id = 42")
+        assert fingerprint("SELECT * FROM t WHERE name = 'Ana' AND x = %(x_1)s") == (
+            "SELECT * FROM t WHERE name = ? AND x = ?"
+        )
+        assert fingerprint("SELECT * FROM t WHERE id IN ($1, $2, $3)") == "SELECT * FROM t WHERE id IN (?)"
+        assert fingerprint("SELECT created_at::date FROM t2") == "SELECT created_at::date FROM t2"
+
+
+class TestTrackQueries:
+    """Tests para el conteo con eventos de SQLAlchemy."""
+
+    def test_lazy_loads_are_detected(self, db_tables):
+        install_query_listeners()
+        create_collaborators(db_tables, 3)
+        db_tables.expire_all()
+
+        with track_queries() as stats:
+            schedules = db_tables.execute(select(BusinessHours)).scalars().all()
+            for schedule in schedules:
+                list(schedule.time_slots)
+
+        # 1 consulta de horarios + 1 carga perezosa de time_slots por horario
+        assert stats.count == 1 + len(schedules)
+        assert list(stats.repeated(len(schedules) - 1).values()) == [len(schedules)]
+        assert stats.total_ms > 0
+
+    def test_outside_context_nothing_is_counted(self, db_tables):
+        install_query_listeners()
+        db_tables.execute(text("SELECT 1"))
+        with track_queries() as stats:
+            pass
+        assert stats.count == 0
+
+
+class TestQueryStatsMiddleware:
+    """Tests para las cabeceras y el aviso de N+1 por petición."""
+
+    def test_headers_count_sync_and_async_endpoints(self, db_tables):
+        client = TestClient(query_app())
+
+        response = client.get("/sync/3")
+        assert response.headers["x-db-queries"] == "3"
+        assert float(response.headers["x-db-time"]) >= 0
+
+        assert client.get("/async").headers["x-db-queries"] == "2"
+
+    def test_no_headers_in_production(self, db_tables):
+        client = TestClient(query_app(expose_headers=False))
+        response = client.get("/sync/1")
+        assert "x-db-queries" not in response.headers
+
+    def test_repeated_statement_is_logged(self, db_tables, caplog):
+        client = TestClient(query_app(n_plus_one_threshold=4))
+
+        with caplog.at_level(logging.WARNING, logger="app.db.query_metrics"):
+            client.get("/sync/4")
+            assert caplog.records == []
+            client.get("/sync/5")
+
+        record, = caplog.records
+        assert "GET /sync/{n}" in record.getMessage()
+        assert "5 ejecuciones de SELECT ?" in record.getMessage()
+
+
+class TestPoolJobs:
+    """Tests para las consultas de los trabajos encolados desde una petición."""
+
+    def test_job_queries_are_not_counted_against_the_request(self, db_tables, caplog, monkeypatch):
+        install_query_listeners()
+        monkeypatch.setattr(settings, "DB_N_PLUS_ONE_THRESHOLD", 2)
+        seen = []
+
+        async def job():
+            seen.append(current_query_stats())
+            db = TestingSessionLocal()
+            try:
+                for value in range(3):
+                    db.execute(text("SELECT :value"), {"value": value})
+            finally:
+                db.close()
+
+        async def scenario():
+            pool = BoundedWorkerPool("test", workers=1)
+            await pool.start()
+            with track_queries() as request_stats:
+                pool.submit(job)
+            await pool.join()
+            await pool.stop()
+            return request_stats
+
+        with caplog.at_level(logging.WARNING, logger="app.db.query_metrics"):
+            request_stats = asyncio.run(scenario())
+
+        job_stats, = seen
+        assert job_stats is not request_stats
+        assert request_stats.count == 0 and job_stats.count == 3
+        record, = caplog.records
+        assert "trabajo del pool test" in record.getMessage()
@@ -0,0 +1,80 @@
+"""
+Tests para el enrutado de lecturas a la réplica y la ventana read-your-writes.
+"""
+
+import time
+
+import pytest
+from fastapi import Request, Response
+
+from app.core.settings import settings
+from app.db import session as db_session_module
+from app.db.routing import (
+    READ_YOUR_WRITES_COOKIE, READ_YOUR_WRITES_SESSION, REPLICA_SESSION,
+    in_read_your_writes_window, mark_write
+)
+from tests.conftest import TestingAsyncSessionLocal
+
+
+def make_request(cookie=None):
+    headers = [(b"cookie", f"{READ_YOUR_WRITES_COOKIE}={cookie}".encode())] if cookie else []
+    return Request({"type": "http", "method": "GET", "path": "/", "headers": headers})
+
+
+@pytest.fixture
+def replica_configured(monkeypatch):
+    """Simula DATABASE_READ_URL usando la base de datos de tests como réplica."""
+    monkeypatch.setattr(settings, "DATABASE_READ_URL", "sqlite:///replica.db")
+    monkeypatch.setattr(db_session_module, "ReadAsyncSessionLocal", TestingAsyncSessionLocal)
+
+
+class TestReadYourWrites:
+    """Tests para la cookie de ventana read-your-writes."""
+
+    def test_no_cookie_without_replica(self, monkeypatch):
+        """Sin réplica todas las lecturas ya van a la principal: no hace falta cookie."""
+        monkeypatch.setattr(settings, "DATABASE_READ_URL", None)
+        response = Response()
+
+        mark_write(response)
+
+        assert "set-cookie" not in response.headers
+
+    def test_cookie_opens_window(self, replica_configured):
+        """Tras escribir, la cookie mantiene al cliente en la principal durante la ventana."""
+        response = Response()
+        mark_write(response)
+        cookie = response.headers["set-cookie"]
+        value = cookie.split(";")[0].split("=", 1)[1]
+
+        assert f"Max-Age={int(settings.READ_YOUR_WRITES_SECONDS)}" in cookie
+        assert in_read_your_writes_window(make_request(value))
+
+    @pytest.mark.parametrize("cookie", [None, f"{time.time() - 1:.3f}", "basura"])
+    def test_expired_or_invalid_cookie(self, cookie):
+        """Sin cookie, caducada o manipulada, el cliente lee de la réplica."""
+        assert not in_read_your_writes_window(make_request(cookie))
+
+
+class TestGetReadDb:
+    """Tests para la dependencia get_read_db."""
+
+    @staticmethod
+    async def session_info(request):
+        generator = db_session_module.get_read_db(request)
+        session = await generator.__anext__()
+        info = dict(session.info)
+        await generator.aclose()
+        return info
+
+    @pytest.mark.asyncio
+    async def test_routes_to_replica(self, replica_configured):
+        info = await self.session_info(make_request())
+
+        assert info == {REPLICA_SESSION: True}
+
+    @pytest.mark.asyncio
+    async def test_recent_writer_reads_primary(self, replica_configured):
+        info = await self.session_info(make_request(f"{time.time() + 5:.3f}"))
+
+        assert info == {READ_YOUR_WRITES_SESSION: True}
@@ -0,0 +1,136 @@
+"""
+Tests para el resumen compacto de slots que recibe el LLM.
+"""
+
+import json
+from datetime import time, timedelta
+
+from app.agents.slot_summary import (
+    merge_slot_ranges, slots_tool_content, suggest_times, summarize_slots, summary_start_times
+)
+from app.models.business_hours import TimeSlot
+from app.utils.availability import get_available_slots, get_available_slots_with_intervals
+from tests.test_availability import TARGET_DATE, book, create_collaborators, create_service
+
+
+def slot(collaborator_id, start, duration=30, name=None):
+    return {
+        "start_time": start,
+        "end_time": start + timedelta(minutes=duration),
+        "collaborator_id": collaborator_id,
+        "collaborator_name": name or f"Profesional {collaborator_id}",
+        "available_minutes": duration,
+    }
+
+
+def at(hour, minute=0):
+    return TARGET_DATE.replace(hour=hour, minute=minute)
+
+
+def set_shifts(db_session, *shifts):
+    """Sustituye los turnos del único colaborador por `shifts` [(inicio, fin), ...]."""
+    time_slots = db_session.query(TimeSlot).order_by(TimeSlot.slot_order).all()
+    for time_slot, (start, end) in zip(time_slots, shifts):
+        time_slot.start_time, time_slot.end_time = start, end
+    for time_slot in time_slots[len(shifts):]:
+        db_session.delete(time_slot)
+    db_session.commit()
+
+
+class TestMergeSlotRanges:
+    """Tests para la fusión de slots en tramos libres."""
+
+    def test_overlapping_slots_become_one_range(self):
+        slots = [slot(1, at(9, 15)), slot(1, at(9, 0)), slot(1, at(9, 30))]
+        assert merge_slot_ranges(slots) == [[at(9, 0), at(10, 0)]]
+
+    def test_gap_splits_ranges(self):
+        slots = [slot(1, at(9, 0)), slot(1, at(9, 15)), slot(1, at(15, 0))]
+        assert merge_slot_ranges(slots) == [[at(9, 0), at(9, 45)], [at(15, 0), at(15, 30)]]
+
+    def test_touching_slots_stay_apart(self):
+        slots = [slot(1, at(13), duration=60), slot(1, at(14), duration=60)]
+        assert merge_slot_ranges(slots) == [[at(13), at(14)], [at(14), at(15)]]
+
+
+class TestSuggestTimes:
+    """Tests para las horas sugeridas."""
+
+    def test_spread_across_the_day_without_duplicates(self):
+        slots = [slot(c, at(9) + timedelta(minutes=15 * i)) for c in (1, 2) for i in range(10)]
+        times = suggest_times(slots, 4)
+        assert times == [at(9, 0), at(9, 45), at(10, 30), at(11, 15)]
+
+    def test_limit_larger_than_available(self):
+        assert suggest_times([slot(1, at(9)), slot(2, at(9))], 5) == [at(9)]
+        assert suggest_times([slot(1, at(9))], 0) == []
+
+
+class TestSummarizeSlots:
+    """Tests para el resumen completo."""
+
+    def test_empty(self):
+        summary = summarize_slots([])
+        assert summary["total_slots"] == 0
+        assert summary["collaborators"] == []
+        assert summary["suggested_times"] == []
+
+    def test_matches_available_slots_and_is_smaller(self, db_tables):
+        """Los tramos cubren exactamente los slots reales y el JSON es mucho más corto."""
+        service = create_service(db_tables)
+        collaborators = create_collaborators(db_tables, 3)
+        book(db_tables, service, collaborators[0], at(10), at(11))
+        slots = get_available_slots(db_tables, TARGET_DATE, service.id)
+
+        summary = summarize_slots(slots, max_suggestions=5)
+
+        assert summary["total_slots"] == len(slots)
+        assert summary["duration_minutes"] == 30
+        assert [entry["id"] for entry in summary["collaborators"]] == [c.id for c in collaborators]
+        assert summary["collaborators"][0]["free"] == ["09:00-10:00", "11:00-13:00", "15:00-19:00"]
+        assert summary["collaborators"][1]["free"] == ["09:00-13:00", "15:00-19:00"]
+        assert len(summary["suggested_times"]) == 5
+
+        content = slots_tool_content(slots, 5)
+        assert json.loads(content) == summary
+        assert len(content) * 5 < len(json.dumps(slots, default=str))
+
+    def test_back_to_back_shifts_do_not_invent_starts(self, db_tables):
+        """Con turnos 09:00-14:00 y 14:00-18:00 no hay inicios que crucen las 14:00."""
+        service = create_service(db_tables, duration_minutes=60)
+        create_collaborators(db_tables, 1)
+        set_shifts(db_tables, (time(9, 0), time(14, 0)), (time(14, 0), time(18, 0)))
+        slots, free_intervals = get_available_slots_with_intervals(db_tables, TARGET_DATE, service.id)
+
+        summary = summarize_slots(slots, free_intervals=free_intervals)
+        starts = summary_start_times(summary, TARGET_DATE.date())
+
+        assert summary["collaborators"][0]["free"] == ["09:00-14:00", "14:00-18:00"]
+        assert starts == sorted(slot["start_time"] for slot in slots)
+        assert at(13, 15) not in starts and at(14) in starts
+
+    def test_short_service_keeps_one_range_per_free_interval(self, db_tables):
+        """Los slots de 15 minutos solo se tocan: el tramo sale del hueco libre, no de los slots."""
+        service = create_service(db_tables, duration_minutes=15)
+        create_collaborators(db_tables, 1)
+        set_shifts(db_tables, (time(9, 0), time(18, 0)))
+        slots, free_intervals = get_available_slots_with_intervals(db_tables, TARGET_DATE, service.id)
+
+        summary = summarize_slots(slots, free_intervals=free_intervals)
+
+        assert summary["collaborators"][0]["free"] == ["09:00-18:00"]
+        assert summary_start_times(summary, TARGET_DATE.date()) == [slot["start_time"] for slot in slots]
+
+    def test_intervals_match_available_slots(self, db_tables):
+        """Huecos que no admiten el servicio no aparecen; los inicios tras una cita se conservan."""
+        service = create_service(db_tables, duration_minutes=45)
+        collaborators = create_collaborators(db_tables, 2)
+        book(db_tables, service, collaborators[0], at(9, 20), at(10, 10))
+        book(db_tables, service, collaborators[0], at(12, 30), at(12, 40))
+        slots, free_intervals = get_available_slots_with_intervals(db_tables, TARGET_DATE, service.id)
+
+        summary = summarize_slots(slots, free_intervals=free_intervals)
+
+        assert slots == get_available_slots(db_tables, TARGET_DATE, service.id)
+        assert summary["collaborators"][0]["free"] == ["10:10-12:30", "15:00-19:00"]
+        assert summary_start_times(summary, TARGET_DATE.date()) == sorted({slot["start_time"] for slot in slots})
@@ -0,0 +1,142 @@
+"""
+Tests para el registro de consultas lentas y la captura de planes.
+"""
+
+import io
+import json
+import logging
+import threading
+
+import pytest
+from sqlalchemy import create_engine, text
+
+from app.core.logging_config import setup_logging, stop_logging
+from app.core.settings import settings
+from app.db.query_metrics import track_queries
+from app.db.slow_queries import SlowQueryLog, build_slow_query_file_handlers, redact_parameters
+
+
+class SteppingClock:
+    """Cada lectura avanza `step` segundos: toda sentencia dura `step`."""
+
+    def __init__(self, step):
+        self.now = 0.0
+        self.step = step
+
+    def __call__(self):
+        self.now += self.step
+        return self.now
+
+
+@pytest.fixture
+def sqlite_engine():
+    engine = create_engine("sqlite://")
+    with engine.begin() as conn:
+        conn.execute(text("CREATE TABLE appointments (id INTEGER PRIMARY KEY, phone TEXT, start_time TEXT)"))
+        conn.execute(text("CREATE INDEX ix_appointments_start ON appointments (start_time)"))
+    yield engine
+    engine.dispose()
+
+
+def slow_entries(caplog):
+    return [json.loads(record.getMessage()) for record in caplog.records if record.name == "app.db.slow_queries"]
+
+
+class TestRedaction:
+    """Tests para la redacción de parámetros."""
+
+    def test_text_is_hidden_and_ids_are_kept(self):
+        assert redact_parameters({"phone": "+34600123456", "id": 7, "flag": None}) == {
+            "phone": "<str:12>", "id": 7, "flag": None
+        }
+        assert redact_parameters((3, "ana@example.com", b"\x00\x01")) == [3, "<str:15>", "<bytes:2>"]
+        assert redact_parameters([{"name": "Ana"}, {"name": "Luis"}]) == [{"name": "<str:3>"}, {"name": "<str:4>"}]
+
+
+class TestSlowQueryLog:
+    """Tests para SlowQueryLog adjunto a un engine."""
+
+    def test_fast_statements_are_ignored(self, sqlite_engine, caplog):
+        log = SlowQueryLog(threshold_ms=200, clock=SteppingClock(0.05))
+        log.attach(sqlite_engine)
+
+        with caplog.at_level(logging.WARNING, logger="app.db.slow_queries"), sqlite_engine.connect() as conn:
+            conn.execute(text("SELECT 1"))
+
+        assert slow_entries(caplog) == []
+        assert log.stats()["slow_queries"] == 0
+
+    def test_slow_select_is_logged_with_plan_and_route(self, sqlite_engine, caplog):
+        log = SlowQueryLog(threshold_ms=200, explain_sample_rate=1.0, clock=SteppingClock(0.5))
+        log.attach(sqlite_engine)
+        scope = {"type": "http", "method": "GET", "path": "/api/v1/appointments/"}
+
+        with caplog.at_level(logging.WARNING, logger="app.db.slow_queries"), track_queries(scope):
+            with sqlite_engine.connect() as conn:
+                conn.execute(
+                    text("SELECT id FROM appointments WHERE phone = :phone AND start_time >= :start"),
+                    {"phone": "+34600123456", "start": "2030-01-07"},
+                )
+
+        entry, = slow_entries(caplog)
+        assert entry["duration_ms"] == 500.0
+        assert entry["route"] == "GET /api/v1/appointments/"
+        assert entry["statement"] == "SELECT id FROM appointments WHERE phone = ? AND start_time >= ?"
+        assert entry["parameters"] == ["<str:12>", "<str:10>"]
+        assert any("ix_appointments_start" in line for line in entry["plan"])
+        assert log.stats()["explained"] == 1
+
+    def test_writes_are_not_explained(self, sqlite_engine, caplog):
+        log = SlowQueryLog(threshold_ms=200, explain_sample_rate=1.0, clock=SteppingClock(0.5))
+        log.attach(sqlite_engine)
+
+        with caplog.at_level(logging.WARNING, logger="app.db.slow_queries"), sqlite_engine.begin() as conn:
+            conn.execute(text("INSERT INTO appointments (phone) VALUES (:phone)"), {"phone": "+34600"})
+
+        entry, = slow_entries(caplog)
+        assert "plan" not in entry
+        assert entry["route"] is None
+        with sqlite_engine.connect() as conn:
+            assert conn.execute(text("SELECT count(*) FROM appointments")).scalar() == 1
+
+    def test_failed_explain_keeps_transaction(self, sqlite_engine, caplog):
+        log = SlowQueryLog(threshold_ms=200, explain_sample_rate=1.0, clock=SteppingClock(0.5))
+        log.attach(sqlite_engine)
+
+        with caplog.at_level(logging.WARNING, logger="app.db.slow_queries"), sqlite_engine.begin() as conn:
+            conn.execute(text("INSERT INTO appointments (phone) VALUES ('a')"))
+            # Una tabla inexistente hace fallar el EXPLAIN dentro del savepoint
+            assert log.explain(conn, "SELECT * FROM no_existe", ()) is None
+            conn.execute(text("INSERT INTO appointments (phone) VALUES ('b')"))
+
+        with sqlite_engine.connect() as conn:
+            assert conn.execute(text("SELECT count(*) FROM appointments")).scalar() == 2
+
+
+class TestSlowQueryFile:
+    """Tests para el fichero rotativo servido por el QueueListener."""
+
+    def test_only_slow_queries_are_written_from_the_listener_thread(self, tmp_path, monkeypatch):
+        path = tmp_path / "slow.log"
+        monkeypatch.setattr(settings, "DB_SLOW_QUERY_LOG_FILE", str(path))
+        handler, = build_slow_query_file_handlers()
+        writers = []
+        handler.addFilter(lambda record: writers.append(threading.current_thread()) or True)
+        root_level = logging.getLogger().level
+
+        setup_logging(level="INFO", stream=io.StringIO(), handlers=[handler])
+        try:
+            logging.getLogger("app.db.slow_queries").warning('{"event": "slow_query"}')
+            logging.getLogger("app.db.session").warning("otra cosa")
+        finally:
+            stop_logging()
+            logging.getLogger().setLevel(root_level)
+
+        line, = path.read_text(encoding="utf-8").splitlines()
+        assert line.endswith('{"event": "slow_query"}')
+        assert logging.getLogger("app.db.slow_queries").handlers == []
+        assert writers and threading.main_thread() not in writers
+
+    def test_no_file_configured(self, monkeypatch):
+        monkeypatch.setattr(settings, "DB_SLOW_QUERY_LOG_FILE", "")
+        assert build_slow_query_file_handlers() == []
@@ -0,0 +1,249 @@
+"""
+Tests para las herramientas del agente: su caché (memoize_tool) y la
+ejecución en paralelo de las llamadas de un turno.
+"""
+
+import copy
+import json
+import threading
+import time as time_module
+from datetime import date, datetime
+from types import SimpleNamespace
+
+import pytest
+
+from app.agents import booking_agent, tools
+from app.agents.conversation import ConversationState, ConversationStore, tool_result_key
+from app.agents.tools import get_availability, invalidate_tool_results, memoize_tool, tool_cache
+from app.utils.availability import invalidate_availability, invalidate_collaborator_availability
+from app.utils.cache import TTLCache
+from tests.conftest import TestingSessionLocal
+from tests.test_availability import TARGET_DATE, book, count_queries, create_collaborators, create_service
+
+DAY = date(2030, 1, 7)
+
+
+class TestMemoizeTool:
+    """Tests para el decorador de memoización."""
+
+    def test_same_arguments_share_entry(self):
+        cache = TTLCache(ttl=30)
+        calls = []
+
+        @memoize_tool(cache=cache)
+        def lookup(service_id, target_date, limit=10):
+            calls.append((service_id, target_date, limit))
+            return {"calls": len(calls)}
+
+        assert lookup(1, DAY) == {"calls": 1}
+        assert lookup(service_id=1, target_date=DAY, limit=10) == {"calls": 1}
+        assert lookup(2, DAY) == {"calls": 2}
+        assert lookup(1, DAY, 5) == {"calls": 3}
+        assert lookup.cache_key(1, DAY) == ("lookup", (("service_id", 1), ("target_date", DAY), ("limit", 10)))
+
+    def test_ttl_zero_disables(self):
+        calls = []
+
+        @memoize_tool(ttl=0, cache=TTLCache(ttl=30))
+        def lookup(service_id):
+            calls.append(service_id)
+            return len(calls)
+
+        assert lookup(1) == 1
+        assert lookup(1) == 2
+
+    def test_result_computed_during_invalidation_is_not_stored(self):
+        cache = TTLCache(ttl=30)
+
+        @memoize_tool(cache=cache)
+        def lookup(target_date):
+            invalidate_tool_results(target_date, cache=cache)
+            return "viejo"
+
+        assert lookup(DAY) == "viejo"
+        assert len(cache) == 0
+
+    def test_invalidate_by_date(self):
+        cache = TTLCache(ttl=30)
+
+        @memoize_tool(cache=cache)
+        def lookup(service_id, target_date):
+            return service_id
+
+        lookup(1, DAY)
+        lookup(2, DAY)
+        lookup(1, date(2030, 1, 8))
+
+        assert invalidate_tool_results(DAY, cache=cache) == 2
+        assert len(cache) == 1
+        assert invalidate_tool_results(cache=cache) == 1
+
+
+class TestGetAvailabilityTool:
+    """Tests para la herramienta get_availability y su invalidación."""
+
+    @pytest.fixture
+    def agenda(self, monkeypatch, db_tables):
+        monkeypatch.setattr(tools, "SessionLocal", TestingSessionLocal)
+        service = create_service(db_tables)
+        collaborator, = create_collaborators(db_tables, 1)
+        return service, collaborator
+
+    def test_second_call_skips_database(self, agenda, db_tables):
+        service, _ = agenda
+        first = get_availability(service.id, DAY)
+
+        with count_queries(db_tables) as statements:
+            second = get_availability(service.id, DAY)
+
+        assert second == first
+        assert statements == []
+        assert tool_cache.hits == 1
+
+    def test_appointment_change_invalidates_date(self, agenda, db_tables):
+        service, collaborator = agenda
+        other_day = date(2030, 1, 14)
+        before = get_availability(service.id, DAY)
+        get_availability(service.id, other_day)
+
+        book(db_tables, service, collaborator, datetime(2030, 1, 7, 9, 0), datetime(2030, 1, 7, 10, 0))
+        invalidate_availability(collaborator.id, datetime(2030, 1, 7, 9, 0), datetime(2030, 1, 7, 10, 0))
+
+        after = get_availability(service.id, DAY)
+        assert after["collaborators"][0]["free"][0] == "10:00-13:00"
+        assert after["total_slots"] < before["total_slots"]
+        # La otra fecha sigue en caché
+        assert any(dict(key[1])["target_date"] == other_day for key in tool_cache._data)
+
+    def test_schedule_change_invalidates_everything(self, agenda):
+        service, collaborator = agenda
+        get_availability(service.id, DAY)
+
+        invalidate_collaborator_availability(collaborator.id, TARGET_DATE.weekday())
+
+        assert len(tool_cache) == 0
+
+
+def tool_call(call_id, service_id, target_date, name="get_availability"):
+    return SimpleNamespace(
+        id=call_id,
+        type="function",
+        function=SimpleNamespace(
+            name=name,
+            arguments=json.dumps({"service_id": service_id, "target_date": target_date}),
+        ),
+    )
+
+
+class FakeOpenAI:
+    """Cliente mínimo con la forma de client.chat.completions.create."""
+
+    def __init__(self, tool_calls):
+        self.requests = []
+        self.tool_calls = tool_calls
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    def create(self, **kwargs):
+        self.requests.append(copy.deepcopy([
+            message if isinstance(message, dict) else {"role": message.role}
+            for message in kwargs["messages"]
+        ]))
+        if len(self.requests) == 1:
+            message = SimpleNamespace(role="assistant", content=None, tool_calls=self.tool_calls)
+        else:
+            message = SimpleNamespace(role="assistant", content="respuesta final", tool_calls=None)
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)])
+
+
+class TestParallelToolCalls:
+    """Tests para la ejecución en paralelo de las llamadas a herramientas de un turno."""
+
+    @pytest.fixture
+    def slow_tool(self, monkeypatch):
+        active = []
+        peak = []
+        lock = threading.Lock()
+
+        def fake_get_availability(service_id, target_date, max_suggestions=10):
+            with lock:
+                active.append(1)
+                peak.append(len(active))
+            time_module.sleep(0.2)
+            with lock:
+                active.pop()
+            return {"service_id": service_id, "date": target_date.isoformat()}
+
+        monkeypatch.setattr(booking_agent, "get_availability", fake_get_availability)
+        return peak
+
+    def test_three_dates_in_one_round_trip(self, monkeypatch, slow_tool):
+        calls = [tool_call(f"call_{day}", 1, f"2030-01-0{day}") for day in (7, 8, 9)]
+        fake = FakeOpenAI(calls)
+        monkeypatch.setattr(booking_agent, "client", fake)
+
+        started = time_module.perf_counter()
+        reply = booking_agent.run_llm_agent("¿Qué huecos hay el 7, el 8 y el 9?")
+        elapsed = time_module.perf_counter() - started
+
+        assert reply == "respuesta final"
+        assert len(fake.requests) == 2
+        assert max(slow_tool) == 3
+        assert elapsed < 0.5
+        tool_messages = [message for message in fake.requests[1] if message["role"] == "tool"]
+        assert [message["tool_call_id"] for message in tool_messages] == ["call_7", "call_8", "call_9"]
+        assert [json.loads(message["content"])["date"] for message in tool_messages] == [
+            "2030-01-07", "2030-01-08", "2030-01-09"
+        ]
+
+    def test_failed_call_reported_to_model(self, monkeypatch, slow_tool):
+        calls = [
+            tool_call("ok", 1, "2030-01-07"),
+            tool_call("bad_date", 1, "mañana"),
+            tool_call("unknown", 1, "2030-01-07", name="book_appointment"),
+        ]
+        fake = FakeOpenAI(calls)
+        monkeypatch.setattr(booking_agent, "client", fake)
+
+        assert booking_agent.run_llm_agent("hola") == "respuesta final"
+
+        contents = [json.loads(m["content"]) for m in fake.requests[1] if m["role"] == "tool"]
+        assert contents[0] == {"service_id": 1, "date": "2030-01-07"}
+        assert "error" in contents[1] and "error" in contents[2]
+
+    def test_last_query_is_remembered_in_model_order(self, monkeypatch, slow_tool):
+        calls = [tool_call("a", 1, "2030-01-07"), tool_call("b", 2, "2030-01-08")]
+        monkeypatch.setattr(booking_agent, "client", FakeOpenAI(calls))
+        conversation = ConversationState("34600")
+
+        booking_agent.run_llm_agent("hola", conversation)
+
+        assert (conversation.last_service_id, conversation.last_date) == (2, date(2030, 1, 8))
+        assert set(conversation.tool_results) == {
+            tool_result_key(1, date(2030, 1, 7)), tool_result_key(2, date(2030, 1, 8))
+        }
+
+    def test_calls_share_conversation_after_invalidation(self, monkeypatch, slow_tool):
+        """Los hilos de un turno descartan a la vez resultados invalidados de la misma conversación."""
+        store = ConversationStore()
+        monkeypatch.setattr(booking_agent, "conversation_store", store)
+        conversation = ConversationState("34600")
+
+        class YieldingDict(dict):
+            """Cede el GIL en cada borrado: sin lock, dos hilos acaban borrando la misma clave."""
+
+            def __delitem__(self, key):
+                super().__delitem__(key)
+                time_module.sleep(0.001)
+
+        conversation.tool_results = YieldingDict()
+        for service_id in range(100, 150):
+            store.set_tool_result(conversation, tool_result_key(service_id, DAY), {"viejo": True})
+        store.invalidate_tool_results(DAY)
+        calls = [tool_call(f"call_{service_id}", service_id, DAY.isoformat()) for service_id in range(1, 9)]
+
+        contents = [json.loads(content) for content in booking_agent.run_tool_calls(calls, conversation)]
+
+        assert contents == [{"service_id": service_id, "date": DAY.isoformat()} for service_id in range(1, 9)]
+        assert set(conversation.tool_results) == {tool_result_key(service_id, DAY) for service_id in range(1, 9)}
+        stats = store.stats()
+        assert stats["tool_result_misses"] == 8 and stats["tool_result_hits"] == 0
@@ -0,0 +1,209 @@
+"""
+Tests para el webhook de WhatsApp y su procesamiento en segundo plano.
+"""
+
+import asyncio
+
+import httpx
+import pytest
+import pytest_asyncio
+from fastapi import FastAPI
+
+from app.agents.dedup import MessageDeduplicator
+from app.agents.whatsapp import IncomingMessage, extract_messages, message_deduplicator, message_pool
+from app.api.v1.endpoints import ai_booking
+
+
+def meta_payload(phone="34600111222", text="Hola", message_id="wamid.1"):
+    message = {"id": message_id, "from": phone, "text": {"body": text}}
+    return {"entry": [{"changes": [{"value": {"messages": [message]}}]}]}
+
+
+@pytest_asyncio.fixture
+async def webhook_client(monkeypatch):
+    """Cliente HTTP contra el router de ai_booking con el pool arrancado."""
+    processed = []
+    release = asyncio.Event()
+
+    async def fake_process(phone, text):
+        await release.wait()
+        processed.append((phone, text))
+
+    monkeypatch.setattr(ai_booking, "process_message", fake_process)
+    monkeypatch.setattr(ai_booking, "message_deduplicator", MessageDeduplicator())
+    app = FastAPI()
+    app.include_router(ai_booking.router)
+    await message_pool.start()
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        yield client, processed, release
+    release.set()
+    await message_pool.stop()
+
+
+class TestWhatsappWebhook:
+    """Tests del webhook no bloqueante."""
+
+    def test_extract_messages(self):
+        assert extract_messages(meta_payload()) == [IncomingMessage("wamid.1", "34600111222", "Hola")]
+        assert extract_messages({"entry": [{"changes": [{"value": {"statuses": []}}]}]}) == []
+
+    def test_extract_whole_batch(self):
+        """Se extraen todos los mensajes de todos los entries, saltando los que no son texto."""
+        body = {"entry": [
+            {"changes": [{"value": {"messages": [
+                {"id": "wamid.1", "from": "1", "type": "text", "text": {"body": "a"}},
+                {"id": "wamid.2", "from": "1", "type": "image", "image": {}},
+                {"id": "wamid.3", "from": "2", "type": "text", "text": {"body": "b"}},
+            ]}}]},
+            {"changes": [{"value": {"messages": [{"id": "wamid.4", "from": "3", "text": {"body": "c"}}]}}]},
+        ]}
+
+        assert [message.id for message in extract_messages(body)] == ["wamid.1", "wamid.3", "wamid.4"]
+
+    @pytest.mark.asyncio
+    async def test_acknowledges_before_processing(self, webhook_client):
+        """El webhook responde 200 aunque el agente aún no haya terminado."""
+        client, processed, release = webhook_client
+
+        response = await client.post("/whatsapp", json=meta_payload())
+
+        assert response.status_code == 200
+        assert processed == []
+        release.set()
+        await message_pool.join()
+        assert processed == [("34600111222", "Hola")]
+
+    @pytest.mark.asyncio
+    async def test_full_queue_returns_503(self, webhook_client, monkeypatch):
+        """Con la cola llena Meta recibe 503 y reintentará más tarde."""
+        client, _, _ = webhook_client
+        monkeypatch.setattr(message_pool, "submit", lambda *args, **kwargs: False)
+
+        response = await client.post("/whatsapp", json=meta_payload())
+
+        assert response.status_code == 503
+
+    @pytest.mark.asyncio
+    async def test_meta_retry_is_processed_once(self, webhook_client):
+        """La misma entrega repetida solo llega una vez al agente."""
+        client, processed, release = webhook_client
+
+        for _ in range(3):
+            assert (await client.post("/whatsapp", json=meta_payload())).status_code == 200
+        await client.post("/whatsapp", json=meta_payload(message_id="wamid.2"))
+        release.set()
+        await message_pool.join()
+
+        assert len(processed) == 2
+        assert ai_booking.message_deduplicator.stats()["duplicates"] == 2
+
+    @pytest.mark.asyncio
+    async def test_rejected_message_is_retried(self, webhook_client, monkeypatch):
+        """Si la cola rechaza el mensaje, el reintento de Meta no se toma por duplicado."""
+        client, processed, release = webhook_client
+        submit = message_pool.submit
+        calls = []
+
+        def reject_first(*args, **kwargs):
+            calls.append(args)
+            return len(calls) > 1 and submit(*args, **kwargs)
+
+        monkeypatch.setattr(message_pool, "submit", reject_first)
+
+        assert (await client.post("/whatsapp", json=meta_payload())).status_code == 503
+        release.set()
+        assert (await client.post("/whatsapp", json=meta_payload())).status_code == 200
+        await message_pool.join()
+
+        assert processed == [("34600111222", "Hola")]
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestMessageDeduplicator:
+    """Tests del registro de mensajes ya recibidos."""
+
+    @pytest.mark.asyncio
+    async def test_window_expires(self):
+        """Pasada la ventana, el mismo ID vuelve a procesarse."""
+        clock = FakeClock()
+        dedup = MessageDeduplicator(ttl=10, clock=clock)
+
+        assert not await dedup.is_duplicate("wamid.1")
+        assert await dedup.is_duplicate("wamid.1")
+        clock.now = 11
+        assert not await dedup.is_duplicate("wamid.1")
+        assert dedup.stats()["hit_rate"] == round(1 / 3, 4)
+
+    @pytest.mark.asyncio
+    async def test_bounded_memory(self):
+        dedup = MessageDeduplicator(maxsize=2)
+
+        for message_id in ("a", "b", "c"):
+            await dedup.is_duplicate(message_id)
+
+        assert dedup.stats()["local_entries"] == 2
+
+    @pytest.mark.asyncio
+    async def test_table_shared_between_workers(self, db_tables):
+        """Con la tabla, un reintento que llega a otro worker también se descarta."""
+        from tests.conftest import TestingAsyncSessionLocal
+
+        db_tables.commit()
+        first_worker = MessageDeduplicator(session_factory=TestingAsyncSessionLocal)
+        second_worker = MessageDeduplicator(session_factory=TestingAsyncSessionLocal)
+
+        assert not await first_worker.is_duplicate("wamid.1")
+        assert await second_worker.is_duplicate("wamid.1")
+        assert second_worker.stats()["shared_duplicates"] == 1
+
+        await first_worker.forget("wamid.1")
+        assert not await second_worker.is_duplicate("wamid.2")
+        third_worker = MessageDeduplicator(session_factory=TestingAsyncSessionLocal)
+        assert not await third_worker.is_duplicate("wamid.1")
+
+
+class TestWebhookBatchFanOut:
+    """Tests del reparto concurrente de un lote con orden por teléfono."""
+
+    @pytest.mark.asyncio
+    async def test_phones_in_parallel_and_in_order(self, monkeypatch):
+        """Un usuario lento no retrasa a los demás, y los mensajes de cada teléfono van en orden."""
+        events = []
+
+        async def fake_process(phone, text):
+            events.append(("start", phone, text))
+            await asyncio.sleep(0.05 if text == "lento" else 0.001)
+            events.append(("end", phone, text))
+
+        monkeypatch.setattr(ai_booking, "process_message", fake_process)
+        monkeypatch.setattr(ai_booking, "message_deduplicator", MessageDeduplicator())
+        app = FastAPI()
+        app.include_router(ai_booking.router)
+        messages = [
+            {"id": "wamid.1", "from": "A", "text": {"body": "lento"}},
+            {"id": "wamid.2", "from": "A", "text": {"body": "segundo"}},
+            {"id": "wamid.3", "from": "B", "text": {"body": "rápido"}},
+        ]
+        body = {"entry": [{"changes": [{"value": {"messages": messages[:2]}}]},
+                          {"changes": [{"value": {"messages": messages[2:]}}]}]}
+
+        await message_pool.start()
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            assert (await client.post("/whatsapp", json=body)).status_code == 200
+        await message_pool.join()
+        await message_pool.stop()
+
+        finished = [(phone, text) for kind, phone, text in events if kind == "end"]
+        assert finished.index(("B", "rápido")) < finished.index(("A", "lento"))
+        assert finished.index(("A", "lento")) < finished.index(("A", "segundo"))
+        # El segundo mensaje de A no empieza hasta que termina el primero
+        assert events.index(("end", "A", "lento")) < events.index(("start", "A", "segundo"))
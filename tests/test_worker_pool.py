@@ -0,0 +1,121 @@
+"""
+Tests para BoundedWorkerPool.
+"""
+
+import asyncio
+
+import pytest
+
+from app.utils.worker_pool import BoundedWorkerPool
+
+
+class TestBoundedWorkerPool:
+    """Tests del pool acotado de workers."""
+
+    @pytest.mark.asyncio
+    async def test_concurrency_is_bounded(self):
+        """Nunca corren más trabajos a la vez que workers."""
+        pool = BoundedWorkerPool("test", workers=3, maxsize=20)
+        running, peak = 0, 0
+
+        async def job():
+            nonlocal running, peak
+            running += 1
+            peak = max(peak, running)
+            await asyncio.sleep(0.01)
+            running -= 1
+
+        await pool.start()
+        for _ in range(10):
+            assert pool.submit(job)
+        await pool.join()
+        await pool.stop()
+
+        assert peak == 3
+        stats = pool.stats()
+        assert stats["completed"] == 10
+        assert stats["max_queue_depth"] >= 7
+        assert stats["avg_run_ms"] > 0
+
+    @pytest.mark.asyncio
+    async def test_full_queue_rejects(self):
+        """Con la cola llena submit() devuelve False y cuenta el rechazo."""
+        pool = BoundedWorkerPool("test", workers=1, maxsize=2)
+        release = asyncio.Event()
+
+        await pool.start()
+        assert pool.submit(release.wait)
+        await asyncio.sleep(0)  # el worker toma el primer trabajo
+        assert pool.submit(release.wait)
+        assert pool.submit(release.wait)
+        assert not pool.submit(release.wait)
+
+        assert pool.stats()["rejected"] == 1
+        assert pool.stats()["queue_depth"] == 2
+        release.set()
+        await pool.stop()
+
+    @pytest.mark.asyncio
+    async def test_failures_do_not_kill_workers(self):
+        """Un trabajo que falla se cuenta y el worker sigue atendiendo la cola."""
+        pool = BoundedWorkerPool("test", workers=1, maxsize=5)
+        done = []
+
+        async def boom():
+            raise RuntimeError("fallo")
+
+        async def ok():
+            done.append(True)
+
+        await pool.start()
+        pool.submit(boom)
+        pool.submit(ok)
+        await pool.join()
+        await pool.stop()
+
+        assert done == [True]
+        assert pool.stats()["failed"] == 1
+
+    def test_submit_before_start_is_rejected(self):
+        pool = BoundedWorkerPool("test")
+
+        assert not pool.submit(asyncio.sleep, 0)
+        assert pool.stats()["rejected"] == 1
+
+    @pytest.mark.asyncio
+    async def test_same_key_runs_in_order_without_blocking_workers(self):
+        """Los trabajos de una clave van en serie; mientras, los demás workers siguen libres."""
+        pool = BoundedWorkerPool("test", workers=2, maxsize=20)
+        order = []
+
+        async def job(key, index, delay):
+            await asyncio.sleep(delay)
+            order.append((key, index))
+
+        await pool.start()
+        for index in range(4):
+            pool.submit(job, "lento", index, 0.01, key="lento")
+        pool.submit(job, "rapido", 0, 0, key="rapido")
+        await asyncio.sleep(0.005)
+        assert pool.stats()["parked"] == 3
+        await pool.join()
+        await pool.stop()
+
+        assert order[0] == ("rapido", 0)
+        assert [index for key, index in order if key == "lento"] == [0, 1, 2, 3]
+        assert pool.stats()["active_keys"] == 0
+
+    @pytest.mark.asyncio
+    async def test_parked_jobs_count_towards_capacity(self):
+        pool = BoundedWorkerPool("test", workers=1, maxsize=2)
+        release = asyncio.Event()
+
+        await pool.start()
+        pool.submit(release.wait, key="a")
+        await asyncio.sleep(0)
+        pool.submit(release.wait, key="a")
+        pool.submit(release.wait, key="a")
+
+        assert not pool.submit(release.wait, key="b")
+        release.set()
+        await pool.stop()